@@ -178,18 +178,12 @@ class GroupDetailsEndpoint(GroupEndpoint):
         action_list = self._get_actions(request, group)
 
         now = timezone.now()
-        hourly_stats = tsdb.rollup(tsdb.get_range(
-            model=tsdb.models.group,
-            keys=[group.id],
-            end=now,
-            start=now - timedelta(days=1),
-        ), 3600)[group.id]
-        daily_stats = tsdb.rollup(tsdb.get_range(
-            model=tsdb.models.group,
-            keys=[group.id],
-            end=now,
-            start=now - timedelta(days=30),
-        ), 3600 * 24)[group.id]
+        hourly_stats, daily_stats = tsdb.get_range_series_multi([
+            (tsdb.models.group, [group.id], now - timedelta(days=1), now, None),
+            (tsdb.models.group, [group.id], now - timedelta(days=30), now, None),
+        ])
+        hourly_stats = tsdb.rollup(hourly_stats.to_points(), 3600)[group.id]
+        daily_stats = tsdb.rollup(daily_stats.to_points(), 3600 * 24)[group.id]
 
         if first_release:
             first_release = self._get_release_info(request, group, first_release)
@@ -98,11 +98,11 @@ class OrganizationStatsEndpoint(OrganizationEndpoint, StatsMixin):
         if stat_model is None:
             raise ValueError('Invalid group: %s, stat: %s' % (group, stat))
 
-        data = tsdb.get_range(
+        data = tsdb.get_range_series(
             model=stat_model,
             keys=keys,
             **self._parse_args(request)
-        )
+        ).to_points()
 
         if group == 'organization':
             data = data[organization.id]
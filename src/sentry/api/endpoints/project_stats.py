@@ -62,10 +62,10 @@ class ProjectStatsEndpoint(ProjectEndpoint, StatsMixin):
         else:
             raise ValueError('Invalid stat: %s' % stat)
 
-        data = tsdb.get_range(
+        data = tsdb.get_range_series(
             model=stat_model,
             keys=[project.id],
             **self._parse_args(request)
-        )[project.id]
+        ).get_points(project.id)
 
         return Response(data)
@@ -91,17 +91,25 @@ class GroupSerializer(Serializer):
             ).values_list('group', 'release')
         )
 
+        # plugins annotate all groups of a project at once
+        groups_by_project = {}
+        for item in item_list:
+            groups_by_project.setdefault(item.project, []).append(item)
+
+        annotations_by_group = dict((item, []) for item in item_list)
+        for project, groups in groups_by_project.iteritems():
+            for version in (1, 2):
+                for plugin in plugins.for_project(project=project, version=version):
+                    results = safe_execute(plugin.get_annotations_for_groups, groups,
+                                           _with_transaction=False) or {}
+                    for item in groups:
+                        annotations_by_group[item].extend(results.get(item) or ())
+
         result = {}
         for item in item_list:
             active_date = item.active_at or item.last_seen
 
-            annotations = []
-            for plugin in plugins.for_project(project=item.project, version=1):
-                safe_execute(plugin.tags, None, item, annotations,
-                             _with_transaction=False)
-            for plugin in plugins.for_project(project=item.project, version=2):
-                annotations.extend(safe_execute(plugin.get_annotations, group=item,
-                                                _with_transaction=False) or ())
+            annotations = annotations_by_group[item]
 
             result[item] = {
                 'assigned_to': serialize(assignees.get(item.id)),
@@ -208,7 +216,7 @@ class StreamGroupSerializer(GroupSerializer):
 
             segments, interval = self.STATS_PERIOD_CHOICES[self.stats_period]
             now = timezone.now()
-            stats = tsdb.get_range(
+            stats = tsdb.get_range_series(
                 model=tsdb.models.group,
                 keys=group_ids,
                 end=now,
@@ -218,7 +226,7 @@ class StreamGroupSerializer(GroupSerializer):
 
             for item in item_list:
                 attrs[item].update({
-                    'stats': stats[item.id],
+                    'stats': stats.get_points(item.id),
                 })
 
         return attrs
@@ -9,6 +9,8 @@ from __future__ import absolute_import
 
 import logging
 
+from collections import defaultdict
+from django.db import router, transaction
 from django.db.models import F
 
 from sentry.signals import buffer_incr_complete
@@ -56,10 +58,42 @@ class Buffer(object):
         Raise ``InvalidConfiguration`` if there is a configuration error.
         """
 
-    def process_pending(self):
+    def process_pending(self, partition=None):
         return []
 
     def process(self, model, columns, filters, extra=None):
+        created = self._update_row(model, columns, filters, extra)
+        self._send_incr_complete(model, columns, filters, extra, created)
+
+    def process_many(self, items):
+        """
+        Apply a list of ``(model, columns, filters, extra)`` updates, using a
+        single transaction for all rows which share a database.
+
+        If the transaction fails, the rows are retried individually so a
+        single bad row cannot discard the rest of the batch.
+        """
+        items_by_db = defaultdict(list)
+        for item in items:
+            items_by_db[router.db_for_write(item[0])].append(item)
+
+        for using, db_items in items_by_db.iteritems():
+            try:
+                with transaction.atomic(using=using):
+                    results = [(item, self._update_row(*item)) for item in db_items]
+            except Exception:
+                self.logger.exception('buffer.batch-failed')
+                results = []
+                for item in db_items:
+                    try:
+                        results.append((item, self._update_row(*item)))
+                    except Exception:
+                        self.logger.exception('buffer.row-failed')
+
+            for (model, columns, filters, extra), created in results:
+                self._send_incr_complete(model, columns, filters, extra, created)
+
+    def _update_row(self, model, columns, filters, extra=None):
         update_kwargs = dict((c, F(c) + v) for c, v in columns.iteritems())
         if extra:
             update_kwargs.update(extra)
@@ -68,7 +102,9 @@ class Buffer(object):
             values=update_kwargs,
             **filters
         )
+        return created
 
+    def _send_incr_complete(self, model, columns, filters, extra, created):
         buffer_incr_complete.send_robust(
             model=model,
             columns=columns,
@@ -7,6 +7,12 @@ sentry.buffer.redis
 """
 from __future__ import absolute_import
 
+import atexit
+import os
+import threading
+
+from binascii import crc32
+from collections import defaultdict
 from time import time
 
 from django.db import models
@@ -14,7 +20,9 @@ from django.utils.encoding import force_bytes
 
 from sentry.buffer import Buffer
 from sentry.exceptions import InvalidConfiguration
-from sentry.tasks.process_buffer import process_incr
+from sentry.tasks.process_buffer import (
+    process_incr, process_incr_batch, process_pending as process_pending_task
+)
 from sentry.utils import metrics
 from sentry.utils.compat import pickle
 from sentry.utils.hashlib import md5
@@ -22,12 +30,74 @@ from sentry.utils.imports import import_string
 from sentry.utils.redis import get_cluster_from_options
 
 
+class PendingIncr(object):
+    """
+    Increments and extra values for a single buffer key which have been
+    coalesced in-process and not yet written to Redis.
+    """
+    __slots__ = ['model', 'filters', 'columns', 'extra']
+
+    def __init__(self, model, filters):
+        self.model = model
+        self.filters = filters
+        self.columns = defaultdict(int)
+        self.extra = {}
+
+    def merge(self, columns, extra=None):
+        for column, amount in columns.iteritems():
+            self.columns[column] += amount
+        if extra:
+            # last write wins, as it would in Redis
+            self.extra.update(extra)
+
+
 class RedisBuffer(Buffer):
+    """
+    A buffer which accumulates counters in Redis hashes, which are later
+    flushed to the database by ``process_pending``.
+
+    Increments may optionally be coalesced in-process before being written
+    to Redis by setting ``coalesce_interval`` (in seconds). Increments to the
+    same (model, filters) key are merged locally and written as a single
+    pipeline per Redis host when the interval elapses, or sooner once
+    ``coalesce_max_keys`` distinct keys are pending. Increments which fail
+    to be written are kept pending and retried with the next flush.
+
+    Pending increments are flushed when the process (or a Celery worker
+    process) exits, but are lost if it's killed, exits without running
+    ``atexit`` handlers, or Redis is unavailable at the time. That's at most
+    ``coalesce_interval`` seconds (and ``coalesce_max_keys`` keys) worth of
+    increments, traded for far fewer Redis operations on hot keys. Forked
+    processes start without pending increments (the parent still flushes
+    its own.)
+
+    Pending keys are tracked in ``pending_partitions`` sorted sets (per Redis
+    host), each of which is read independently in chunks of
+    ``pending_chunk_size`` keys. When ``incr_batch_size`` is greater than one,
+    pending keys are flushed by tasks which each handle up to that many keys
+    in a single database transaction. The number of partitions may be
+    increased, but should not be decreased while keys are pending.
+    """
     key_expire = 60 * 60  # 1 hour
     pending_key = 'b:p'
 
-    def __init__(self, **options):
+    def __init__(self, coalesce_interval=0, coalesce_max_keys=1000,
+                 pending_partitions=1, pending_chunk_size=1000,
+                 incr_batch_size=1, **options):
         self.cluster, options = get_cluster_from_options('SENTRY_BUFFER_OPTIONS', options)
+        self.coalesce_interval = coalesce_interval
+        self.coalesce_max_keys = coalesce_max_keys
+        self.pending_partitions = pending_partitions
+        self.pending_chunk_size = pending_chunk_size
+        self.incr_batch_size = incr_batch_size
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._flush_timer = None
+        self._pid = os.getpid()
+        if coalesce_interval:
+            from celery.signals import worker_process_shutdown
+            atexit.register(self.flush)
+            worker_process_shutdown.connect(self._flush_on_shutdown, weak=False)
 
     def validate(self):
         try:
@@ -51,6 +121,18 @@ class RedisBuffer(Buffer):
                 for k, v in sorted(filters.iteritems()))).hexdigest(),
         )
 
+    def _get_partition(self, key):
+        if self.pending_partitions == 1:
+            return 0
+        return (crc32(key) & 0xffffffff) % self.pending_partitions
+
+    def _make_pending_key(self, partition=None):
+        # The first partition uses the unpartitioned key so that enabling
+        # partitioning doesn't orphan keys which are already pending.
+        if not partition:
+            return self.pending_key
+        return '%s:%s' % (self.pending_key, partition)
+
     def _make_lock_key(self, key):
         return 'l:%s' % (key,)
 
@@ -66,11 +148,20 @@ class RedisBuffer(Buffer):
         # TODO(dcramer): longer term we'd rather not have to serialize values
         # here (unless it's to JSON)
         key = self._make_key(model, filters)
+
+        if self.coalesce_interval:
+            self._coalesce(key, model, columns, filters, extra)
+            return
+
         # We can't use conn.map() due to wanting to support multiple pending
         # keys (one per Redis shard)
         conn = self.cluster.get_local_client_for_key(key)
 
         pipe = conn.pipeline()
+        self._add_incr_to_pipeline(pipe, key, model, columns, filters, extra)
+        pipe.execute()
+
+    def _add_incr_to_pipeline(self, pipe, key, model, columns, filters, extra=None):
         pipe.hsetnx(key, 'm', '%s.%s' % (model.__module__, model.__name__))
         pipe.hsetnx(key, 'f', pickle.dumps(filters))
         for column, amount in columns.iteritems():
@@ -80,35 +171,161 @@ class RedisBuffer(Buffer):
             for column, value in extra.iteritems():
                 pipe.hset(key, 'e+' + column, pickle.dumps(value))
         pipe.expire(key, self.key_expire)
-        pipe.zadd(self.pending_key, time(), key)
-        pipe.execute()
+        pipe.zadd(self._make_pending_key(self._get_partition(key)), time(), key)
+
+    def _check_fork(self):
+        """
+        Reset the pending increments in a forked process, where they belong
+        to the parent, and the lock and timer (which has no thread) are
+        copies of its own.
+        """
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._pending = {}
+            self._pending_lock = threading.Lock()
+            self._flush_timer = None
 
-    def process_pending(self):
+    def _flush_on_shutdown(self, **kwargs):
+        self.flush()
+
+    def _coalesce(self, key, model, columns, filters, extra=None):
+        self._check_fork()
+        with self._pending_lock:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = self._pending[key] = PendingIncr(model, filters)
+            pending.merge(columns, extra)
+
+            should_flush = len(self._pending) >= self.coalesce_max_keys
+            if not should_flush:
+                self._schedule_flush()
+
+        if should_flush:
+            self.flush()
+
+    def _schedule_flush(self):
+        # must be called while holding the pending lock
+        if self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.coalesce_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def _requeue(self, pending, keys):
+        """
+        Merge increments which could not be written back into the pending
+        increments, so they are retried with the next flush.
+        """
+        with self._pending_lock:
+            for key in keys:
+                item = pending[key]
+                newer = self._pending.get(key)
+                if newer is not None:
+                    # extra values which were set since are more recent
+                    item.merge(newer.columns, newer.extra)
+                self._pending[key] = item
+            self._schedule_flush()
+
+    def flush(self):
+        """
+        Write all increments which have been coalesced in-process to Redis,
+        using one pipeline per Redis host.
+        """
+        self._check_fork()
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+
+        if not pending:
+            return
+
+        router = self.cluster.get_router()
+        keys_by_host = defaultdict(list)
+        for key in pending.iterkeys():
+            keys_by_host[router.get_host_for_key(key)].append(key)
+
+        for host_id, keys in keys_by_host.iteritems():
+            pipe = self.cluster.get_local_client(host_id).pipeline()
+            for key in keys:
+                item = pending[key]
+                self._add_incr_to_pipeline(
+                    pipe, key, item.model, item.columns, item.filters, item.extra,
+                )
+            try:
+                pipe.execute()
+            except Exception:
+                self.logger.exception('buffer.flush-failed', extra={
+                    'host_id': host_id,
+                    'keys': len(keys),
+                })
+                self._requeue(pending, keys)
+
+        metrics.timing('buffer.flush-size', len(pending))
+
+    def process_pending(self, partition=None):
+        if partition is None and self.pending_partitions > 1:
+            # Fan out so each partition is read (and locked) independently
+            for partition in xrange(self.pending_partitions):
+                process_pending_task.apply_async(kwargs={'partition': partition})
+            return
+
+        pending_key = self._make_pending_key(partition)
         client = self.cluster.get_routing_client()
-        lock_key = self._make_lock_key(self.pending_key)
+        lock_key = self._make_lock_key(pending_key)
         # prevent a stampede due to celerybeat + periodic task
         if not client.set(lock_key, '1', nx=True, ex=60):
             return
 
+        # Only consider keys which were pending when we started, so a steady
+        # stream of new increments can't keep this loop running forever.
+        max_score = time()
+
         try:
             for host_id in self.cluster.hosts.iterkeys():
                 conn = self.cluster.get_local_client(host_id)
-                keys = conn.zrange(self.pending_key, 0, -1)
-                if not keys:
-                    continue
                 keycount = 0
-                for key in keys:
-                    keycount += 1
-                    process_incr.apply_async(kwargs={
-                        'key': key,
-                    })
-                pipe = conn.pipeline()
-                pipe.zrem(self.pending_key, *keys)
-                pipe.execute()
-                metrics.timing('buffer.pending-size', keycount)
+                while True:
+                    keys = conn.zrangebyscore(
+                        pending_key, '-inf', max_score,
+                        start=0, num=self.pending_chunk_size,
+                    )
+                    if not keys:
+                        break
+                    keycount += len(keys)
+                    if self.incr_batch_size > 1:
+                        for idx in xrange(0, len(keys), self.incr_batch_size):
+                            process_incr_batch.apply_async(kwargs={
+                                'keys': keys[idx:idx + self.incr_batch_size],
+                            })
+                    else:
+                        for key in keys:
+                            process_incr.apply_async(kwargs={
+                                'key': key,
+                            })
+                    pipe = conn.pipeline()
+                    pipe.zrem(pending_key, *keys)
+                    pipe.execute()
+                    if len(keys) < self.pending_chunk_size:
+                        break
+                if keycount:
+                    metrics.timing('buffer.pending-size', keycount)
         finally:
             client.delete(lock_key)
 
+    def _parse_values(self, values):
+        model = import_string(values['m'])
+        filters = pickle.loads(values['f'])
+        incr_values = {}
+        extra_values = {}
+        for k, v in values.iteritems():
+            if k.startswith('i+'):
+                incr_values[k[2:]] = int(v)
+            elif k.startswith('e+'):
+                extra_values[k[2:]] = pickle.loads(v)
+        return model, incr_values, filters, extra_values
+
     def process(self, key):
         client = self.cluster.get_routing_client()
         lock_key = self._make_lock_key(key)
@@ -123,7 +340,7 @@ class RedisBuffer(Buffer):
             conn = self.cluster.get_local_client_for_key(key)
             pipe = conn.pipeline()
             pipe.hgetall(key)
-            pipe.zrem(self.pending_key, key)
+            pipe.zrem(self._make_pending_key(self._get_partition(key)), key)
             pipe.delete(key)
             values = pipe.execute()[0]
 
@@ -132,16 +349,60 @@ class RedisBuffer(Buffer):
                 self.logger.info('buffer.revoked.empty', extra={'redis_key': key})
                 return
 
-            model = import_string(values['m'])
-            filters = pickle.loads(values['f'])
-            incr_values = {}
-            extra_values = {}
-            for k, v in values.iteritems():
-                if k.startswith('i+'):
-                    incr_values[k[2:]] = int(v)
-                elif k.startswith('e+'):
-                    extra_values[k[2:]] = pickle.loads(v)
+            model, incr_values, filters, extra_values = self._parse_values(values)
 
             super(RedisBuffer, self).process(model, incr_values, filters, extra_values)
         finally:
             client.delete(lock_key)
+
+    def process_batch(self, keys):
+        """
+        Process many pending keys at once, reading them with one pipeline per
+        Redis host and applying all of their updates within one transaction
+        per database.
+        """
+        router = self.cluster.get_router()
+        keys_by_host = defaultdict(list)
+        for key in keys:
+            keys_by_host[router.get_host_for_key(key)].append(key)
+
+        locked_by_host = {}
+        for host_id, host_keys in keys_by_host.iteritems():
+            pipe = self.cluster.get_local_client(host_id).pipeline(transaction=False)
+            for key in host_keys:
+                pipe.set(self._make_lock_key(key), '1', nx=True, ex=10)
+            locked_by_host[host_id] = [
+                key for key, result in zip(host_keys, pipe.execute()) if result
+            ]
+
+        locked = sum(locked_by_host.values(), [])
+        if len(locked) != len(keys):
+            metrics.incr('buffer.revoked', amount=len(keys) - len(locked),
+                         tags={'reason': 'locked'})
+        if not locked:
+            return
+
+        try:
+            items = []
+            for host_id, host_keys in locked_by_host.iteritems():
+                if not host_keys:
+                    continue
+                pipe = self.cluster.get_local_client(host_id).pipeline()
+                for key in host_keys:
+                    pipe.hgetall(key)
+                    pipe.zrem(self._make_pending_key(self._get_partition(key)), key)
+                    pipe.delete(key)
+                results = pipe.execute()
+                for key, values in zip(host_keys, results[::3]):
+                    if not values:
+                        metrics.incr('buffer.revoked', tags={'reason': 'empty'})
+                        self.logger.info('buffer.revoked.empty', extra={'redis_key': key})
+                        continue
+                    items.append(self._parse_values(values))
+
+            self.process_many(items)
+        finally:
+            for host_id, host_keys in locked_by_host.iteritems():
+                if host_keys:
+                    self.cluster.get_local_client(host_id).delete(
+                        *[self._make_lock_key(key) for key in host_keys])
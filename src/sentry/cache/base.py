@@ -28,11 +28,39 @@ class BaseCache(local):
             key,
         )
 
-    def set(self, key, value, timeout, version=None):
+    def set(self, key, value, timeout, version=None, raw=False):
+        """
+        Set the value of a key. If ``raw`` is set, the value is a byte string
+        which is stored as is (i.e. a payload which was already encoded), and
+        has to be read back with ``raw`` as well.
+        """
         raise NotImplementedError
 
+    def set_many(self, mapping, timeout, version=None, raw=False):
+        """
+        Set multiple values at once. Backends which support pipelining should
+        override this to avoid a round trip per key.
+        """
+        for key, value in mapping.iteritems():
+            self.set(key, value, timeout, version=version, raw=raw)
+
     def delete(self, key, version=None):
         raise NotImplementedError
 
-    def get(self, key, version=None):
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self.delete(key, version=version)
+
+    def get(self, key, version=None, raw=False):
         raise NotImplementedError
+
+    def get_many(self, keys, version=None, raw=False):
+        """
+        Return a mapping of the keys which are present to their values.
+        """
+        results = {}
+        for key in keys:
+            value = self.get(key, version=version, raw=raw)
+            if value is not None:
+                results[key] = value
+        return results
@@ -14,11 +14,23 @@ from .base import BaseCache
 
 
 class DjangoCache(BaseCache):
-    def set(self, key, value, timeout, version=None):
+    # Values are pickled by the Django cache, so raw values need no special
+    # treatment.
+
+    def set(self, key, value, timeout, version=None, raw=False):
         cache.set(key, value, timeout, version=version or self.version)
 
+    def set_many(self, mapping, timeout, version=None, raw=False):
+        cache.set_many(mapping, timeout, version=version or self.version)
+
     def delete(self, key, version=None):
         cache.delete(key, version=version or self.version)
 
-    def get(self, key, version=None):
+    def delete_many(self, keys, version=None):
+        cache.delete_many(keys, version=version or self.version)
+
+    def get(self, key, version=None, raw=False):
         return cache.get(key, version=version or self.version)
+
+    def get_many(self, keys, version=None, raw=False):
+        return cache.get_many(keys, version=version or self.version)
@@ -28,9 +28,9 @@ class RedisCache(BaseCache):
 
         super(RedisCache, self).__init__(**options)
 
-    def set(self, key, value, timeout, version=None):
+    def set(self, key, value, timeout, version=None, raw=False):
         key = self.make_key(key, version=version)
-        v = json.dumps(value)
+        v = value if raw else json.dumps(value)
         if len(v) > self.max_size:
             raise ValueTooLarge('Cache key too large: %r %r' % (key, len(v)))
         if timeout:
@@ -38,13 +38,47 @@ class RedisCache(BaseCache):
         else:
             self.client.set(key, v)
 
+    def set_many(self, mapping, timeout, version=None, raw=False):
+        values = {}
+        for key, value in mapping.iteritems():
+            key = self.make_key(key, version=version)
+            v = value if raw else json.dumps(value)
+            if len(v) > self.max_size:
+                raise ValueTooLarge('Cache key too large: %r %r' % (key, len(v)))
+            values[key] = v
+
+        with self.cluster.map() as client:
+            for key, v in values.iteritems():
+                if timeout:
+                    client.setex(key, int(timeout), v)
+                else:
+                    client.set(key, v)
+
     def delete(self, key, version=None):
         key = self.make_key(key, version=version)
         self.client.delete(key)
 
-    def get(self, key, version=None):
+    def delete_many(self, keys, version=None):
+        with self.cluster.map() as client:
+            for key in keys:
+                client.delete(self.make_key(key, version=version))
+
+    def get(self, key, version=None, raw=False):
         key = self.make_key(key, version=version)
         result = self.client.get(key)
-        if result is not None:
+        if result is not None and not raw:
             result = json.loads(result)
         return result
+
+    def get_many(self, keys, version=None, raw=False):
+        with self.cluster.map() as client:
+            promises = dict(
+                (key, client.get(self.make_key(key, version=version)))
+                for key in keys
+            )
+
+        results = {}
+        for key, promise in promises.iteritems():
+            if promise.value is not None:
+                results[key] = promise.value if raw else json.loads(promise.value)
+        return results
@@ -398,6 +398,7 @@ CELERY_IMPORTS = (
     'sentry.tasks.ping',
     'sentry.tasks.post_process',
     'sentry.tasks.process_buffer',
+    'sentry.tasks.search',
 )
 CELERY_QUEUES = [
     Queue('default', routing_key='default'),
@@ -770,6 +771,10 @@ SENTRY_ALLOW_ORIGIN = None
 # Enable scraping of javascript context for source code
 SENTRY_SCRAPE_JAVASCRIPT_CONTEXT = True
 
+# Queue events which no plugin preprocesses straight to ``save_event``,
+# skipping the ``preprocess_event`` task
+SENTRY_SINGLE_HOP_INGEST = False
+
 # Buffer backend
 SENTRY_BUFFER = 'sentry.buffer.Buffer'
 SENTRY_BUFFER_OPTIONS = {}
@@ -793,6 +798,13 @@ CACHES = {
 # CACHES backend.
 CACHE_VERSION = 1
 
+# Models which are looked up with ``get_from_cache`` (i.e. projects, keys and
+# organizations) may also be kept in each process for this many seconds, so
+# that most lookups don't need a request to the cache. Changes which are made
+# by other processes may take as long to be seen. Disabled when ``0``.
+SENTRY_MODEL_CACHE_LOCAL_TTL = 0
+SENTRY_MODEL_CACHE_LOCAL_SIZE = 10000
+
 # Digests backend
 SENTRY_DIGESTS = 'sentry.digests.backends.dummy.DummyBackend'
 SENTRY_DIGESTS_OPTIONS = {}
@@ -824,6 +836,16 @@ SENTRY_SEARCH_OPTIONS = {}
 SENTRY_TSDB = 'sentry.tsdb.dummy.DummyTSDB'
 SENTRY_TSDB_OPTIONS = {}
 
+# Sliding window counters (i.e. for event frequency alert conditions), which
+# are looked up from the time-series storage by default
+SENTRY_COUNTERS = 'sentry.counters.base.Counters'
+SENTRY_COUNTERS_OPTIONS = {}
+# SENTRY_COUNTERS = 'sentry.counters.redis.RedisCounters'
+# SENTRY_COUNTERS_OPTIONS = {
+#     'windows': (60, 60 * 60),
+#     'resolution': 60,
+# }
+
 # rollups must be ordered from highest granularity to lowest
 SENTRY_TSDB_ROLLUPS = (
     # (time in seconds, samples to keep)
@@ -843,6 +865,12 @@ SENTRY_METRICS_OPTIONS = {}
 SENTRY_METRICS_SAMPLE_RATE = 1.0
 SENTRY_METRICS_PREFIX = 'sentry.'
 
+# Profile a sample of ingested events (the store endpoint, and the
+# preprocess_event and save_event tasks), dumping the profiles to
+# SENTRY_PROFILE_DIR (the temporary directory by default)
+SENTRY_PROFILE_SAMPLE_RATE = 0.0
+SENTRY_PROFILE_DIR = None
+
 # URI Prefixes for generating DSN URLs
 # (Defaults to URL_PREFIX by default)
 SENTRY_ENDPOINT = None
@@ -868,12 +896,32 @@ SENTRY_MAX_MESSAGE_LENGTH = 1024 * 8
 SENTRY_MAX_STACKTRACE_FRAMES = 50
 SENTRY_MAX_EXCEPTIONS = 25
 
+# The maximum number of events accepted in a single batch store request
+SENTRY_MAX_BATCH_EVENTS = 100
+
 # Gravatar service base url
 SENTRY_GRAVATAR_BASE_URL = 'https://secure.gravatar.com'
 
 # Timeout (in seconds) for fetching remote source files (e.g. JS)
 SENTRY_SOURCE_FETCH_TIMEOUT = 5
 
+# The maximum number of remote source files (e.g. JS) fetched concurrently
+# when processing an event
+SENTRY_SOURCE_FETCH_CONCURRENCY = 8
+
+# The number of parsed sourcemaps each worker keeps in memory
+SENTRY_SOURCEMAP_INDEX_CACHE_SIZE = 32
+
+# The number of system symbol tables (one per object, i.e. a library for a
+# given SDK and CPU) each worker keeps in memory, and the number of seconds
+# after which they are reloaded to pick up newly imported symbols
+SENTRY_DSYM_SYMBOL_TABLE_CACHE_SIZE = 50
+SENTRY_DSYM_SYMBOL_TABLE_CACHE_TTL = 300
+
+# If set, system symbol tables are also written to this directory and memory
+# mapped, so that they are shared by all workers on a machine
+SENTRY_DSYM_SYMBOL_TABLE_PATH = None
+
 # List of IP subnets which should not be accessible
 SENTRY_DISALLOWED_IPS = ()
 
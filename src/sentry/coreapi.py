@@ -17,6 +17,7 @@ import uuid
 import zlib
 
 from datetime import datetime, timedelta
+from django.conf import settings
 from django.utils.crypto import constant_time_compare
 from django.utils.encoding import smart_str
 from gzip import GzipFile
@@ -24,6 +25,7 @@ from time import time
 
 from sentry.app import env
 from sentry.cache import default_cache
+from sentry.celery import app as celery_app
 from sentry.constants import (
     CLIENT_RESERVED_ATTRS, DEFAULT_LOG_LEVEL, LOG_LEVELS_MAP,
     MAX_TAG_VALUE_LENGTH, MAX_TAG_KEY_LENGTH, VALID_PLATFORMS
@@ -31,9 +33,12 @@ from sentry.constants import (
 from sentry.interfaces.base import get_interface, InterfaceValidationError
 from sentry.interfaces.csp import Csp
 from sentry.models import EventError, Project, ProjectKey, TagKey, TagValue
-from sentry.tasks.store import preprocess_event
-from sentry.utils import json
+from sentry.tasks.store import (
+    get_event_preprocessors, preprocess_event, save_event
+)
+from sentry.utils import json, metrics
 from sentry.utils.auth import parse_auth_header
+from sentry.utils.codecs import encode_event
 from sentry.utils.compat import StringIO
 from sentry.utils.strings import decompress
 from sentry.utils.validators import is_float, is_event_id
@@ -260,10 +265,10 @@ class ClientApiHelper(object):
                 (type(e).__name__, e)
             )
 
-    def safely_load_json_string(self, json_string):
+    def safely_load_json_string(self, json_string, allow_list=False):
         try:
             obj = json.loads(json_string)
-            assert isinstance(obj, dict)
+            assert isinstance(obj, (dict, list) if allow_list else dict)
         except Exception as e:
             # This error should be caught as it suggests that there's a
             # bug somewhere in the client's code.
@@ -272,6 +277,14 @@ class ClientApiHelper(object):
                 (type(e).__name__, e)
             )
 
+        if isinstance(obj, list):
+            # individual items are validated by the caller
+            return [
+                dict((smart_str(k), v) for k, v in item.iteritems())
+                if isinstance(item, dict) else item
+                for item in obj
+            ]
+
         # XXX: ensure keys are coerced to strings
         return dict((smart_str(k), v) for k, v in obj.iteritems())
 
@@ -668,10 +681,43 @@ class ClientApiHelper(object):
         if not got_ip and set_if_missing:
             data.setdefault('sentry.interfaces.User', {})['ip_address'] = ip_address
 
+    def get_ingest_task(self, data):
+        """
+        Return the task and its arguments to queue an event with. Events
+        which no plugin preprocesses are queued to ``save_event`` directly
+        if ``SENTRY_SINGLE_HOP_INGEST`` is enabled.
+        """
+        if settings.SENTRY_SINGLE_HOP_INGEST and not get_event_preprocessors(data):
+            metrics.incr('events.queued', tags={'path': 'single-hop'})
+            return save_event, {'single_hop': True}
+        metrics.incr('events.queued', tags={'path': 'two-hop'})
+        return preprocess_event, {}
+
     def insert_data_to_database(self, data):
         cache_key = 'e:{1}:{0}'.format(data['project'], data['event_id'])
-        default_cache.set(cache_key, data, timeout=3600)
-        preprocess_event.delay(cache_key=cache_key, start_time=time())
+        task, kwargs = self.get_ingest_task(data)
+        default_cache.set(cache_key, encode_event(data), timeout=3600, raw=True)
+        task.delay(cache_key=cache_key, start_time=time(), **kwargs)
+
+    def insert_data_to_database_many(self, data_list):
+        """
+        Queue a batch of events, writing them to the cache in a single
+        pipelined call and publishing every task over one broker connection.
+        """
+        start_time = time()
+        cache_keys = [
+            'e:{1}:{0}'.format(data['project'], data['event_id'])
+            for data in data_list
+        ]
+        default_cache.set_many(dict(
+            (cache_key, encode_event(data))
+            for cache_key, data in zip(cache_keys, data_list)
+        ), timeout=3600, raw=True)
+        with celery_app.producer_or_acquire() as producer:
+            for cache_key, data in zip(cache_keys, data_list):
+                task, kwargs = self.get_ingest_task(data)
+                kwargs.update(cache_key=cache_key, start_time=start_time)
+                task.apply_async(kwargs=kwargs, producer=producer)
 
 
 class CspApiHelper(ClientApiHelper):
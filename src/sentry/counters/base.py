@@ -0,0 +1,67 @@
+"""
+sentry.counters.base
+~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+from datetime import datetime, timedelta
+
+from pytz import utc
+
+from sentry.tsdb.base import TSDBModel
+
+
+class Counters(object):
+    """
+    Counts the items (i.e. events of a group) which were seen within sliding
+    windows of time, such as "the last minute" or "the last hour". Windows
+    are identified by their length in seconds.
+
+    This backend doesn't keep any counters itself, and instead sums up the
+    TSDB rollups which cover each window, so counts are only as accurate as
+    the rollups are.
+    """
+    models = TSDBModel
+
+    def __init__(self, **options):
+        pass
+
+    def validate(self):
+        """
+        Validates the settings for this backend (i.e. such as proper connection
+        info).
+
+        Raise ``InvalidConfiguration`` if there is a configuration error.
+        """
+
+    def incr_multi(self, items, timestamp=None, count=1):
+        """
+        Increment the counters of all windows for each ``(model, key)`` item.
+        """
+
+    def get_counts(self, model, key, windows, timestamp=None):
+        """
+        Return a mapping of each window (in seconds) to the number of items
+        which were counted for ``key`` within the window ending at
+        ``timestamp`` (which defaults to now.)
+        """
+        from sentry.app import tsdb
+
+        windows = list(windows)
+        if not windows:
+            return {}
+
+        if timestamp is None:
+            timestamp = datetime.utcnow().replace(tzinfo=utc)
+
+        results = tsdb.get_range_series_multi([
+            (model, [key], timestamp - timedelta(seconds=window), timestamp, None)
+            for window in windows
+        ])
+        return dict(
+            (window, result.sums()[key])
+            for window, result in zip(windows, results)
+        )
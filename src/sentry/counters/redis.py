@@ -0,0 +1,115 @@
+"""
+sentry.counters.redis
+~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+from datetime import datetime
+from pytz import utc
+from time import time
+
+from sentry.counters.base import Counters
+from sentry.exceptions import InvalidConfiguration
+from sentry.utils.dates import to_timestamp
+from sentry.utils.redis import get_cluster_from_options, load_script
+
+incr_counters = load_script('counters/incr.lua')
+
+
+class RedisCounters(Counters):
+    """
+    Keeps a sliding window counter for each of the configured ``windows``
+    (in seconds) in Redis, which are updated as items are seen so that they
+    can be read with a single lookup.
+
+    Each window is split into ``resolution`` buckets, which are stored as a
+    ring in a single hash per key (see ``scripts/counters/incr.lua``.) Counts
+    cover the buckets which overlap the window, so they may include items
+    from up to one bucket (i.e. ``window / resolution`` seconds) before the
+    start of the window.
+
+    Counts of windows which aren't configured are looked up from the TSDB.
+    """
+
+    def __init__(self, **options):
+        self.cluster, options = get_cluster_from_options('SENTRY_COUNTERS_OPTIONS', options)
+        self.namespace = options.pop('namespace', 'c')
+        self.windows = tuple(options.pop('windows', (60, 60 * 60)))
+        self.resolution = options.pop('resolution', 60)
+        super(RedisCounters, self).__init__(**options)
+
+    def validate(self):
+        try:
+            with self.cluster.all() as client:
+                client.ping()
+        except Exception as e:
+            raise InvalidConfiguration(unicode(e))
+
+    def make_key(self, model, key):
+        return '{}:{}:{}'.format(self.namespace, model.value, key)
+
+    def get_bucket_epoch(self, window, timestamp):
+        return int(timestamp // (float(window) / self.resolution))
+
+    def incr_multi(self, items, timestamp=None, count=1):
+        if timestamp is None:
+            timestamp = time()
+        elif isinstance(timestamp, datetime):
+            timestamp = to_timestamp(timestamp)
+
+        args = [
+            int(max(self.windows) + max(self.windows) / self.resolution) + 1,
+            count,
+        ]
+        for window in self.windows:
+            epoch = self.get_bucket_epoch(window, timestamp)
+            args.extend((window, epoch % self.resolution, epoch))
+
+        # one pipeline per Redis host
+        router = self.cluster.get_router()
+        keys_by_host = {}
+        for model, key in items:
+            key = self.make_key(model, key)
+            keys_by_host.setdefault(router.get_host_for_key(key), []).append(key)
+
+        for host_id, keys in keys_by_host.iteritems():
+            with self.cluster.get_local_client(host_id).pipeline(transaction=False) as pipe:
+                for key in keys:
+                    incr_counters(pipe, [key], args)
+                pipe.execute()
+
+    def get_counts(self, model, key, windows, timestamp=None):
+        if timestamp is None:
+            timestamp = time()
+        elif isinstance(timestamp, datetime):
+            timestamp = to_timestamp(timestamp)
+
+        windows = list(windows)
+        missing = [w for w in windows if w not in self.windows]
+        results = {}
+        if missing:
+            results.update(super(RedisCounters, self).get_counts(
+                model,
+                key,
+                missing,
+                datetime.utcfromtimestamp(timestamp).replace(tzinfo=utc),
+            ))
+
+        windows = [w for w in windows if w in self.windows]
+        if not windows:
+            return results
+
+        redis_key = self.make_key(model, key)
+        values = self.cluster.get_local_client_for_key(redis_key).hgetall(redis_key)
+        for window in windows:
+            end = self.get_bucket_epoch(window, timestamp)
+            total = 0
+            for slot in xrange(self.resolution):
+                epoch = values.get('{}:e{}'.format(window, slot))
+                if epoch is not None and end - self.resolution < int(epoch) <= end:
+                    total += int(values.get('{}:c{}'.format(window, slot), 0))
+            results[window] = total
+        return results
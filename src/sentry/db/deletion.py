@@ -1,11 +1,154 @@
 from __future__ import absolute_import
 
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
 from datetime import timedelta
 from django.db import connections, router
+from django.db.models import Max, Min
+from django.db.models.sql import DeleteQuery
 from django.utils import timezone
+from Queue import Empty, Queue
 
 from sentry.utils import db
 
+logger = logging.getLogger('sentry.deletions')
+
+
+class Throttle(object):
+    """
+    Limits the rate at which rows are deleted (shared by all workers), and
+    pauses deletions while a replica is lagging behind.
+    """
+    def __init__(self, rows_per_second=None, max_replication_lag=None,
+                 replica=None, lag_check_interval=5):
+        self.rows_per_second = rows_per_second
+        self.max_replication_lag = max_replication_lag
+        self.replica = replica
+        self.lag_check_interval = lag_check_interval
+        self._available_at = 0
+        self._lag_checked_at = 0
+        self._lock = threading.Lock()
+
+    def wait(self, rows):
+        """
+        Account for ``rows`` deleted rows, sleeping until deleting more is
+        within the budget and the replica caught up.
+        """
+        if self.rows_per_second:
+            with self._lock:
+                now = time.time()
+                start = max(now, self._available_at)
+                self._available_at = start + float(rows) / self.rows_per_second
+            if start > now:
+                time.sleep(start - now)
+
+        if self.max_replication_lag is not None and self.replica is not None:
+            if time.time() - self._lag_checked_at < self.lag_check_interval:
+                return
+            while True:
+                self._lag_checked_at = time.time()
+                lag = db.get_replication_lag(self.replica)
+                if lag is None or lag <= self.max_replication_lag:
+                    return
+                logger.info('Pausing deletions, replica is %.1fs behind', lag)
+                time.sleep(self.lag_check_interval)
+
+
+class Checkpoint(object):
+    """
+    Records which parts of a partitioned deletion are left to do in a (JSON)
+    file, so a deletion which was interrupted can be resumed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                self._state = json.load(f)
+        else:
+            self._state = {}
+
+    def get(self, key):
+        """
+        Return the ranges of IDs which are left to delete, or ``None`` if the
+        deletion was not started.
+        """
+        ranges = self._state.get(key)
+        if ranges is None:
+            return None
+        return [tuple(r) for r in ranges]
+
+    def set(self, key, ranges):
+        with self._lock:
+            self._state[key] = [list(r) for r in ranges]
+            self._save()
+
+    def update(self, key, index, lower):
+        """
+        Record that the IDs of the ``index``th range below ``lower`` were
+        deleted.
+        """
+        with self._lock:
+            self._state[key][index][0] = lower
+            self._save()
+
+    def complete(self, key):
+        with self._lock:
+            self._state.pop(key, None)
+            self._save()
+
+    def _save(self):
+        temporary_path = '%s.%s' % (self.path, uuid.uuid4().hex)
+        with open(temporary_path, 'w') as f:
+            json.dump(self._state, f)
+        os.rename(temporary_path, self.path)
+
+
+def _run_workers(func, items, concurrency):
+    """
+    Call ``func`` for every item, in ``concurrency`` threads. The first
+    exception which was raised by ``func`` is raised once all threads
+    stopped.
+    """
+    if concurrency <= 1:
+        for item in items:
+            func(item)
+        return
+
+    queue = Queue()
+    for item in items:
+        queue.put(item)
+    errors = []
+
+    def worker():
+        try:
+            while not errors:
+                try:
+                    item = queue.get_nowait()
+                except Empty:
+                    return
+                func(item)
+        except Exception as e:
+            logger.exception('Deletion worker failed')
+            errors.append(e)
+        finally:
+            # every thread has connections of its own
+            for connection in connections.all():
+                connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in xrange(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
 
 class BulkDeleteQuery(object):
     def __init__(self, model, project_id=None, dtfield=None, days=None):
@@ -15,7 +158,7 @@ class BulkDeleteQuery(object):
         self.days = int(days) if days is not None else None
         self.using = router.db_for_write(model)
 
-    def execute_postgres(self, chunk_size=10000):
+    def execute_postgres(self, chunk_size=10000, throttle=None):
         quote_name = connections[self.using].ops.quote_name
 
         where = []
@@ -46,16 +189,18 @@ class BulkDeleteQuery(object):
             where=where_clause,
         )
 
-        return self._continuous_query(query)
+        return self._continuous_query(query, throttle)
 
-    def _continuous_query(self, query):
+    def _continuous_query(self, query, throttle=None):
         results = True
         cursor = connections[self.using].cursor()
         while results:
             cursor.execute(query)
             results = cursor.rowcount > 0
+            if results and throttle is not None:
+                throttle.wait(cursor.rowcount)
 
-    def execute_generic(self, chunk_size=100):
+    def get_queryset(self):
         qs = self.model.objects.all()
 
         if self.days:
@@ -68,18 +213,382 @@ class BulkDeleteQuery(object):
                 qs = qs.filter(project=self.project_id)
             else:
                 qs = qs.filter(project_id=self.project_id)
+        return qs
+
+    def execute_generic(self, chunk_size=100, throttle=None):
+        qs = self.get_queryset()
 
         # XXX: we step through because the deletion collector will pull all
         # relations into memory
         exists = True
         while exists:
             exists = False
+            deleted = 0
             for item in qs[:chunk_size].iterator():
                 item.delete()
                 exists = True
+                deleted += 1
+            if deleted and throttle is not None:
+                throttle.wait(deleted)
 
-    def execute(self, chunk_size=10000):
+    def execute(self, chunk_size=10000, throttle=None):
         if db.is_postgres():
-            self.execute_postgres(chunk_size)
+            self.execute_postgres(chunk_size, throttle=throttle)
         else:
-            self.execute_generic(chunk_size)
+            self.execute_generic(chunk_size, throttle=throttle)
+
+    def get_partitions(self, partitions):
+        """
+        Split the IDs of the rows to delete into (at most) ``partitions``
+        ranges of the same size (except for the last one, which may be
+        smaller.) The ranges are inclusive.
+        """
+        bounds = self.get_queryset().aggregate(lower=Min('id'), upper=Max('id'))
+        lower, upper = bounds['lower'], bounds['upper']
+        if lower is None:
+            return []
+
+        size = -(-(upper - lower + 1) // partitions)
+        ranges = []
+        while lower <= upper:
+            ranges.append((lower, min(lower + size - 1, upper)))
+            lower += size
+        return ranges
+
+    def delete_rows(self, ids):
+        """
+        Delete the rows with the given IDs.
+
+        Rows which other rows refer to are deleted one by one (so the
+        deletion cascades.) Otherwise, the rows are deleted with a single
+        query, and the nodes of their node fields with a single call to the
+        node store.
+        """
+        from sentry.app import nodestore
+        from sentry.db.models.fields.node import NodeField
+
+        if self.model._meta.get_all_related_objects():
+            for item in self.model.objects.filter(id__in=ids):
+                item.delete()
+            return
+
+        node_fields = [
+            f.name for f in self.model._meta.fields
+            if isinstance(f, NodeField)
+        ]
+        if node_fields:
+            node_ids = []
+            for item in self.model.objects.filter(id__in=ids):
+                for name in node_fields:
+                    node_id = getattr(item, name).id
+                    if node_id:
+                        node_ids.append(node_id)
+            if node_ids:
+                nodestore.delete_multi(node_ids)
+
+        DeleteQuery(self.model).delete_batch(ids, self.using)
+
+    def execute_partitioned(self, partitions=1, concurrency=1, chunk_size=100,
+                            throttle=None, checkpoint=None):
+        """
+        Delete the rows in ID ranges (see ``get_partitions``), which are
+        deleted in parallel by ``concurrency`` workers.
+
+        If a ``Checkpoint`` is given, the progress of every range is
+        recorded after each chunk, and a deletion which did not complete
+        continues where it stopped.
+        """
+        key = '{}:{}:{}:{}'.format(
+            self.model._meta.db_table, self.dtfield, self.days, self.project_id,
+        )
+
+        ranges = checkpoint.get(key) if checkpoint is not None else None
+        if ranges is None:
+            ranges = self.get_partitions(partitions)
+            if checkpoint is not None:
+                checkpoint.set(key, ranges)
+
+        qs = self.get_queryset()
+
+        def delete_range(item):
+            index, (lower, upper) = item
+            while True:
+                ids = list(qs.filter(
+                    id__gte=lower, id__lte=upper,
+                ).order_by('id').values_list('id', flat=True)[:chunk_size])
+                if not ids:
+                    return
+                self.delete_rows(ids)
+                lower = ids[-1] + 1
+                if checkpoint is not None:
+                    checkpoint.update(key, index, lower)
+                if throttle is not None:
+                    throttle.wait(len(ids))
+
+        _run_workers(delete_range, list(enumerate(ranges)), concurrency)
+
+        if checkpoint is not None:
+            checkpoint.complete(key)
+
+
+# Columns which refer to the rows of another model without a foreign key (as
+# the tables are too large for the constraint), which deletions cascade to.
+SOFT_REFERENCES = (
+    ('sentry.Event', 'group_id', 'sentry.Group'),
+    ('sentry.Event', 'project_id', 'sentry.Project'),
+    ('sentry.EventMapping', 'group_id', 'sentry.Group'),
+    ('sentry.EventMapping', 'project_id', 'sentry.Project'),
+    ('sentry.EventTag', 'event_id', 'sentry.Event'),
+    ('sentry.EventTag', 'group_id', 'sentry.Group'),
+    ('sentry.EventTag', 'project_id', 'sentry.Project'),
+    ('sentry.GroupRedirect', 'group_id', 'sentry.Group'),
+    ('sentry.GroupRelease', 'group_id', 'sentry.Group'),
+    ('sentry.GroupRelease', 'project_id', 'sentry.Project'),
+    ('sentry.GroupRelease', 'release_id', 'sentry.Release'),
+    ('sentry.ProjectBookmark', 'project_id', 'sentry.Project'),
+    ('sentry.ProjectPlatform', 'project_id', 'sentry.Project'),
+)
+
+
+def _get_model(label):
+    from django.db.models import get_model
+
+    return get_model(*label.split('.', 1))
+
+
+def get_references(model):
+    """
+    Return the ``(model, field)`` pairs of the (foreign key and soft)
+    references to ``model``, and what should happen to the rows which refer
+    to a deleted row: ``'delete'``, ``'nullify'`` or ``None`` if it is
+    protected.
+    """
+    from django.db.models import CASCADE, SET_NULL
+
+    references = []
+    for related in model._meta.get_all_related_objects(include_hidden=True):
+        on_delete = related.field.rel.on_delete
+        if on_delete is CASCADE:
+            action = 'delete'
+        elif on_delete is SET_NULL:
+            action = 'nullify'
+        else:
+            action = None
+        references.append((related.model, related.field, action))
+
+    for label, name, referenced in SOFT_REFERENCES:
+        if _get_model(referenced) is model:
+            related_model = _get_model(label)
+            references.append(
+                (related_model, related_model._meta.get_field(name), 'delete'))
+    return references
+
+
+class DeletionStep(object):
+    """
+    The rows of ``model`` which refer (with ``field``) to the rows of the
+    ``parent`` step, which are deleted or (with ``nullify``) no longer refer
+    to them.
+    """
+    def __init__(self, model, queryset, depth, field=None, nullify=False,
+                 object_id=None):
+        self.model = model
+        self.queryset = queryset
+        self.depth = depth
+        self.field = field
+        self.nullify = nullify
+        self.object_id = object_id
+        self.using = router.db_for_write(model)
+        # chunks continue after the last ID of the previous chunk, rather
+        # than scanning (and sorting) the remaining rows again
+        self.last_id = 0
+
+    def __repr__(self):
+        return '<%s: %s%s%s>' % (
+            type(self).__name__,
+            self.model.__name__,
+            '.%s' % (self.field.name,) if self.field else '',
+            ' (nullify)' if self.nullify else '',
+        )
+
+    def get_child_queryset(self, model, field):
+        attname = field.attname
+        if self.object_id is not None:
+            # the root of the plan, i.e. a single row
+            return model.objects.filter(**{attname: self.object_id})
+        return model.objects.filter(**{
+            '{}__in'.format(attname): self.queryset.values('id'),
+        })
+
+    def execute_chunk(self, chunk_size=1000):
+        """
+        Delete (or nullify) a chunk of rows, returning the number of rows.
+        """
+        from sentry.app import nodestore
+        from sentry.db.models.fields.node import NodeField
+
+        ids = list(self.queryset.filter(
+            id__gt=self.last_id,
+        ).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return 0
+        self.last_id = ids[-1]
+
+        # only the selected rows, as rows which were inserted since have no
+        # nodes deleted
+        queryset = self.model.objects.filter(id__in=ids)
+        if self.nullify:
+            queryset.update(**{self.field.name: None})
+            return len(ids)
+
+        node_fields = [
+            f.name for f in self.model._meta.fields
+            if isinstance(f, NodeField)
+        ]
+        if node_fields:
+            node_ids = []
+            for item in self.model.objects.filter(id__in=ids):
+                for name in node_fields:
+                    node_id = getattr(item, name).id
+                    if node_id:
+                        node_ids.append(node_id)
+            if node_ids:
+                nodestore.delete_multi(node_ids)
+
+        queryset._raw_delete(self.using)
+        return len(ids)
+
+
+class DeletionPlan(object):
+    """
+    Deletes everything which refers to a row (i.e. what deleting it would
+    cascade to), with bulk deletions of ranges of rows per table.
+
+    The plan follows the foreign keys (and ``SOFT_REFERENCES``) to the row
+    and the rows which refer to those, and so on. Rows are deleted before
+    the rows they refer to, and the nodes of node fields are deleted with a
+    call to ``nodestore.delete_multi`` per chunk. The row itself is left to
+    the caller (who may need to send signals.)
+
+    The rows of ``priority`` models (which nothing may refer to) are deleted
+    first, and ``exclude`` models are left alone.
+
+    >>> plan = DeletionPlan(Project, project.id)
+    >>> while plan.execute(limit=100000):
+    >>>     print plan.rows_per_second
+    >>> project.delete()
+    """
+    def __init__(self, model, object_id, priority=(), exclude=(),
+                 chunk_size=1000):
+        self.model = model
+        self.object_id = object_id
+        self.priority = priority
+        self.exclude = exclude
+        self.chunk_size = chunk_size
+        self.steps = self.get_steps()
+        self.deleted = {}
+        self.duration = 0
+
+    def get_steps(self):
+        root = DeletionStep(
+            self.model, self.model.objects.filter(id=self.object_id), 0,
+            object_id=self.object_id,
+        )
+
+        # every path of references to the row (without repeating models),
+        # breadth first
+        steps = []
+        pending = [(root, (self.model,))]
+        while pending:
+            parent, path = pending.pop(0)
+            for model, field, action in get_references(parent.model):
+                if action is None or model in path or model in self.exclude:
+                    continue
+                step = DeletionStep(
+                    model,
+                    parent.get_child_queryset(model, field),
+                    parent.depth + 1,
+                    field=field,
+                    nullify=(action == 'nullify'),
+                )
+                steps.append(step)
+                if action == 'delete':
+                    pending.append((step, path + (model,)))
+        return self.sort_steps(steps)
+
+    def sort_steps(self, steps):
+        """
+        Order the steps so the rows of a model are deleted before the rows
+        they refer to (and the deepest first, where references are cyclic.)
+        Rows are nullified before anything is deleted.
+        """
+        models = set(s.model for s in steps if not s.nullify)
+        references = dict(
+            (m, set(
+                f.rel.to for f in m._meta.fields
+                if f.rel is not None and f.rel.to in models and f.rel.to is not m
+            ))
+            for m in models
+        )
+        for label, name, referenced in SOFT_REFERENCES:
+            model, referenced = _get_model(label), _get_model(referenced)
+            if model in models and referenced in models:
+                references[model].add(referenced)
+        depths = {}
+        for step in steps:
+            depths[step.model] = max(depths.get(step.model, 0), step.depth)
+
+        order = []
+        remaining = set(models)
+        while remaining:
+            # models which no other remaining model refers to
+            ready = [
+                m for m in remaining
+                if not any(m in references[o] for o in remaining if o is not m)
+            ]
+            if not ready:
+                ready = [max(remaining, key=lambda m: depths[m])]
+            for model in sorted(ready, key=lambda m: (-depths[m], m.__name__)):
+                order.append(model)
+                remaining.discard(model)
+
+        position = dict((m, idx) for idx, m in enumerate(order))
+        return sorted(steps, key=lambda s: (
+            not s.nullify, s.model not in self.priority,
+            position.get(s.model, -1), s.depth,
+        ))
+
+    @property
+    def rows_per_second(self):
+        if not self.duration:
+            return None
+        return sum(self.deleted.itervalues()) / self.duration
+
+    def execute(self, limit=None, logger=None):
+        """
+        Run the steps of the plan until all rows were deleted, or (at least)
+        ``limit`` rows. Returns whether any rows are left.
+        """
+        from sentry.utils import metrics
+
+        count = 0
+        for step in self.steps:
+            while True:
+                if limit is not None and count >= limit:
+                    return True
+                start = time.time()
+                rows = step.execute_chunk(self.chunk_size)
+                self.duration += time.time() - start
+                if not rows:
+                    break
+                count += rows
+                name = step.model.__name__
+                self.deleted[name] = self.deleted.get(name, 0) + rows
+                metrics.incr('deletions.rows', rows, instance=name)
+                if logger is not None:
+                    logger.info('remove.%s' % name.lower(), extra={
+                        'model': name,
+                        'rows': self.deleted[name],
+                        'rows_per_second': self.rows_per_second,
+                    })
+        return False
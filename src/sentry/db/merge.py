@@ -0,0 +1,218 @@
+"""
+sentry.db.merge
+~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+from django.db import IntegrityError, connections, router, transaction
+
+from sentry.utils import db
+
+
+class BulkMergeQuery(object):
+    """
+    Moves the rows of a model which belong to one group to another group, a
+    chunk of rows per query.
+
+    ``unique_fields`` are the fields which identify a row within a group
+    (i.e. the unique constraint without the group.) Rows which the other
+    group has as well are merged into the rows of the other group rather
+    than moved: ``sum_fields`` are added up, ``min_fields`` and
+    ``max_fields`` take the lowest and highest value, and anything else is
+    kept as it is in the other group. If ``unique_fields`` is empty a group
+    has (at most) one row, and if it is ``None`` rows are always moved.
+
+    >>> BulkMergeQuery(
+    >>>     GroupTagValue, from_id=1, to_id=2,
+    >>>     unique_fields=('key', 'value'),
+    >>>     sum_fields=('times_seen',),
+    >>> ).execute()
+    """
+    def __init__(self, model, from_id, to_id, unique_fields=None,
+                 sum_fields=(), min_fields=(), max_fields=()):
+        self.model = model
+        self.from_id = from_id
+        self.to_id = to_id
+        self.unique_fields = unique_fields
+        self.sum_fields = sum_fields
+        self.min_fields = min_fields
+        self.max_fields = max_fields
+        self.using = router.db_for_write(model)
+
+        if 'group' in model._meta.get_all_field_names():
+            self.group_field = model._meta.get_field('group')
+        else:
+            self.group_field = model._meta.get_field('group_id')
+
+    def _get_attnames(self):
+        return [self.model._meta.get_field(f).attname for f in self.unique_fields]
+
+    def _get_key(self, obj, attnames):
+        return tuple(getattr(obj, a) for a in attnames)
+
+    def _get_merged_values(self, source, target):
+        values = {}
+        for name in self.sum_fields:
+            field = self.model._meta.get_field(name)
+            value = getattr(target, name) + getattr(source, name)
+            max_value = getattr(field, 'MAX_VALUE', None)
+            if max_value is not None:
+                value = min(value, max_value)
+            values[name] = value
+        for name, func in [(n, min) for n in self.min_fields] + \
+                          [(n, max) for n in self.max_fields]:
+            candidates = [
+                v for v in (getattr(target, name), getattr(source, name))
+                if v is not None
+            ]
+            if candidates:
+                values[name] = func(candidates)
+        return values
+
+    def execute_generic_chunk(self, chunk_size=1000):
+        attname = self.group_field.attname
+        rows = list(self.model.objects.filter(**{
+            attname: self.from_id,
+        }).order_by('id')[:chunk_size])
+        if not rows:
+            return 0
+
+        conflicts = {}
+        if self.unique_fields is not None:
+            attnames = self._get_attnames()
+            sources = dict((self._get_key(r, attnames), r) for r in rows)
+            targets = self.model.objects.filter(**{attname: self.to_id})
+            if attnames:
+                targets = targets.filter(**{
+                    '{}__in'.format(attnames[0]): set(k[0] for k in sources),
+                })
+            for target in targets:
+                source = sources.get(self._get_key(target, attnames))
+                if source is not None:
+                    conflicts[source.id] = (source, target)
+
+        with transaction.atomic(using=self.using):
+            for source, target in conflicts.itervalues():
+                values = self._get_merged_values(source, target)
+                if values:
+                    self.model.objects.filter(id=target.id).update(**values)
+            if conflicts:
+                self.model.objects.filter(id__in=list(conflicts)).delete()
+            moved = [r.id for r in rows if r.id not in conflicts]
+            if moved:
+                self.model.objects.filter(id__in=moved).update(**{
+                    self.group_field.name: self.to_id,
+                })
+        return len(rows)
+
+    def execute_postgres_chunk(self, chunk_size=1000):
+        quote_name = connections[self.using].ops.quote_name
+        table = quote_name(self.model._meta.db_table)
+        group = quote_name(self.group_field.column)
+        cursor = connections[self.using].cursor()
+
+        if self.unique_fields is not None:
+            match = ' '.join(
+                'AND dst.{0} = src.{0}'.format(
+                    quote_name(self.model._meta.get_field(f).column))
+                for f in self.unique_fields
+            )
+
+            with transaction.atomic(using=self.using):
+                cursor.execute("""
+                    SELECT src.id
+                    FROM {table} src
+                    WHERE src.{group} = %s
+                    AND EXISTS (
+                        SELECT 1 FROM {table} dst
+                        WHERE dst.{group} = %s {match}
+                    )
+                    LIMIT {chunk_size}
+                    FOR UPDATE
+                """.format(
+                    table=table, group=group, match=match, chunk_size=chunk_size,
+                ), [self.from_id, self.to_id])
+                ids = [r[0] for r in cursor.fetchall()]
+
+                if ids:
+                    assignments = []
+                    for name in self.sum_fields:
+                        field = self.model._meta.get_field(name)
+                        column = quote_name(field.column)
+                        value = 'dst.{0}::bigint + src.{0}'.format(column)
+                        max_value = getattr(field, 'MAX_VALUE', None)
+                        if max_value is not None:
+                            value = 'LEAST({}, {})'.format(value, max_value)
+                        assignments.append('{} = {}'.format(column, value))
+                    for func, names in (('LEAST', self.min_fields),
+                                        ('GREATEST', self.max_fields)):
+                        for name in names:
+                            column = quote_name(self.model._meta.get_field(name).column)
+                            assignments.append('{0} = {1}(dst.{0}, src.{0})'.format(
+                                column, func))
+
+                    if assignments:
+                        cursor.execute("""
+                            UPDATE {table} dst
+                            SET {assignments}
+                            FROM {table} src
+                            WHERE src.id = ANY(%s)
+                            AND dst.{group} = %s {match}
+                        """.format(
+                            table=table, group=group, match=match,
+                            assignments=', '.join(assignments),
+                        ), [ids, self.to_id])
+                    cursor.execute("""
+                        DELETE FROM {table} WHERE id = ANY(%s)
+                    """.format(table=table), [ids])
+                    return len(ids)
+
+        with transaction.atomic(using=self.using):
+            cursor.execute("""
+                UPDATE {table}
+                SET {group} = %s
+                WHERE id = ANY(ARRAY(
+                    SELECT id FROM {table}
+                    WHERE {group} = %s
+                    LIMIT {chunk_size}
+                ))
+            """.format(
+                table=table, group=group, chunk_size=chunk_size,
+            ), [self.to_id, self.from_id])
+            return cursor.rowcount
+
+    def execute_chunk(self, chunk_size=1000):
+        """
+        Merge a chunk of rows, returning the number of rows which were
+        merged (zero once all of them were.)
+        """
+        if db.is_postgres(self.using):
+            func = self.execute_postgres_chunk
+        else:
+            func = self.execute_generic_chunk
+
+        try:
+            return func(chunk_size)
+        except IntegrityError:
+            # rows were added to the other group since looking for the rows
+            # the groups both have
+            if self.unique_fields is None:
+                raise
+            return func(chunk_size)
+
+    def execute(self, chunk_size=1000, limit=None):
+        """
+        Merge chunks of rows until all of them (or at least ``limit`` rows)
+        were merged. Returns the number of rows which were merged, and
+        whether any rows are left.
+        """
+        merged = 0
+        while limit is None or merged < limit:
+            count = self.execute_chunk(chunk_size)
+            if not count:
+                return merged, False
+            merged += count
+        return merged, True
@@ -13,6 +13,11 @@ import six
 import threading
 import weakref
 
+from time import time
+from uuid import uuid4
+
+from six.moves import cPickle as pickle
+
 from django.conf import settings
 from django.db import router
 from django.db.models import Manager, Model
@@ -22,6 +27,7 @@ from django.utils.encoding import smart_str
 from hashlib import md5
 
 from sentry.utils.cache import cache
+from sentry.utils.lru import LRUCache
 
 from .query import create_or_update
 
@@ -29,6 +35,34 @@ __all__ = ('BaseManager',)
 
 logger = logging.getLogger('sentry')
 
+_local_cache = None
+
+
+def get_local_cache():
+    """
+    Return the process local tier of the model cache, or ``None`` when it's
+    disabled (see ``SENTRY_MODEL_CACHE_LOCAL_TTL``.)
+
+    Entries are used without asking the shared cache for up to the TTL.
+    After that, cached instances are checked against a version stamp in the
+    shared cache, which is changed whenever an instance is saved or deleted
+    (see ``BaseManager.__cache_get_many``), and kept for another TTL if it
+    did not change.
+    """
+    global _local_cache
+    if not settings.SENTRY_MODEL_CACHE_LOCAL_TTL:
+        return None
+    size = settings.SENTRY_MODEL_CACHE_LOCAL_SIZE
+    local_cache = _local_cache
+    if local_cache is None or local_cache.max_size != size:
+        local_cache = _local_cache = LRUCache(size)
+    return local_cache
+
+
+def clear_local_cache():
+    if _local_cache is not None:
+        _local_cache.clear()
+
 
 class ImmutableDict(dict):
     def __setitem__(self, key, value):
@@ -152,27 +186,24 @@ class BaseManager(Manager):
                 continue
             # store pointers
             value = self.__value_for_field(instance, key)
-            cache.set(
-                key=self.__get_lookup_cache_key(**{key: value}),
-                value=pk_val,
-                timeout=self.cache_ttl,
-                version=self.cache_version,
-            )
+            self.__cache_set(self.__get_lookup_cache_key(**{key: value}), pk_val)
 
         # Ensure we don't serialize the database into the cache
         db = instance._state.db
         instance._state.db = None
-        # store actual object
+        # store actual object (with a new version stamp, which is changed in
+        # the shared cache once the object is)
+        stamp = uuid4().hex
         try:
-            cache.set(
-                key=self.__get_lookup_cache_key(**{pk_name: pk_val}),
-                value=instance,
-                timeout=self.cache_ttl,
-                version=self.cache_version,
+            self.__cache_set(
+                self.__get_lookup_cache_key(**{pk_name: pk_val}),
+                instance,
+                stamp=stamp,
             )
         except Exception as e:
             logger.error(e, exc_info=True)
         instance._state.db = db
+        self.__set_stamp(pk_val, stamp)
 
         # Kill off any keys which are no longer valid
         if instance in self.__cache:
@@ -182,10 +213,7 @@ class BaseManager(Manager):
                 value = self.__cache[instance][key]
                 current_value = self.__value_for_field(instance, key)
                 if value != current_value:
-                    cache.delete(
-                        key=self.__get_lookup_cache_key(**{key: value}),
-                        version=self.cache_version,
-                    )
+                    self.__cache_delete(self.__get_lookup_cache_key(**{key: value}))
 
         self.__cache_state(instance)
 
@@ -199,19 +227,125 @@ class BaseManager(Manager):
                 continue
             # remove pointers
             value = self.__value_for_field(instance, key)
-            cache.delete(
-                key=self.__get_lookup_cache_key(**{key: value}),
-                version=self.cache_version,
-            )
+            self.__cache_delete(self.__get_lookup_cache_key(**{key: value}))
         # remove actual object
-        cache.delete(
-            key=self.__get_lookup_cache_key(**{pk_name: instance.pk}),
-            version=self.cache_version,
-        )
+        self.__cache_delete(self.__get_lookup_cache_key(**{pk_name: instance.pk}))
+        self.__set_stamp(instance.pk, uuid4().hex)
 
     def __get_lookup_cache_key(self, **kwargs):
         return make_key(self.model, 'modelcache', kwargs)
 
+    def __get_stamp_key(self, pk):
+        return make_key(self.model, 'modelstamp', {self.model._meta.pk.name: pk})
+
+    def __set_stamp(self, pk, stamp):
+        """
+        Change the version stamp of an instance in the shared cache, which
+        invalidates the copies other processes cache locally.
+        """
+        cache.set(
+            key=self.__get_stamp_key(pk),
+            value=stamp,
+            timeout=self.cache_ttl,
+            version=self.cache_version,
+        )
+
+    def __cache_set(self, key, value, stamp=None):
+        """
+        Store a value in both the shared and the local cache. Values are
+        pickled for the local cache so every lookup returns its own copy.
+        """
+        cache.set(
+            key=key,
+            value=value,
+            timeout=self.cache_ttl,
+            version=self.cache_version,
+        )
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            local_cache.set(
+                (key, self.cache_version),
+                (stamp, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time()),
+            )
+
+    def __cache_delete(self, key):
+        cache.delete(key=key, version=self.cache_version)
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            local_cache.delete((key, self.cache_version))
+
+    def __cache_get_many(self, keys, pks=None):
+        """
+        Return a mapping of the keys which are present in either cache to
+        their values, only asking the shared cache for the keys which aren't
+        cached locally (or were cached more than the local TTL ago.)
+
+        Locally cached instances (``pks`` maps their keys to their primary
+        keys) which are older than the TTL are kept if their version stamp
+        is still the one in the shared cache, which is requested along with
+        the missing keys. Other keys (pointers to a primary key) are fetched
+        again, and are checked by the callers against the instance they
+        point to.
+        """
+        local_cache = get_local_cache()
+        if local_cache is None:
+            return cache.get_many(list(keys), version=self.cache_version)
+
+        pks = pks or {}
+        now = time()
+        ttl = settings.SENTRY_MODEL_CACHE_LOCAL_TTL
+        results = {}
+        expired = {}
+        missing = []
+        for key in keys:
+            entry = local_cache.get((key, self.cache_version))
+            if entry is None:
+                missing.append(key)
+            elif now - entry[2] < ttl:
+                results[key] = pickle.loads(entry[1])
+            elif entry[0] is not None and key in pks:
+                expired[key] = entry
+            else:
+                missing.append(key)
+
+        if not missing and not expired:
+            return results
+
+        stamp_keys = dict(
+            (key, self.__get_stamp_key(pks[key]))
+            for key in missing + expired.keys() if key in pks
+        )
+        request = set(missing)
+        request.update(stamp_keys.itervalues())
+        found = cache.get_many(list(request), version=self.cache_version)
+
+        stale = []
+        for key, (stamp, value, _) in expired.iteritems():
+            if found.get(stamp_keys[key]) != stamp:
+                stale.append(key)
+                continue
+            local_cache.set((key, self.cache_version), (stamp, value, now))
+            results[key] = pickle.loads(value)
+
+        if stale:
+            # the stamps were read first, so the values are at least as new
+            found.update(cache.get_many(stale, version=self.cache_version))
+            missing.extend(stale)
+
+        for key in missing:
+            value = found.get(key)
+            if value is None:
+                local_cache.delete((key, self.cache_version))
+                continue
+            stamp = found.get(stamp_keys[key]) if key in stamp_keys else None
+            local_cache.set(
+                (key, self.cache_version),
+                (stamp, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), now),
+            )
+            results[key] = value
+
+        return results
+
     def __value_for_field(self, instance, key):
         """
         Return the cacheable value for a field.
@@ -254,7 +388,11 @@ class BaseManager(Manager):
         if key in self.cache_fields or key == pk_name:
             cache_key = self.__get_lookup_cache_key(**{key: value})
 
-            retval = cache.get(cache_key, version=self.cache_version)
+            if key == pk_name:
+                pks = {cache_key: value}
+            else:
+                pks = None
+            retval = self.__cache_get_many([cache_key], pks).get(cache_key)
             if retval is None:
                 result = self.get(**kwargs)
                 # Ensure we're pushing it into the cache
@@ -264,7 +402,13 @@ class BaseManager(Manager):
             # If we didn't look up by pk we need to hit the reffed
             # key
             if key != pk_name:
-                return self.get_from_cache(**{pk_name: retval})
+                result = self.get_from_cache(**{pk_name: retval})
+                # the pointer may be stale (cached locally before the field
+                # changed)
+                if six.text_type(self.__value_for_field(result, key)) != six.text_type(value):
+                    result = self.get(**kwargs)
+                    self.__post_save(instance=result)
+                return result
 
             if type(retval) != self.model:
                 if settings.DEBUG:
@@ -284,6 +428,76 @@ class BaseManager(Manager):
         else:
             return self.get(**kwargs)
 
+    def get_many_from_cache(self, values, key='pk'):
+        """
+        Wrapper around ``QuerySet.filter(<key>__in=values)`` which looks up
+        all of the values with a single request to each tier of the cache.
+        Only unique (cached) fields may be used as the key.
+
+        Returns the instances which were found, in the order of ``values``.
+        """
+        pk_name = self.model._meta.pk.name
+        if key == 'pk':
+            key = pk_name
+
+        values = [v.pk if isinstance(v, Model) else v for v in values]
+
+        if not self.cache_fields or (key not in self.cache_fields and key != pk_name):
+            return list(self.filter(**{'%s__in' % key: values}))
+
+        cache_keys = dict(
+            (self.__get_lookup_cache_key(**{key: value}), value)
+            for value in values
+        )
+        if key == pk_name:
+            pks = cache_keys
+        else:
+            pks = None
+        cached = self.__cache_get_many(cache_keys.keys(), pks)
+
+        db = router.db_for_read(self.model)
+        results = {}
+        missing = []
+        pointers = {}
+        for cache_key, value in cache_keys.iteritems():
+            retval = cached.get(cache_key)
+            if retval is None:
+                missing.append(value)
+            elif key != pk_name:
+                pointers[retval] = value
+            elif type(retval) != self.model or six.text_type(retval.pk) != six.text_type(value):
+                logger.error('Cache response returned invalid value %r', retval)
+                missing.append(value)
+            else:
+                retval._state.db = db
+                results[six.text_type(value)] = retval
+
+        # values which were looked up by another field point to the primary
+        # key of the instance
+        if pointers:
+            for instance in self.get_many_from_cache(pointers.keys()):
+                value = pointers[instance.pk]
+                # the pointer may be stale (cached locally before the field
+                # changed)
+                if six.text_type(self.__value_for_field(instance, key)) == six.text_type(value):
+                    results[six.text_type(value)] = instance
+            missing.extend(
+                value for pk, value in pointers.iteritems()
+                if six.text_type(value) not in results
+            )
+
+        if missing:
+            for instance in self.filter(**{'%s__in' % key: missing}):
+                # Ensure we're pushing it into the cache
+                self.__post_save(instance=instance)
+                value = self.__value_for_field(instance, key)
+                results[six.text_type(value)] = instance
+
+        return [
+            results[six.text_type(v)] for v in values
+            if six.text_type(v) in results
+        ]
+
     def create_or_update(self, **kwargs):
         return create_or_update(self.model, **kwargs)
 
@@ -311,7 +525,8 @@ class BaseManager(Manager):
     def uncache_object(self, instance_id):
         pk_name = self.model._meta.pk.name
         cache_key = self.__get_lookup_cache_key(**{pk_name: instance_id})
-        cache.delete(cache_key, version=self.cache_version)
+        self.__cache_delete(cache_key)
+        self.__set_stamp(instance_id, uuid4().hex)
 
     def post_save(self, instance, **kwargs):
         """
@@ -8,13 +8,22 @@ sentry.db.models.query
 
 from __future__ import absolute_import
 
+import operator
+
 from django.db import IntegrityError, router, transaction
+from django.db.models import Q
 from django.db.models.expressions import ExpressionNode
 from django.db.models.signals import post_save
+from django.utils.encoding import force_text
+
+from sentry.utils.cache import cache
 
 from .utils import resolve_expression_node
 
-__all__ = ('update', 'create_or_update')
+__all__ = ('update', 'create_or_update', 'bulk_get_or_create')
+
+# The number of rows which are looked up by a single query
+BULK_LOOKUP_SIZE = 100
 
 
 def update(self, using=None, **kwargs):
@@ -93,3 +102,83 @@ def create_or_update(model, using=None, **kwargs):
         affected = objects.filter(**kwargs).update(**values)
 
     return affected, False
+
+
+def bulk_get_or_create(model, fields, values, using=None, cache_key=None,
+                       cache_timeout=3600):
+    """
+    Return a mapping of each tuple of ``values`` (for the given ``fields``)
+    to the primary key of the matching row, creating the missing rows with a
+    single multi-row insert.
+
+    If ``cache_key`` is given, it's called with each tuple of values to get
+    the key its primary key is cached as.
+
+    >>> bulk_get_or_create(TagKey, ('project_id', 'key'), [
+    >>>     (1, 'browser'),
+    >>>     (1, 'os'),
+    >>> ])
+    {(1, 'browser'): 1, (1, 'os'): 2}
+    """
+    values = set(values)
+    results = {}
+
+    if cache_key is not None:
+        cache_keys = dict((cache_key(value), value) for value in values)
+        for key, pk in cache.get_many(cache_keys.keys()).iteritems():
+            results[cache_keys[key]] = pk
+        values.difference_update(results)
+        if not values:
+            return results
+
+    if not using:
+        using = router.db_for_write(model)
+
+    objects = model.objects.using(using)
+
+    # text is returned by the database as unicode, so match it as such
+    lookup_values = {}
+    for value in values:
+        lookup_values[tuple(
+            force_text(v) if isinstance(v, bytes) else v for v in value
+        )] = value
+
+    def lookup(keys):
+        rv = {}
+        keys = list(keys)
+        for idx in xrange(0, len(keys), BULK_LOOKUP_SIZE):
+            query = reduce(operator.or_, (
+                Q(**dict(zip(fields, key)))
+                for key in keys[idx:idx + BULK_LOOKUP_SIZE]
+            ))
+            for row in objects.filter(query).values_list('pk', *fields):
+                key = tuple(row[1:])
+                if key in lookup_values:
+                    rv[lookup_values[key]] = row[0]
+        return rv
+
+    found = lookup(lookup_values)
+    missing = [key for key, value in lookup_values.iteritems()
+               if value not in found]
+    if missing:
+        try:
+            with transaction.atomic(using=using):
+                objects.bulk_create([
+                    model(**dict(zip(fields, key))) for key in missing
+                ])
+        except IntegrityError:
+            # some of the rows were created concurrently
+            for key in missing:
+                found[lookup_values[key]] = objects.get_or_create(
+                    **dict(zip(fields, key))
+                )[0].pk
+        else:
+            found.update(lookup(missing))
+
+    if cache_key is not None:
+        cache.set_many(dict(
+            (cache_key(value), pk) for value, pk in found.iteritems()
+        ), cache_timeout)
+
+    results.update(found)
+    return results
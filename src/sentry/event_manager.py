@@ -22,7 +22,7 @@ from hashlib import md5
 from uuid import uuid4
 
 from sentry import eventtypes
-from sentry.app import buffer, tsdb
+from sentry.app import buffer, counters, search, tsdb
 from sentry.constants import (
     CLIENT_RESERVED_ATTRS, LOG_LEVELS, DEFAULT_LOGGER_NAME, MAX_CULPRIT_LENGTH
 )
@@ -38,10 +38,19 @@ from sentry.tasks.merge import merge_group
 from sentry.tasks.post_process import post_process_group
 from sentry.utils.cache import default_cache
 from sentry.utils.db import get_db_engine
+from sentry.utils.ingest import stage
 from sentry.utils.safe import safe_execute, trim, trim_dict
 from sentry.utils.strings import truncatechars
 from sentry.utils.validators import validate_ip
 
+# The hashes of groups which are being merged or deleted are about to move,
+# so they are neither cached nor resolved from the cache.
+MOVING_GROUP_STATUSES = frozenset([
+    GroupStatus.PENDING_MERGE,
+    GroupStatus.PENDING_DELETION,
+    GroupStatus.DELETION_IN_PROGRESS,
+])
+
 
 def count_limit(count):
     # TODO: could we do something like num_to_store = max(math.sqrt(100*count)+59, 200) ?
@@ -475,12 +484,13 @@ class EventManager(object):
 
         # prioritize fingerprint over checksum as its likely the client defaulted
         # a checksum whereas the fingerprint was explicit
-        if fingerprint:
-            hashes = map(md5_from_hash, get_hashes_from_fingerprint(event, fingerprint))
-        elif checksum:
-            hashes = [checksum]
-        else:
-            hashes = map(md5_from_hash, get_hashes_for_event(event))
+        with stage('hashing'):
+            if fingerprint:
+                hashes = map(md5_from_hash, get_hashes_from_fingerprint(event, fingerprint))
+            elif checksum:
+                hashes = [checksum]
+            else:
+                hashes = map(md5_from_hash, get_hashes_for_event(event))
 
         # TODO(dcramer): temp workaround for complexity
         data['message'] = message
@@ -542,12 +552,13 @@ class EventManager(object):
 
             group_kwargs['first_release'] = release
 
-        group, is_new, is_regression, is_sample = self._save_aggregate(
-            event=event,
-            hashes=hashes,
-            release=release,
-            **group_kwargs
-        )
+        with stage('save_aggregate'):
+            group, is_new, is_regression, is_sample = self._save_aggregate(
+                event=event,
+                hashes=hashes,
+                release=release,
+                **group_kwargs
+            )
 
         event.group = group
         # store a reference to the group id to guarantee validation of isolation
@@ -570,33 +581,39 @@ class EventManager(object):
                 datetime=date,
             )
 
-        tsdb.incr_multi([
-            (tsdb.models.group, group.id),
-            (tsdb.models.project, project.id),
-        ], timestamp=event.datetime)
-
-        frequencies = [
-            # (tsdb.models.frequent_projects_by_organization, {
-            #     project.organization_id: {
-            #         project.id: 1,
-            #     },
-            # }),
-            # (tsdb.models.frequent_issues_by_project, {
-            #     project.id: {
-            #         group.id: 1,
-            #     },
-            # })
-        ]
-        if release:
-            frequencies.append(
-                (tsdb.models.frequent_releases_by_groups, {
-                    group.id: {
-                        grouprelease.id: 1,
-                    },
-                })
-            )
+        with stage('tsdb'):
+            tsdb.incr_multi([
+                (tsdb.models.group, group.id),
+                (tsdb.models.project, project.id),
+            ], timestamp=event.datetime)
+            # the counters are a service of their own (with their own
+            # cluster), so they're written with a request of their own
+            counters.incr_multi([
+                (counters.models.group, group.id),
+            ], timestamp=event.datetime)
+
+            frequencies = [
+                # (tsdb.models.frequent_projects_by_organization, {
+                #     project.organization_id: {
+                #         project.id: 1,
+                #     },
+                # }),
+                # (tsdb.models.frequent_issues_by_project, {
+                #     project.id: {
+                #         group.id: 1,
+                #     },
+                # })
+            ]
+            if release:
+                frequencies.append(
+                    (tsdb.models.frequent_releases_by_groups, {
+                        group.id: {
+                            grouprelease.id: 1,
+                        },
+                    })
+                )
 
-        tsdb.record_frequency_multi(frequencies, timestamp=event.datetime)
+            tsdb.record_frequency_multi(frequencies, timestamp=event.datetime)
 
         UserReport.objects.filter(
             project=project, event_id=event_id,
@@ -605,7 +622,9 @@ class EventManager(object):
         # save the event unless its been sampled
         if not is_sample:
             try:
-                with transaction.atomic(using=router.db_for_write(Event)):
+                # the event's data is written to the node store as it is saved
+                with stage('nodestore'), \
+                        transaction.atomic(using=router.db_for_write(Event)):
                     event.save()
             except IntegrityError:
                 self.logger.info('Duplicate Event found for event_id=%s', event_id,
@@ -620,10 +639,11 @@ class EventManager(object):
             )
 
         if event_user:
-            tsdb.record_multi((
-                (tsdb.models.users_affected_by_group, group.id, (event_user.tag_value,)),
-                (tsdb.models.users_affected_by_project, project.id, (event_user.tag_value,)),
-            ), timestamp=event.datetime)
+            with stage('tsdb'):
+                tsdb.record_multi((
+                    (tsdb.models.users_affected_by_group, group.id, (event_user.tag_value,)),
+                    (tsdb.models.users_affected_by_project, project.id, (event_user.tag_value,)),
+                ), timestamp=event.datetime)
 
         if is_new and release:
             buffer.incr(Release, {'new_groups': 1}, {
@@ -633,6 +653,9 @@ class EventManager(object):
         safe_execute(Group.objects.add_tags, group, tags,
                      _with_transaction=False)
 
+        safe_execute(search.index_event, group, event,
+                     _with_transaction=False)
+
         if not raw:
             if not project.first_event:
                 project.update(first_event=date)
@@ -685,16 +708,52 @@ class EventManager(object):
 
         return euser
 
-    def _find_hashes(self, project, hash_list):
+    def _find_hashes(self, project, hash_list, group_ids=None):
         matches = []
         for hash in hash_list:
-            ghash, _ = GroupHash.objects.get_or_create(
-                project=project,
-                hash=hash,
-            )
-            matches.append((ghash.group_id, ghash.hash))
+            group_id = group_ids.get(hash) if group_ids else None
+            if group_id is None:
+                ghash, _ = GroupHash.objects.get_or_create(
+                    project=project,
+                    hash=hash,
+                )
+                group_id = ghash.group_id
+            matches.append((group_id, hash))
         return matches
 
+    def _find_group(self, project, hash_list):
+        """
+        Return the existing group for the hashes (if there is one), the
+        ``(group_id, hash)`` of each hash and whether all of them were
+        resolved from the cache.
+        """
+        group_ids = GroupHash.objects.get_group_ids(project.id, hash_list)
+        is_cached = len(group_ids) == len(hash_list)
+
+        while True:
+            all_hashes = self._find_hashes(project, hash_list, group_ids)
+
+            try:
+                existing_group_id = (h[0] for h in all_hashes if h[0]).next()
+            except StopIteration:
+                return None, all_hashes, is_cached
+
+            try:
+                group = Group.objects.get(id=existing_group_id)
+            except Group.DoesNotExist:
+                if not group_ids:
+                    raise
+            else:
+                # other processes may still cache the hashes of a group which
+                # is being merged or deleted
+                if not group_ids or group.status not in MOVING_GROUP_STATUSES:
+                    return group, all_hashes, is_cached
+
+            # the group was merged or deleted after its hashes were cached
+            GroupHash.objects.clear_group_ids(project.id, hash_list)
+            group_ids = {}
+            is_cached = False
+
     def _ensure_hashes_merged(self, group, hash_list):
         # TODO(dcramer): there is a race condition with selecting/updating
         # in that another group could take ownership of the hash
@@ -725,17 +784,12 @@ class EventManager(object):
         project = event.project
 
         # attempt to find a matching hash
-        all_hashes = self._find_hashes(project, hashes)
-
-        try:
-            existing_group_id = (h[0] for h in all_hashes if h[0]).next()
-        except StopIteration:
-            existing_group_id = None
+        group, all_hashes, is_cached = self._find_group(project, hashes)
 
         # XXX(dcramer): this has the opportunity to create duplicate groups
         # it should be resolved by the hash merging function later but this
         # should be better tested/reviewed
-        if existing_group_id is None:
+        if group is None:
             kwargs['score'] = ScoreClause.calculate(1, kwargs['last_seen'])
             with transaction.atomic():
                 short_id = project.next_short_id()
@@ -745,8 +799,6 @@ class EventManager(object):
                     **kwargs
                 ), True
         else:
-            group = Group.objects.get(id=existing_group_id)
-
             group_is_new = False
 
         # If all hashes are brand new we treat this event as new
@@ -766,6 +818,13 @@ class EventManager(object):
             elif group_is_new and len(new_hashes) == len(all_hashes):
                 is_new = True
 
+        # All new hashes now belong to the group, but existing ones might
+        # still belong to another one until the groups are merged.
+        cacheable_hashes = [h[1] for h in all_hashes if h[0] in (None, group.id)]
+        if cacheable_hashes and not is_cached and \
+                group.status not in MOVING_GROUP_STATUSES:
+            GroupHash.objects.set_group_ids(project.id, cacheable_hashes, group.id)
+
         # XXX(dcramer): it's important this gets called **before** the aggregate
         # is processed as otherwise values like last_seen will get mutated
         can_sample = should_sample(
@@ -119,5 +119,7 @@ class JavascriptPlugin(Plugin2):
     def can_configure_for_project(self, project, **kwargs):
         return False
 
-    def get_event_preprocessors(self, **kwargs):
+    def get_event_preprocessors(self, data=None, **kwargs):
+        if data is not None and data.get('platform') != 'javascript':
+            return []
         return [preprocess_event]
@@ -5,12 +5,15 @@ __all__ = ['SourceProcessor']
 import logging
 import re
 import base64
+import six
+import sys
+import threading
 import zlib
 
 from django.conf import settings
 from django.core.exceptions import SuspiciousOperation
 from django.utils.encoding import force_bytes, force_text
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 from os.path import splitext
 from requests.exceptions import RequestException
 from urlparse import urlparse, urljoin, urlsplit
@@ -27,14 +30,20 @@ from sentry.constants import MAX_CULPRIT_LENGTH
 from sentry.exceptions import RestrictedIPAddress
 from sentry.interfaces.stacktrace import Stacktrace
 from sentry.models import EventError, Release, ReleaseFile
+from sentry.utils import metrics
 from sentry.utils.cache import cache
 from sentry.utils.files import compress_file
 from sentry.utils.hashlib import md5
 from sentry.utils.http import is_valid_origin
+from sentry.utils.lru import LRUCache
 from sentry.utils.strings import truncatechars
+from sentry.utils.threadpool import ThreadPool
 
 from .cache import SourceCache, SourceMapCache
-from .sourcemaps import sourcemap_to_index, find_source, get_inline_content_sources
+from .sourcemaps import (
+    sourcemap_to_index, find_source, get_inline_content_sources,
+    dump_sourcemap_index, load_sourcemap_index
+)
 
 
 # number of surrounding lines (on each side) to fetch
@@ -58,6 +67,8 @@ VERSION_RE = re.compile(r'^[a-f0-9]{32}|[a-f0-9]{40}$', re.I)
 # fetched
 MAX_RESOURCE_FETCHES = 100
 MAX_URL_LENGTH = 150
+# the maximum number of domains to keep HTTP sessions (and connections) open to
+MAX_HTTP_SESSIONS = 100
 
 # TODO(dcramer): we want to change these to be constants so they are easier
 # to translate/link again
@@ -66,6 +77,16 @@ UrlResult = namedtuple('UrlResult', ['url', 'headers', 'body'])
 
 logger = logging.getLogger(__name__)
 
+# Parsed sourcemaps, shared by all events processed by this worker.
+sourcemap_index_cache = LRUCache(settings.SENTRY_SOURCEMAP_INDEX_CACHE_SIZE)
+
+# Keep-alive HTTP sessions, per domain, shared by all fetches in this worker.
+http_sessions = LRUCache(MAX_HTTP_SESSIONS)
+
+# Fetches which are currently in progress, keyed by URL and request headers.
+pending_fetches = {}
+pending_fetches_lock = threading.Lock()
+
 
 def expose_url(url):
     if url is None:
@@ -266,6 +287,123 @@ def fetch_release_file(filename, release):
     return result
 
 
+def get_source_cache_key(url):
+    return 'source:cache:v3:%s' % (
+        md5(url).hexdigest(),
+    )
+
+
+def get_http_session(domain):
+    session = http_sessions.get(domain)
+    if session is None:
+        session = http.build_session()
+        http_sessions.set(domain, session)
+    return session
+
+
+def coalesce_fetch(url, headers, func):
+    """
+    Call ``func(url, headers)``, unless the same request is already in
+    progress on another thread, in which case its result is shared.
+    """
+    key = (url, tuple(sorted(headers.items())))
+    with pending_fetches_lock:
+        pending = pending_fetches.get(key)
+        is_owner = pending is None
+        if is_owner:
+            pending = pending_fetches[key] = {
+                'event': threading.Event(),
+            }
+
+    if not is_owner:
+        metrics.incr('sourcemaps.fetch.coalesced')
+        pending['event'].wait()
+        if 'exc_info' in pending:
+            six.reraise(*pending['exc_info'])
+        return pending['result']
+
+    try:
+        pending['result'] = func(url, headers)
+    except Exception:
+        pending['exc_info'] = sys.exc_info()
+        raise
+    finally:
+        with pending_fetches_lock:
+            del pending_fetches[key]
+        pending['event'].set()
+    return pending['result']
+
+
+def fetch_url(url, headers):
+    """
+    Pull down a URL from the internet, returning a tuple of
+    ``(headers, body, status_code)``.
+    """
+    # lock down domains that are problematic
+    domain = urlparse(url).netloc
+    domain_key = 'source:blacklist:v2:%s' % (
+        md5(domain).hexdigest(),
+    )
+    domain_result = cache.get(domain_key)
+    if domain_result:
+        domain_result['url'] = url
+        raise CannotFetchSource(domain_result)
+
+    logger.debug('Fetching %r from the internet', url)
+
+    http_session = get_http_session(domain)
+    try:
+        response = http_session.get(
+            url,
+            allow_redirects=True,
+            verify=False,
+            headers=headers,
+            timeout=settings.SENTRY_SOURCE_FETCH_TIMEOUT,
+        )
+    except Exception as exc:
+        logger.debug('Unable to fetch %r', url, exc_info=True)
+        if isinstance(exc, RestrictedIPAddress):
+            error = {
+                'type': EventError.RESTRICTED_IP,
+                'url': expose_url(url),
+            }
+        elif isinstance(exc, SuspiciousOperation):
+            error = {
+                'type': EventError.SECURITY_VIOLATION,
+                'url': expose_url(url),
+            }
+        elif isinstance(exc, (RequestException, ZeroReturnError)):
+            error = {
+                'type': EventError.JS_GENERIC_FETCH_ERROR,
+                'value': str(type(exc)),
+                'url': expose_url(url),
+            }
+        else:
+            logger.exception(unicode(exc))
+            error = {
+                'type': EventError.UNKNOWN_ERROR,
+                'url': expose_url(url),
+            }
+
+        # TODO(dcramer): we want to be less aggressive on disabling domains
+        cache.set(domain_key, error or '', 300)
+        logger.warning('Disabling sources to %s for %ss', domain, 300,
+                       exc_info=True)
+        raise CannotFetchSource(error)
+
+    # requests' attempts to use chardet internally when no encoding is found
+    # and we want to avoid that slow behavior
+    if not response.encoding:
+        response.encoding = 'utf-8'
+
+    body = response.text
+    z_body = zlib.compress(force_bytes(body))
+    headers = {k.lower(): v for k, v in response.headers.items()}
+
+    cache.set(get_source_cache_key(url), (headers, z_body, response.status_code), 60)
+    return (headers, body, response.status_code)
+
+
 def fetch_file(url, project=None, release=None, allow_scraping=True):
     """
     Pull down a URL, returning a UrlResult object.
@@ -277,9 +415,7 @@ def fetch_file(url, project=None, release=None, allow_scraping=True):
     else:
         result = None
 
-    cache_key = 'source:cache:v3:%s' % (
-        md5(url).hexdigest(),
-    )
+    cache_key = get_source_cache_key(url)
 
     if result is None:
         if not allow_scraping or not url.startswith(('http:', 'https:')):
@@ -298,75 +434,13 @@ def fetch_file(url, project=None, release=None, allow_scraping=True):
             result = (result[0], force_text(body), result[2])
 
     if result is None:
-        # lock down domains that are problematic
-        domain = urlparse(url).netloc
-        domain_key = 'source:blacklist:v2:%s' % (
-            md5(domain).hexdigest(),
-        )
-        domain_result = cache.get(domain_key)
-        if domain_result:
-            domain_result['url'] = url
-            raise CannotFetchSource(domain_result)
-
         headers = {}
         if project and is_valid_origin(url, project=project):
             token = project.get_option('sentry:token')
             if token:
                 headers['X-Sentry-Token'] = token
 
-        logger.debug('Fetching %r from the internet', url)
-
-        http_session = http.build_session()
-        try:
-            response = http_session.get(
-                url,
-                allow_redirects=True,
-                verify=False,
-                headers=headers,
-                timeout=settings.SENTRY_SOURCE_FETCH_TIMEOUT,
-            )
-        except Exception as exc:
-            logger.debug('Unable to fetch %r', url, exc_info=True)
-            if isinstance(exc, RestrictedIPAddress):
-                error = {
-                    'type': EventError.RESTRICTED_IP,
-                    'url': expose_url(url),
-                }
-            elif isinstance(exc, SuspiciousOperation):
-                error = {
-                    'type': EventError.SECURITY_VIOLATION,
-                    'url': expose_url(url),
-                }
-            elif isinstance(exc, (RequestException, ZeroReturnError)):
-                error = {
-                    'type': EventError.JS_GENERIC_FETCH_ERROR,
-                    'value': str(type(exc)),
-                    'url': expose_url(url),
-                }
-            else:
-                logger.exception(unicode(exc))
-                error = {
-                    'type': EventError.UNKNOWN_ERROR,
-                    'url': expose_url(url),
-                }
-
-            # TODO(dcramer): we want to be less aggressive on disabling domains
-            cache.set(domain_key, error or '', 300)
-            logger.warning('Disabling sources to %s for %ss', domain, 300,
-                           exc_info=True)
-            raise CannotFetchSource(error)
-
-        # requests' attempts to use chardet internally when no encoding is found
-        # and we want to avoid that slow behavior
-        if not response.encoding:
-            response.encoding = 'utf-8'
-
-        body = response.text
-        z_body = zlib.compress(force_bytes(body))
-        headers = {k.lower(): v for k, v in response.headers.items()}
-
-        cache.set(cache_key, (headers, z_body, response.status_code), 60)
-        result = (headers, body, response.status_code)
+        result = coalesce_fetch(url, headers, fetch_url)
 
     if result[2] != 200:
         logger.debug('HTTP %s when fetching %r', result[2], url,
@@ -403,6 +477,14 @@ def fetch_sourcemap(url, project=None, release=None, allow_scraping=True):
                             allow_scraping=allow_scraping)
         body = result.body
 
+    return load_sourcemap(url, body)
+
+
+def load_sourcemap(url, body):
+    """
+    Return the index of the sourcemap ``body`` (fetched from ``url``), reusing
+    a cached copy if the same sourcemap was recently parsed.
+    """
     # According to various specs[1][2] a SourceMap may be prefixed to force
     # a Javascript load error.
     # [1] https://docs.google.com/document/d/1U1RGAehQwRypUTovF1KRlpiOFze0b-_2gc6fAH0KY0k/edit#heading=h.h7yy76c5il9v
@@ -410,8 +492,34 @@ def fetch_sourcemap(url, project=None, release=None, allow_scraping=True):
     if body.startswith((")]}'\n", ")]}\n")):
         body = body.split('\n', 1)[1]
 
+    # Parsing large sourcemaps is expensive, so the parsed index is kept in
+    # memory, and a serialized copy is shared with other workers, keyed by
+    # the contents of the sourcemap.
+    cache_key = 'sourcemap:index:v1:%s' % (
+        md5(force_bytes(body)).hexdigest(),
+    )
+
+    index = sourcemap_index_cache.get(cache_key)
+    if index is not None:
+        metrics.incr('sourcemaps.index_cache.hit', tags={'cache': 'local'})
+        return index
+
+    data = cache.get(cache_key)
+    if data is not None:
+        try:
+            index = load_sourcemap_index(zlib.decompress(data))
+        except Exception as exc:
+            logger.warning('Unable to load cached sourcemap index: %s', exc,
+                           exc_info=True)
+        else:
+            metrics.incr('sourcemaps.index_cache.hit', tags={'cache': 'shared'})
+            sourcemap_index_cache.set(cache_key, index)
+            return index
+
+    metrics.incr('sourcemaps.index_cache.miss')
     try:
-        return sourcemap_to_index(body)
+        with metrics.timer('sourcemaps.index'):
+            index = sourcemap_to_index(body)
     except Exception as exc:
         # This is in debug because the product shows an error already.
         logger.debug(unicode(exc), exc_info=True)
@@ -419,6 +527,10 @@ def fetch_sourcemap(url, project=None, release=None, allow_scraping=True):
             'url': expose_url(url),
         })
 
+    sourcemap_index_cache.set(cache_key, index)
+    cache.set(cache_key, zlib.compress(dump_sourcemap_index(index)), 3600)
+    return index
+
 
 def is_data_uri(url):
     return url[:BASE64_PREAMBLE_LENGTH] == BASE64_SOURCEMAP_PREAMBLE
@@ -749,56 +861,127 @@ class SourceProcessor(object):
         return self.cache.get(filename)
 
     def cache_source(self, filename, release):
+        self.cache_sources([filename], release)
+
+    def fetch_files(self, urls, release):
+        """
+        Fetch ``urls`` concurrently, returning a mapping of each URL to either
+        a ``UrlResult``, or the ``BadSource`` error raised when fetching it.
+        """
+        results = {}
+        remote_urls = []
+        for url in urls:
+            if release is not None:
+                # Release artifacts are looked up on this thread, as they
+                # require the database.
+                try:
+                    results[url] = fetch_file(url, project=self.project,
+                                              release=release,
+                                              allow_scraping=False)
+                    continue
+                except BadSource as exc:
+                    results[url] = exc
+                    if not self.allow_scraping or not url.startswith(('http:', 'https:')):
+                        continue
+            remote_urls.append(url)
+
+        if len(remote_urls) <= 1:
+            # not worth starting a thread for
+            for url in remote_urls:
+                try:
+                    results[url] = fetch_file(url, project=self.project, release=None,
+                                              allow_scraping=self.allow_scraping)
+                except BadSource as exc:
+                    results[url] = exc
+            return results
+
+        # Load the project's options on this thread, so they are already
+        # cached when the workers need them.
+        self.project.get_option('sentry:token')
+
+        workers = min(len(remote_urls), settings.SENTRY_SOURCE_FETCH_CONCURRENCY)
+        pool = ThreadPool(workers=workers)
+        for url in remote_urls:
+            pool.add(url, fetch_file, args=(url,), kwargs={
+                'project': self.project,
+                'release': None,
+                'allow_scraping': self.allow_scraping,
+            })
+
+        with metrics.timer('sourcemaps.fetch_files'):
+            pool_results = pool.join()
+
+        for url, (result,) in pool_results.iteritems():
+            if isinstance(result, Exception) and not isinstance(result, BadSource):
+                raise result
+            results[url] = result
+        return results
+
+    def cache_sources(self, filenames, release):
         sourcemaps = self.sourcemaps
         cache = self.cache
 
-        self.fetch_count += 1
+        pending_filenames = []
+        for filename in filenames:
+            self.fetch_count += 1
 
-        if self.fetch_count > self.max_fetches:
-            cache.add_error(filename, {
-                'type': EventError.JS_TOO_MANY_REMOTE_SOURCES,
-            })
-            return
+            if self.fetch_count > self.max_fetches:
+                cache.add_error(filename, {
+                    'type': EventError.JS_TOO_MANY_REMOTE_SOURCES,
+                })
+                continue
 
-        # TODO: respect cache-control/max-age headers to some extent
-        logger.debug('Fetching remote source %r', filename)
-        try:
-            result = fetch_file(filename, project=self.project, release=release,
-                                allow_scraping=self.allow_scraping)
-        except BadSource as exc:
-            cache.add_error(filename, exc.data)
-            return
+            # TODO: respect cache-control/max-age headers to some extent
+            logger.debug('Fetching remote source %r', filename)
+            pending_filenames.append(filename)
+
+        # filenames which refer to each sourcemap that needs to be fetched
+        pending_sourcemaps = defaultdict(list)
+        for filename, result in self.fetch_files(pending_filenames, release).iteritems():
+            if isinstance(result, BadSource):
+                cache.add_error(filename, result.data)
+                continue
 
-        cache.add(filename, result.body.split('\n'))
-        cache.alias(result.url, filename)
+            cache.add(filename, result.body.split('\n'))
+            cache.alias(result.url, filename)
 
-        sourcemap_url = discover_sourcemap(result)
-        if not sourcemap_url:
-            return
+            sourcemap_url = discover_sourcemap(result)
+            if not sourcemap_url:
+                continue
 
-        logger.debug('Found sourcemap %r for minified script %r', sourcemap_url[:256], result.url)
-        sourcemaps.link(filename, sourcemap_url)
-        if sourcemap_url in sourcemaps:
-            return
+            logger.debug('Found sourcemap %r for minified script %r', sourcemap_url[:256], result.url)
+            sourcemaps.link(filename, sourcemap_url)
+            if sourcemap_url in sourcemaps:
+                continue
 
-        # pull down sourcemap
-        try:
-            sourcemap_idx = fetch_sourcemap(
-                sourcemap_url,
-                project=self.project,
-                release=release,
-                allow_scraping=self.allow_scraping,
-            )
-        except BadSource as exc:
-            cache.add_error(filename, exc.data)
-            return
+            pending_sourcemaps[sourcemap_url].append(filename)
+
+        # pull down sourcemaps
+        sourcemap_results = self.fetch_files(
+            [url for url in pending_sourcemaps if not is_data_uri(url)],
+            release,
+        )
+
+        for sourcemap_url, filenames in pending_sourcemaps.iteritems():
+            try:
+                if is_data_uri(sourcemap_url):
+                    sourcemap_idx = fetch_sourcemap(sourcemap_url)
+                else:
+                    result = sourcemap_results[sourcemap_url]
+                    if isinstance(result, BadSource):
+                        raise result
+                    sourcemap_idx = load_sourcemap(sourcemap_url, result.body)
+            except BadSource as exc:
+                for filename in filenames:
+                    cache.add_error(filename, exc.data)
+                continue
 
-        sourcemaps.add(sourcemap_url, sourcemap_idx)
+            sourcemaps.add(sourcemap_url, sourcemap_idx)
 
-        # cache any inlined sources
-        inline_sources = get_inline_content_sources(sourcemap_idx, sourcemap_url)
-        for source in inline_sources:
-            self.cache.add(*source)
+            # cache any inlined sources
+            inline_sources = get_inline_content_sources(sourcemap_idx, sourcemap_url)
+            for source in inline_sources:
+                self.cache.add(*source)
 
     def populate_source_cache(self, frames, release):
         """
@@ -818,8 +1001,4 @@ class SourceProcessor(object):
                 continue
             pending_file_list.add(f.abs_path)
 
-        for idx, filename in enumerate(pending_file_list):
-            self.cache_source(
-                filename=filename,
-                release=release,
-            )
+        self.cache_sources(pending_file_list, release)
@@ -18,17 +18,31 @@ section property.
 from __future__ import absolute_import
 
 import bisect
+import struct
+import sys
 
+from array import array
 from collections import namedtuple
+from itertools import izip
 from urlparse import urljoin
 
 from sentry.utils import json
 
 
 SourceMap = namedtuple('SourceMap', ['dst_line', 'dst_col', 'src', 'src_line', 'src_col', 'name'])
-SourceMapIndex = namedtuple('SourceMapIndex', ['states', 'keys', 'sources', 'content'])
 IndexedSourceMapIndex = namedtuple('IndexedSourceMapIndex', ['offsets', 'maps'])
 
+# Positions are stored as 32 bit signed integers, which is wide enough for
+# any file we'd be willing to process, and half the size of a C long.
+INT_ARRAY_TYPE = 'i'
+INT_ARRAY_ITEMSIZE = array(INT_ARRAY_TYPE).itemsize
+assert INT_ARRAY_ITEMSIZE == 4
+
+# The serialized form is little endian.
+NEEDS_BYTESWAP = sys.byteorder != 'little'
+
+SERIALIZATION_MAGIC = 'SMI\x01'
+
 # Mapping of base64 letter -> integer value.
 B64 = dict(
     (c, i) for i, c in
@@ -69,60 +83,155 @@ def parse_vlq(segment):
     return values
 
 
-def parse_sourcemap(smap):
+def _parse_mappings(mappings):
     """
-    Given a sourcemap json object, yield SourceMap objects as they are read from it.
+    Given the "mappings" of a sourcemap, yield a tuple of
+    ``(dst_line, dst_col, src_id, src_line, src_col, name_id)`` for each
+    segment, where ``src_id`` and ``name_id`` are ``-1`` if they are not
+    specified.
     """
-    sources = smap['sources']
-    sourceRoot = smap.get('sourceRoot')
-    names = smap.get('names', [])
-    mappings = smap['mappings']
-    lines = mappings.split(';')
-
-    if sourceRoot:
-        # turn /foo/bar into /foo/bar/ so urljoin doesnt strip the last path
-        if not sourceRoot.endswith('/'):
-            sourceRoot = sourceRoot + '/'
-
-        sources = [
-            urljoin(sourceRoot, src)
-            for src in sources
-        ]
-
     dst_col, src_id, src_line, src_col, name_id = 0, 0, 0, 0, 0
-    for dst_line, line in enumerate(lines):
-        segments = line.split(',')
+    for dst_line, line in enumerate(mappings.split(';')):
         dst_col = 0
-        for segment in segments:
+        for segment in line.split(','):
             if not segment:
                 continue
             parse = parse_vlq(segment)
             dst_col += parse[0]
 
-            src = None
-            name = None
+            src = -1
+            name = -1
             if len(parse) > 1:
                 src_id += parse[1]
-                src = sources[src_id]
+                src = src_id
                 src_line += parse[2]
                 src_col += parse[3]
 
                 if len(parse) > 4:
                     name_id += parse[4]
-                    name = names[name_id]
+                    name = name_id
 
             assert dst_line >= 0
             assert dst_col >= 0
             assert src_line >= 0
             assert src_col >= 0
 
-            yield SourceMap(dst_line, dst_col, src, src_line, src_col, name)
+            yield dst_line, dst_col, src, src_line, src_col, name
+
+
+def _get_sources(smap):
+    sources = smap['sources']
+    sourceRoot = smap.get('sourceRoot')
+
+    if sourceRoot:
+        # turn /foo/bar into /foo/bar/ so urljoin doesnt strip the last path
+        if not sourceRoot.endswith('/'):
+            sourceRoot = sourceRoot + '/'
+
+        sources = [
+            urljoin(sourceRoot, src)
+            for src in sources
+        ]
+
+    return sources
+
+
+def parse_sourcemap(smap):
+    """
+    Given a sourcemap json object, yield SourceMap objects as they are read from it.
+    """
+    sources = _get_sources(smap)
+    names = smap.get('names', [])
+
+    for dst_line, dst_col, src_id, src_line, src_col, name_id in _parse_mappings(smap['mappings']):
+        yield SourceMap(
+            dst_line,
+            dst_col,
+            sources[src_id] if src_id != -1 else None,
+            src_line,
+            src_col,
+            names[name_id] if name_id != -1 else None,
+        )
+
+
+class SourceMapIndex(object):
+    """
+    A compact, searchable form of a (standard) sourcemap.
+
+    Each segment of the mappings is stored as an item of six parallel integer
+    arrays, sorted by position in the minified file. Sources and names are
+    stored once in ``source_table`` and ``name_table``, and are referenced by
+    their index in them (or ``-1`` if not present.)
+    """
+    __slots__ = ['dst_lines', 'dst_cols', 'src_ids', 'src_lines', 'src_cols',
+                 'name_ids', 'source_table', 'name_table', 'content']
+
+    # the order of the arrays in the serialized form
+    arrays = ('dst_lines', 'dst_cols', 'src_ids', 'src_lines', 'src_cols', 'name_ids')
+
+    def __init__(self, dst_lines, dst_cols, src_ids, src_lines, src_cols,
+                 name_ids, source_table, name_table, content):
+        self.dst_lines = dst_lines
+        self.dst_cols = dst_cols
+        self.src_ids = src_ids
+        self.src_lines = src_lines
+        self.src_cols = src_cols
+        self.name_ids = name_ids
+        self.source_table = source_table
+        self.name_table = name_table
+        self.content = content
+
+    def __len__(self):
+        return len(self.dst_lines)
+
+    def __eq__(self, other):
+        if not isinstance(other, SourceMapIndex):
+            return NotImplemented
+        return all(
+            getattr(self, attr) == getattr(other, attr)
+            for attr in self.__slots__
+        )
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def sources(self):
+        """
+        The set of sources which are referenced by the mappings.
+        """
+        return set(self.source_table[i] for i in set(self.src_ids) if i != -1)
+
+    def get_state(self, idx):
+        src_id = self.src_ids[idx]
+        name_id = self.name_ids[idx]
+        return SourceMap(
+            self.dst_lines[idx],
+            self.dst_cols[idx],
+            self.source_table[src_id] if src_id != -1 else None,
+            self.src_lines[idx],
+            self.src_cols[idx],
+            self.name_table[name_id] if name_id != -1 else None,
+        )
+
+    def find(self, dst_line, dst_col):
+        """
+        Return the index of the last segment at or before the given
+        (zero-indexed) position.
+        """
+        # Rather than bisecting a list of (line, col) tuples, find the
+        # segments on the line, and then bisect their columns.
+        hi = bisect.bisect_right(self.dst_lines, dst_line)
+        lo = bisect.bisect_left(self.dst_lines, dst_line, 0, hi)
+        idx = bisect.bisect_right(self.dst_cols, dst_col, lo, hi) - 1
+        if idx < lo:
+            # nothing on this line at or before the column, so use the last
+            # segment of a preceding line
+            idx = lo - 1
+        return idx
 
 
 def _sourcemap_to_index(smap):
-    state_list = []
-    key_list = []
-    src_list = set()
     content = {}
     sourceRoot = smap.get('sourceRoot')
 
@@ -147,16 +256,17 @@ def _sourcemap_to_index(smap):
             source = urljoin(sourceRoot, source)
             content[source] = value.split('\n')
 
-    for state in parse_sourcemap(smap):
-        state_list.append(state)
-        key_list.append((state.dst_line, state.dst_col))
-
-        # Apparently it's possible to not have a src
-        # specified in the vlq segments
-        if state.src is not None:
-            src_list.add(state.src)
+    arrays = [array(INT_ARRAY_TYPE) for _ in SourceMapIndex.arrays]
+    appends = [a.append for a in arrays]
+    for state in _parse_mappings(smap['mappings']):
+        for append, value in izip(appends, state):
+            append(value)
 
-    return SourceMapIndex(state_list, key_list, src_list, content)
+    return SourceMapIndex(*arrays, **{
+        'source_table': _get_sources(smap),
+        'name_table': smap.get('names', []),
+        'content': content,
+    })
 
 
 def sourcemap_to_index(sourcemap):
@@ -182,6 +292,87 @@ def sourcemap_to_index(sourcemap):
         return _sourcemap_to_index(smap)
 
 
+def _dump_index(index, buf):
+    tables = json.dumps({
+        'sources': index.source_table,
+        'names': index.name_table,
+        'content': index.content,
+    })
+    buf.append(struct.pack('<II', len(index), len(tables)))
+    for name in SourceMapIndex.arrays:
+        values = getattr(index, name)
+        if NEEDS_BYTESWAP:
+            values = array(INT_ARRAY_TYPE, values)
+            values.byteswap()
+        buf.append(values.tostring())
+    buf.append(tables)
+
+
+def _load_index(data, offset):
+    length, tables_length = struct.unpack_from('<II', data, offset)
+    offset += 8
+
+    arrays = []
+    size = length * INT_ARRAY_ITEMSIZE
+    for _ in SourceMapIndex.arrays:
+        values = array(INT_ARRAY_TYPE)
+        values.fromstring(data[offset:offset + size])
+        if NEEDS_BYTESWAP:
+            values.byteswap()
+        arrays.append(values)
+        offset += size
+
+    tables = json.loads(data[offset:offset + tables_length])
+    offset += tables_length
+
+    return SourceMapIndex(*arrays, **{
+        'source_table': tables['sources'],
+        'name_table': tables['names'],
+        'content': tables['content'],
+    }), offset
+
+
+def dump_sourcemap_index(index):
+    """
+    Serialize a SourceMapIndex or IndexedSourceMapIndex to a compact binary
+    string, which can be loaded much faster than the sourcemap can be parsed.
+    """
+    buf = [SERIALIZATION_MAGIC]
+    if isinstance(index, IndexedSourceMapIndex):
+        buf.append(struct.pack('<cI', 'I', len(index.maps)))
+        for (line, column), smap in izip(index.offsets, index.maps):
+            buf.append(struct.pack('<II', line, column))
+            _dump_index(smap, buf)
+    else:
+        buf.append(struct.pack('<cI', 'S', 1))
+        _dump_index(index, buf)
+    return ''.join(buf)
+
+
+def load_sourcemap_index(data):
+    """
+    Load a SourceMapIndex or IndexedSourceMapIndex serialized with ``dump_sourcemap_index``.
+    """
+    if not data.startswith(SERIALIZATION_MAGIC):
+        raise ValueError('Unknown sourcemap index serialization format')
+
+    offset = len(SERIALIZATION_MAGIC)
+    kind, count = struct.unpack_from('<cI', data, offset)
+    offset += struct.calcsize('<cI')
+
+    if kind == 'S':
+        return _load_index(data, offset)[0]
+
+    offsets = []
+    maps = []
+    for _ in xrange(count):
+        offsets.append(struct.unpack_from('<II', data, offset))
+        offset += 8
+        smap, offset = _load_index(data, offset)
+        maps.append(smap)
+    return IndexedSourceMapIndex(offsets, maps)
+
+
 def get_inline_content_sources(sourcemap_index, sourcemap_url):
     """
     Returns a list of tuples of (filename, content) for each inline
@@ -228,4 +419,4 @@ def find_source(sourcemap_index, lineno, colno):
             state.name
         )
     else:
-        return sourcemap_index.states[bisect.bisect_right(sourcemap_index.keys, (lineno - 1, colno)) - 1]
+        return sourcemap_index.get_state(sourcemap_index.find(lineno - 1, colno))
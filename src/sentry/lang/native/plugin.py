@@ -452,7 +452,11 @@ def resolve_frame_symbols(data):
 class NativePlugin(Plugin2):
     can_disable = False
 
-    def get_event_preprocessors(self, **kwargs):
+    def get_event_preprocessors(self, data=None, **kwargs):
+        if data is not None and not (
+                data.get('sentry.interfaces.AppleCrashReport') or
+                data.get('debug_meta')):
+            return []
         if not have_symsynd:
             return [record_no_symsynd]
         return [preprocess_apple_crash_event, resolve_frame_symbols]
@@ -9,10 +9,12 @@ sentry.models.dsymfile
 from __future__ import absolute_import
 
 import os
+import errno
 import shutil
 import hashlib
 import tempfile
 from itertools import chain
+from django.conf import settings
 from django.db import models, router, transaction, connection, IntegrityError
 
 try:
@@ -25,11 +27,27 @@ from sentry.db.models import FlexibleForeignKey, Model, BoundedBigIntegerField,
     sane_repr, BaseManager
 from sentry.models.file import File
 from sentry.utils.zip import safe_extract_zip
+from sentry.utils import metrics
 from sentry.utils.db import is_sqlite
+from sentry.utils.lru import LRUCache
 from sentry.utils.native import parse_addr
+from sentry.utils.symboltable import SymbolTable
 from sentry.constants import KNOWN_DSYM_TYPES
 
 
+# Symbol tables by object id, and the ``(id, vmaddr)`` of the objects that
+# match an image, which are kept across events so looking up a symbol does
+# not need to query the database.
+symbol_tables = LRUCache(
+    settings.SENTRY_DSYM_SYMBOL_TABLE_CACHE_SIZE,
+    ttl=settings.SENTRY_DSYM_SYMBOL_TABLE_CACHE_TTL,
+)
+symbol_objects = LRUCache(
+    settings.SENTRY_DSYM_SYMBOL_TABLE_CACHE_SIZE * 20,
+    ttl=settings.SENTRY_DSYM_SYMBOL_TABLE_CACHE_TTL,
+)
+
+
 class DSymSDKManager(BaseManager):
 
     def enumerate_sdks(self, sdk=None, version=None):
@@ -145,6 +163,7 @@ class DSymSymbolManager(BaseManager):
                     ''' % ', '.join(['(%s, %s, %s)'] * len(items)),
                         list(chain(*items)))
                     cur.close()
+                self._clear_symbol_tables(items)
                 return
             except IntegrityError:
                 pass
@@ -166,6 +185,11 @@ class DSymSymbolManager(BaseManager):
                 'symbol': item[2],
             })
         cur.close()
+        self._clear_symbol_tables(items)
+
+    def _clear_symbol_tables(self, items):
+        for object_id in set(item[0] for item in items):
+            symbol_tables.delete(object_id)
 
     def lookup_symbol(self, instruction_addr, image_addr, uuid,
                       cpu_name=None, object_path=None, sdk_info=None,
@@ -184,107 +208,110 @@ class DSymSymbolManager(BaseManager):
             addr_abs = image_vmaddr + instruction_addr - image_addr
         addr_rel = instruction_addr - image_addr
 
+        # First try: exact match on uuid
         uuid = str(uuid).lower()
-        cur = connection.cursor()
-        try:
-            # First try: exact match on uuid (addr_rel)
-            cur.execute('''
-                select s.symbol
-                  from sentry_dsymsymbol s,
-                       sentry_dsymobject o
-                 where o.uuid = %s and
-                       s.object_id = o.id and
-                       s.address <= o.vmaddr + %s and
-                       s.address >= o.vmaddr
-              order by address desc
-                 limit 1;
-            ''', [uuid, addr_rel])
-            rv = cur.fetchone()
-            if rv:
-                return rv[0]
-
-            # Second try: exact match on uuid (addr_abs)
-            if addr_abs is not None:
-                cur.execute('''
-                    select s.symbol
-                      from sentry_dsymsymbol s,
-                           sentry_dsymobject o
-                     where o.uuid = %s and
-                           s.object_id = o.id and
-                           s.address <= %s and
-                           s.address >= %s
-                  order by address desc
-                     limit 1;
-                ''', [uuid, addr_abs, image_vmaddr])
-                rv = cur.fetchone()
-                if rv:
-                    return rv[0]
-
-            # Third try: exact match on path and arch (addr_rel)
-            if sdk_info is None or \
-               cpu_name is None or \
-               object_path is None:
-                return
+        rv = self._find_symbol(self._get_objects(('uuid', uuid), {
+            'uuid': uuid,
+        }), addr_rel, addr_abs, image_vmaddr)
+        if rv is not None:
+            return rv
 
-            cur.execute('''
-                select s.symbol
-                  from sentry_dsymsymbol s,
-                       sentry_dsymobject o,
-                       sentry_dsymsdk k,
-                       sentry_dsymbundle b
-                 where b.sdk_id = k.id and
-                       b.object_id = o.id and
-                       s.object_id = o.id and
-                       k.sdk_name = %s and
-                       k.dsym_type = %s and
-                       k.version_major = %s and
-                       k.version_minor = %s and
-                       k.version_patchlevel = %s and
-                       o.cpu_name = %s and
-                       o.object_path = %s and
-                       s.address <= o.vmaddr + %s and
-                       s.address >= o.vmaddr
-              order by address desc
-                 limit 1;
-            ''', [sdk_info['sdk_name'], sdk_info['dsym_type'],
-                  sdk_info['version_major'], sdk_info['version_minor'],
-                  sdk_info['version_patchlevel'], cpu_name, object_path,
-                  addr_rel])
-            rv = cur.fetchone()
-            if rv:
-                return rv[0]
-
-            # Fourth try: exact match on path and arch (addr_abs)
-            if addr_abs is not None:
-                cur.execute('''
-                    select s.symbol
-                      from sentry_dsymsymbol s,
-                           sentry_dsymobject o,
-                           sentry_dsymsdk k,
-                           sentry_dsymbundle b
-                     where b.sdk_id = k.id and
-                           b.object_id = o.id and
-                           s.object_id = o.id and
-                           k.sdk_name = %s and
-                           k.dsym_type = %s and
-                           k.version_major = %s and
-                           k.version_minor = %s and
-                           k.version_patchlevel = %s and
-                           o.cpu_name = %s and
-                           o.object_path = %s and
-                           s.address <= %s and
-                           s.address >= %s
-                  order by address desc
-                     limit 1;
-                ''', [sdk_info['sdk_name'], sdk_info['dsym_type'],
-                      sdk_info['version_major'], sdk_info['version_minor'],
-                      sdk_info['version_patchlevel'], cpu_name, object_path,
-                      addr_abs, image_vmaddr])
-                rv = cur.fetchone()
-                if rv:
-                    return rv[0]
-        finally:
-            cur.close()
+        # Second try: exact match on path and arch
+        if sdk_info is None or \
+           cpu_name is None or \
+           object_path is None:
+            return
+
+        return self._find_symbol(self._get_objects((
+            'path', sdk_info['sdk_name'], sdk_info['dsym_type'],
+            sdk_info['version_major'], sdk_info['version_minor'],
+            sdk_info['version_patchlevel'], cpu_name, object_path,
+        ), {
+            'dsymbundle__sdk__sdk_name': sdk_info['sdk_name'],
+            'dsymbundle__sdk__dsym_type': sdk_info['dsym_type'],
+            'dsymbundle__sdk__version_major': sdk_info['version_major'],
+            'dsymbundle__sdk__version_minor': sdk_info['version_minor'],
+            'dsymbundle__sdk__version_patchlevel': sdk_info['version_patchlevel'],
+            'cpu_name': cpu_name,
+            'object_path': object_path,
+        }), addr_rel, addr_abs, image_vmaddr)
+
+    def _find_symbol(self, objects, addr_rel, addr_abs, image_vmaddr):
+        """Finds the symbol of the highest address in the given objects,
+        first relative to their vmaddr and then (if known) for the absolute
+        address.
+        """
+        def get_relative_range(vmaddr):
+            if vmaddr is not None:
+                return vmaddr, vmaddr + addr_rel
+
+        ranges = [get_relative_range]
+        if addr_abs is not None:
+            ranges.append(lambda vmaddr: (image_vmaddr, addr_abs))
+
+        for get_range in ranges:
+            best = None
+            for object_id, vmaddr in objects:
+                bounds = get_range(vmaddr)
+                if bounds is None:
+                    continue
+                rv = self._get_symbol_table(object_id).find(*bounds)
+                if rv is not None and (best is None or rv[0] > best[0]):
+                    best = rv
+            if best is not None:
+                return best[1]
+
+    def _get_objects(self, cache_key, filters):
+        """Returns the ``(id, vmaddr)`` of all objects matching the given
+        filters.
+        """
+        rv = symbol_objects.get(cache_key)
+        if rv is None:
+            rv = list(DSymObject.objects.filter(**filters).values_list(
+                'id', 'vmaddr').distinct())
+            symbol_objects.set(cache_key, rv)
+        return rv
+
+    def _get_symbol_table(self, object_id):
+        table = symbol_tables.get(object_id)
+        if table is None:
+            metrics.incr('dsym.symbol_table.miss')
+            with metrics.timer('dsym.load_symbol_table'):
+                table = self._load_symbol_table(object_id)
+            symbol_tables.set(object_id, table)
+        return table
+
+    def _load_symbol_table(self, object_id):
+        """Loads the symbols of an object into a symbol table.  If a
+        ``SENTRY_DSYM_SYMBOL_TABLE_PATH`` is configured the table is memory
+        mapped from there, and only rebuilt if the number of symbols in the
+        database changed.
+        """
+        queryset = self.filter(object=object_id)
+
+        base = settings.SENTRY_DSYM_SYMBOL_TABLE_PATH
+        if base is None:
+            return SymbolTable.from_symbols(queryset.order_by(
+                'address').values_list('address', 'symbol').iterator())
+
+        path = os.path.join(base, str(object_id))
+        try:
+            table = SymbolTable.load(path)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            table = None
+        if table is not None and len(table) == queryset.count():
+            return table
+
+        table = SymbolTable.from_symbols(queryset.order_by(
+            'address').values_list('address', 'symbol').iterator())
+        try:
+            os.makedirs(base)
+        except OSError:
+            pass
+        table.dump(path)
+        return SymbolTable.load(path) or table
 
 
 class DSymSymbol(Model):
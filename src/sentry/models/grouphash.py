@@ -9,7 +9,87 @@ from __future__ import absolute_import
 
 from django.db import models
 
-from sentry.db.models import FlexibleForeignKey, Model
+from sentry.db.models import BaseManager, FlexibleForeignKey, Model
+from sentry.utils.lru import LRUCache
+
+# Hashes only move between groups when groups are merged or deleted, so the
+# group of a hash is cached both in process (briefly, as it cannot be
+# invalidated from other processes) and in the shared cache.
+LOCAL_CACHE_TTL = 60
+SHARED_CACHE_TTL = 60 * 60
+
+local_group_ids = LRUCache(10000, ttl=LOCAL_CACHE_TTL)
+
+
+class GroupHashManager(BaseManager):
+    def _make_cache_key(self, project_id, hash):
+        return 'grouphash:v1:%s:%s' % (project_id, hash)
+
+    def get_group_ids(self, project_id, hashes):
+        """
+        Return a mapping of the (cached) hashes of a project to the ID of the
+        group they belong to. Hashes which are not cached are omitted.
+        """
+        from sentry.cache import default_cache
+
+        results = {}
+        missing = []
+        for hash in hashes:
+            group_id = local_group_ids.get((project_id, hash))
+            if group_id is None:
+                missing.append(hash)
+            else:
+                results[hash] = group_id
+
+        if missing:
+            cache_keys = dict(
+                (self._make_cache_key(project_id, hash), hash)
+                for hash in missing
+            )
+            for cache_key, group_id in default_cache.get_many(cache_keys).iteritems():
+                hash = cache_keys[cache_key]
+                local_group_ids.set((project_id, hash), group_id)
+                results[hash] = group_id
+
+        return results
+
+    def set_group_ids(self, project_id, hashes, group_id):
+        """
+        Record that the given hashes of a project belong to a group.
+        """
+        from sentry.cache import default_cache
+
+        for hash in hashes:
+            local_group_ids.set((project_id, hash), group_id)
+        default_cache.set_many(dict(
+            (self._make_cache_key(project_id, hash), group_id)
+            for hash in hashes
+        ), SHARED_CACHE_TTL)
+
+    def clear_group_ids(self, project_id, hashes):
+        from sentry.cache import default_cache
+
+        for hash in hashes:
+            local_group_ids.delete((project_id, hash))
+        default_cache.delete_many([
+            self._make_cache_key(project_id, hash)
+            for hash in hashes
+        ])
+
+    def clear_group_ids_for_group(self, group_id):
+        """
+        Clear the cached group of all hashes which belong to a group, i.e.
+        before it is merged into another one or deleted. Returns the hashes
+        (by project.)
+        """
+        hashes_by_project = {}
+        for project_id, hash in self.filter(group=group_id).values_list(
+                'project_id', 'hash'):
+            hashes_by_project.setdefault(project_id, []).append(hash)
+
+        for project_id, hashes in hashes_by_project.iteritems():
+            self.clear_group_ids(project_id, hashes)
+        return hashes_by_project
 
 
 class GroupHash(Model):
@@ -19,6 +99,8 @@ class GroupHash(Model):
     hash = models.CharField(max_length=32)
     group = FlexibleForeignKey('sentry.Group', null=True)
 
+    objects = GroupHashManager()
+
     class Meta:
         app_label = 'sentry'
         db_table = 'sentry_grouphash'
@@ -7,8 +7,11 @@ sentry.models.rule
 """
 from __future__ import absolute_import, print_function
 
+import json
+
 from django.db import models
 from django.utils import timezone
+from hashlib import md5
 
 from sentry.db.models import (
     BoundedPositiveIntegerField, Model, FlexibleForeignKey, GzippedDictField,
@@ -50,25 +53,41 @@ class Rule(Model):
     __repr__ = sane_repr('project_id', 'label')
 
     @classmethod
-    def get_for_project(cls, project_id):
-        cache_key = 'project:{}:rules'.format(project_id)
-        rules_list = cache.get(cache_key)
-        if rules_list is None:
+    def _get_cache_key(cls, project_id):
+        return 'project:{}:rules:v2'.format(project_id)
+
+    @classmethod
+    def get_versioned_for_project(cls, project_id):
+        """
+        Return a ``(version, rules)`` tuple of the active rules of a project.
+        The version is derived from the rules, so it only changes when they
+        do (and not when they are reloaded from the database), and can be
+        used to validate anything which is derived from the rules.
+        """
+        cache_key = cls._get_cache_key(project_id)
+        result = cache.get(cache_key)
+        if result is None:
             rules_list = list(cls.objects.filter(
                 project=project_id,
                 status=RuleStatus.ACTIVE,
-            ))
-            cache.set(cache_key, rules_list, 60)
-        return rules_list
+            ).order_by('id'))
+            version = md5(json.dumps([
+                (rule.id, rule.label, rule.data) for rule in rules_list
+            ], sort_keys=True, default=repr)).hexdigest()
+            result = (version, rules_list)
+            cache.set(cache_key, result, 60)
+        return result
+
+    @classmethod
+    def get_for_project(cls, project_id):
+        return cls.get_versioned_for_project(project_id)[1]
 
     def delete(self, *args, **kwargs):
         rv = super(Rule, self).delete(*args, **kwargs)
-        cache_key = 'project:{}:rules'.format(self.project_id)
-        cache.delete(cache_key)
+        cache.delete(self._get_cache_key(self.project_id))
         return rv
 
     def save(self, *args, **kwargs):
         rv = super(Rule, self).save(*args, **kwargs)
-        cache_key = 'project:{}:rules'.format(self.project_id)
-        cache.delete(cache_key)
+        cache.delete(self._get_cache_key(self.project_id))
         return rv
@@ -10,6 +10,8 @@ from __future__ import absolute_import, print_function
 import re
 
 from django.db import models
+from django.utils.encoding import force_bytes
+from hashlib import md5
 from django.utils.translation import ugettext_lazy as _
 
 from sentry.constants import MAX_TAG_KEY_LENGTH, TAG_LABELS
@@ -17,6 +19,7 @@ from sentry.db.models import (
     Model, BoundedPositiveIntegerField, FlexibleForeignKey, sane_repr
 )
 from sentry.db.models.manager import BaseManager
+from sentry.db.models.query import bulk_get_or_create
 from sentry.utils.cache import cache
 
 # Valid pattern for tag key names
@@ -38,6 +41,25 @@ class TagKeyManager(BaseManager):
     def _get_cache_key(self, project_id):
         return 'filterkey:all:%s' % project_id
 
+    def _get_id_cache_key(self, project_id, key):
+        return 'filterkey:id:%s:%s' % (project_id, md5(force_bytes(key)).hexdigest())
+
+    def get_or_create_ids(self, project_id, keys):
+        """
+        Return a mapping of tag keys to the IDs of their ``TagKey`` in the
+        project, creating the missing ones.
+        """
+        ids = bulk_get_or_create(
+            self.model,
+            ('project_id', 'key'),
+            [(project_id, key) for key in keys],
+            cache_key=lambda value: self._get_id_cache_key(*value),
+        )
+        return dict((key, pk) for (_, key), pk in ids.iteritems())
+
+    def clear_id_cache(self, project_id, key):
+        cache.delete(self._get_id_cache_key(project_id, key))
+
     def all_keys(self, project):
         # TODO: cache invalidation via post_save/post_delete signals much like BaseManager
         key = self._get_cache_key(project.id)
@@ -10,15 +10,62 @@ from __future__ import absolute_import, print_function
 from django.core.urlresolvers import reverse
 from django.db import models
 from django.utils import timezone
+from django.utils.encoding import force_bytes
+from hashlib import md5
+from uuid import uuid4
 
 from sentry.constants import MAX_TAG_KEY_LENGTH, MAX_TAG_VALUE_LENGTH
 from sentry.db.models import (
     Model, BoundedPositiveIntegerField, FlexibleForeignKey, GzippedDictField,
-    BaseManager, sane_repr
+    BaseManager, bulk_get_or_create, sane_repr
 )
+from sentry.utils.cache import cache
 from sentry.utils.http import absolute_uri
 
 
+class TagValueManager(BaseManager):
+    def _get_id_cache_key(self, version, key_id, value):
+        return 'filtervalue:id:%s:%s:%s' % (
+            version, key_id, md5(force_bytes(value)).hexdigest())
+
+    def _get_id_cache_version(self):
+        """
+        Return the version of the cached IDs, which changes whenever tag
+        values are purged (see ``clear_id_cache``.)
+        """
+        version = cache.get('filtervalue:id:version')
+        if version is None:
+            # a version which nothing was cached with
+            version = uuid4().hex[:12]
+            if not cache.add('filtervalue:id:version', version, 86400):
+                version = cache.get('filtervalue:id:version') or version
+        return version
+
+    def clear_id_cache(self):
+        """
+        Discard all cached IDs, i.e. once tag values were deleted in bulk.
+        """
+        cache.set('filtervalue:id:version', uuid4().hex[:12], 86400)
+
+    def get_or_create_ids(self, project_id, tags, key_ids):
+        """
+        Return a mapping of ``(key, value)`` pairs to the IDs of their
+        ``TagValue`` in the project, creating the missing ones.
+
+        ``key_ids`` maps each key to the ID of its ``TagKey``, which cached
+        IDs are bound to so they are discarded if the key is deleted.
+        """
+        version = self._get_id_cache_version()
+        ids = bulk_get_or_create(
+            self.model,
+            ('project_id', 'key', 'value'),
+            [(project_id, key, value) for key, value in tags],
+            cache_key=lambda value: self._get_id_cache_key(
+                version, key_ids[value[1]], value[2]),
+        )
+        return dict(((key, value), pk) for (_, key, value), pk in ids.iteritems())
+
+
 class TagValue(Model):
     """
     Stores references to available filters.
@@ -35,7 +82,7 @@ class TagValue(Model):
     first_seen = models.DateTimeField(
         default=timezone.now, db_index=True, null=True)
 
-    objects = BaseManager()
+    objects = TagValueManager()
 
     class Meta:
         app_label = 'sentry'
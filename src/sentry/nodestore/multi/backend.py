@@ -82,6 +82,17 @@ class MultiNodeStorage(NodeStorage):
         if should_raise:
             raise
 
+    def delete_multi(self, id_list):
+        should_raise = False
+        for backend in self.backends:
+            try:
+                backend.delete_multi(id_list)
+            except Exception:
+                should_raise = True
+
+        if should_raise:
+            raise
+
     def cleanup(self, cutoff_timestamp):
         should_raise = False
         for backend in self.backends:
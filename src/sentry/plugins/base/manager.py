@@ -11,11 +11,20 @@ __all__ = ('PluginManager',)
 
 import logging
 
+from sentry.utils.lru import LRUCache
 from sentry.utils.managers import InstanceManager
 from sentry.utils.safe import safe_execute
 
 
 class PluginManager(InstanceManager):
+    def __init__(self, *args, **kwargs):
+        # The plugins which are enabled for recently seen projects, keyed by
+        # ``(project_id, version)``. Each entry is only valid as long as the
+        # project's options (and the registered plugins) don't change. As
+        # plugins may also be enabled depending on other state, entries expire.
+        self.project_cache = LRUCache(10000, ttl=60)
+        super(PluginManager, self).__init__(*args, **kwargs)
+
     def __iter__(self):
         return iter(self.all())
 
@@ -38,12 +47,34 @@ class PluginManager(InstanceManager):
             yield plugin
 
     def for_project(self, project, version=1):
-        for plugin in self.all(version=version):
-            if not safe_execute(plugin.is_enabled, project,
-                                _with_transaction=False):
-                continue
+        for plugin in self.enabled_for_project(project, version=version):
             yield plugin
 
+    def enabled_for_project(self, project, version=1):
+        """
+        Return the list of plugins which are enabled for ``project``, which
+        is only resolved again once the project's options change.
+        """
+        from sentry.models import ProjectOption
+
+        options = ProjectOption.objects.get_all_values(project)
+        registry = super(PluginManager, self).all()
+        cache_key = (project.id, version)
+
+        result = self.project_cache.get(cache_key)
+        if result is not None and result[0] is registry and result[1] == options:
+            return result[2]
+
+        enabled = [
+            plugin for plugin in self.all(version=version)
+            if safe_execute(plugin.is_enabled, project, _with_transaction=False)
+        ]
+        self.project_cache.set(cache_key, (registry, dict(options), enabled))
+        return enabled
+
+    def clear_project_cache(self):
+        self.project_cache.clear()
+
     def for_site(self, version=1):
         for plugin in self.all(version=version):
             if not plugin.has_site_conf():
@@ -360,6 +360,28 @@ class IPlugin(local, PluggableViewMixin):
         """
         return tag_list
 
+    def get_annotations_for_groups(self, groups, **kwargs):
+        """
+        Return a mapping of each group to its list of tags (see ``tags``) for
+        a list of groups of the same project.
+
+        By default ``tags`` is called for every group. Plugins which look up
+        their tags (i.e. from an external service) should override this to
+        look up all of the groups at once.
+
+        >>> def get_annotations_for_groups(self, groups, **kwargs):
+        >>>     return dict((group, [':(']) for group in groups)
+        """
+        from sentry.utils.safe import safe_execute
+
+        results = {}
+        for group in groups:
+            tag_list = []
+            safe_execute(self.tags, None, group, tag_list,
+                         _with_transaction=False)
+            results[group] = tag_list
+        return results
+
     def actions(self, request, group, action_list, **kwargs):
         """
         Modifies the action list for a grouped message.
@@ -320,6 +320,30 @@ class IPlugin2(local):
         """
         return []
 
+    def get_annotations_for_groups(self, groups, **kwargs):
+        """
+        Return a mapping of each group to its list of annotations (see
+        ``get_annotations``) for a list of groups of the same project.
+
+        By default ``get_annotations`` is called for every group. Plugins
+        which look up their annotations (i.e. from an external service) should
+        override this to look up all of the groups at once.
+
+        >>> def get_annotations_for_groups(self, groups, **kwargs):
+        >>>     task_ids = GroupMeta.objects.get_value_bulk(groups, 'myplugin:tid')
+        >>>     return dict(
+        >>>         (group, [{'label': '#%s' % (task_id,)}] if task_id else [])
+        >>>         for group, task_id in task_ids.iteritems()
+        >>>     )
+        """
+        from sentry.utils.safe import safe_execute
+
+        return dict(
+            (group, safe_execute(self.get_annotations, group=group,
+                                 _with_transaction=False) or [])
+            for group in groups
+        )
+
     def get_notifiers(self, **kwargs):
         """
         Return a list of notifiers to append to the registry.
@@ -344,7 +368,7 @@ class IPlugin2(local):
         """
         return []
 
-    def get_event_preprocessors(self, **kwargs):
+    def get_event_preprocessors(self, data=None, **kwargs):
         """
         Return a list of preprocessors to apply to the given event.
 
@@ -352,7 +376,12 @@ class IPlugin2(local):
         input and returns modified data as output. If no changes to the data are
         made it is safe to return ``None``.
 
-        >>> def get_event_preprocessors(self, **kwargs):
+        Plugins should only return preprocessors for the events (``data``)
+        they apply to, as events which are not preprocessed at all can be
+        saved right away. (Plugins which don't accept ``data`` are called
+        without it, and apply to every event.)
+
+        >>> def get_event_preprocessors(self, data=None, **kwargs):
         >>>     return [lambda x: x]
         """
         return []
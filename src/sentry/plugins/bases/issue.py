@@ -318,6 +318,27 @@ class IssueTrackingPlugin(Plugin):
 
         return tag_list
 
+    def get_annotations_for_groups(self, groups, **kwargs):
+        # plugins which customize ``tags`` still have it called for every group
+        if type(self).tags.__func__ is not IssueTrackingPlugin.tags.__func__:
+            return super(IssueTrackingPlugin, self).get_annotations_for_groups(
+                groups, **kwargs)
+
+        results = dict((group, []) for group in groups)
+        if not groups or not self.is_configured(request=None, project=groups[0].project):
+            return results
+
+        prefix = self.get_conf_key()
+        issue_ids = GroupMeta.objects.get_value_bulk(groups, '%s:tid' % prefix)
+        for group, issue_id in issue_ids.iteritems():
+            if not issue_id:
+                continue
+            results[group].append(format_html('<a href="{}">{}</a>',
+                self.get_issue_url(group=group, issue_id=issue_id),
+                self.get_issue_label(group=group, issue_id=issue_id),
+            ))
+        return results
+
     def get_issue_doc_html(self, **kwargs):
         return ""
 
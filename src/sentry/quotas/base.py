@@ -35,7 +35,13 @@ class Quota(object):
         Raise ``InvalidConfiguration`` if there is a configuration error.
         """
 
-    def is_rate_limited(self, project):
+    def is_rate_limited(self, project, quantity=1):
+        """
+        Check whether ``quantity`` events for ``project`` should be rejected.
+
+        When ``quantity`` is greater than one, the items are accepted (and
+        counted against the quota) or rejected as a single unit.
+        """
         return NotRateLimited
 
     def get_time_remaining(self):
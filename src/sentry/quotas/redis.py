@@ -7,13 +7,38 @@ sentry.quotas.redis
 """
 from __future__ import absolute_import
 
+import logging
+import math
+import threading
+
 from time import time
 
 from sentry.exceptions import InvalidConfiguration
 from sentry.quotas.base import NotRateLimited, Quota, RateLimited
+from sentry.utils import metrics
 from sentry.utils.redis import get_cluster_from_options, load_script
 
+logger = logging.getLogger(__name__)
+
 is_rate_limited = load_script('quotas/is_rate_limited.lua')
+lease_quota = load_script('quotas/lease.lua')
+
+
+class Lease(object):
+    """
+    Items which were leased from the counters of a set of quotas for the
+    current window, and are consumed locally.
+    """
+    __slots__ = ('keys', 'expires', 'remaining', 'exhausted', 'refilling')
+
+    def __init__(self, keys, expires):
+        self.keys = keys
+        self.expires = expires
+        self.remaining = 0
+        # Whether the quotas ran out for this window (so items which don't
+        # fit the remaining lease are rejected without asking Redis again.)
+        self.exhausted = False
+        self.refilling = False
 
 
 class RedisQuota(Quota):
@@ -24,9 +49,25 @@ class RedisQuota(Quota):
 
     def __init__(self, **options):
         self.cluster, options = get_cluster_from_options('SENTRY_QUOTA_OPTIONS', options)
+
+        # When set, each process leases this share of a quota (i.e. ``0.01``
+        # for 1%) at once from Redis, rather than checking every item with
+        # Redis. Leased items are counted as used, so quotas are never
+        # exceeded, but up to one lease per process may go unused within a
+        # window.
+        self.lease_ratio = options.pop('lease_ratio', None)
+        # The maximum number of items leased at once.
+        self.max_lease_size = options.pop('max_lease_size', 1000)
+        # A new lease is requested in the background once the remaining share
+        # of the current lease drops below this ratio.
+        self.refill_ratio = options.pop('refill_ratio', 0.25)
+
         super(RedisQuota, self).__init__(**options)
         self.namespace = 'quota'
 
+        self._leases = {}
+        self._lock = threading.Lock()
+
     def validate(self):
         try:
             with self.cluster.all() as client:
@@ -43,7 +84,7 @@ class RedisQuota(Quota):
     def get_redis_key(self, key, timestamp, interval):
         return '{}:{}:{}'.format(self.namespace, key, int(timestamp // interval))
 
-    def is_rate_limited(self, project):
+    def is_rate_limited(self, project, quantity=1):
         timestamp = time()
 
         quotas = filter(
@@ -55,6 +96,11 @@ class RedisQuota(Quota):
         if not quotas:
             return NotRateLimited
 
+        client = self.cluster.get_local_client_for_key(str(project.organization.pk))
+
+        if self.lease_ratio:
+            return self._is_rate_limited_leased(client, quotas, timestamp, quantity)
+
         def get_next_period_start(interval):
             """Return the timestamp when the next rate limit period begins for an interval."""
             return ((timestamp // interval) + 1) * interval
@@ -65,11 +111,97 @@ class RedisQuota(Quota):
             keys.append(self.get_redis_key(key, timestamp, interval))
             expiry = get_next_period_start(interval) + self.grace
             args.extend((limit, int(expiry)))
+        args.append(quantity)
 
-        client = self.cluster.get_local_client_for_key(str(project.organization.pk))
         rejections = is_rate_limited(client, keys, args)
         if any(rejections):
             delay = max(get_next_period_start(interval) - timestamp for (key, limit, interval), rejected in zip(quotas, rejections) if rejected)
             return RateLimited(retry_after=delay)
         else:
             return NotRateLimited
+
+    def get_lease_size(self, quotas):
+        size = int(math.ceil(min(limit for _, limit, _ in quotas) * self.lease_ratio))
+        return max(1, min(size, self.max_lease_size))
+
+    def spawn(self, func, *args):
+        """
+        Run ``func`` in the background, so that leases are refilled without
+        delaying the current request.
+        """
+        thread = threading.Thread(target=func, args=args)
+        thread.daemon = True
+        thread.start()
+
+    def _is_rate_limited_leased(self, client, quotas, timestamp, quantity):
+        lease_id = tuple(key for key, _, _ in quotas)
+        keys = tuple(
+            self.get_redis_key(key, timestamp, interval)
+            for key, _, interval in quotas
+        )
+        lease_size = self.get_lease_size(quotas)
+
+        refill = False
+        with self._lock:
+            lease = self._leases.get(lease_id)
+            if lease is None or lease.keys != keys:
+                # The window rolled over. Whatever remains of the previous
+                # lease was counted against a window which is over, so there
+                # is nothing to return.
+                lease = self._leases[lease_id] = Lease(keys, min(
+                    ((timestamp // interval) + 1) * interval
+                    for _, _, interval in quotas
+                ))
+
+            if lease.remaining >= quantity:
+                lease.remaining -= quantity
+                accepted = True
+                if (not lease.refilling and not lease.exhausted and
+                        lease.remaining < lease_size * self.refill_ratio):
+                    lease.refilling = refill = True
+            else:
+                accepted = False
+                exhausted = lease.exhausted
+
+        if accepted:
+            if refill:
+                self.spawn(self._refill, client, lease, quotas, lease_size)
+            return NotRateLimited
+
+        if not exhausted:
+            # Lease enough for the items synchronously, as the background
+            # refill didn't (or couldn't) keep up.
+            self._lease(client, lease, quotas, max(lease_size, quantity))
+            with self._lock:
+                if lease.remaining >= quantity:
+                    lease.remaining -= quantity
+                    return NotRateLimited
+
+        metrics.incr('quotas.lease.rejected')
+        return RateLimited(retry_after=lease.expires - timestamp)
+
+    def _lease(self, client, lease, quotas, size):
+        args = []
+        for _, limit, _ in quotas:
+            args.extend((limit, int(lease.expires + self.grace)))
+        args.append(size)
+
+        try:
+            granted = lease_quota(client, lease.keys, args)
+        except Exception:
+            with self._lock:
+                lease.refilling = False
+            raise
+
+        metrics.incr('quotas.lease.acquired')
+        with self._lock:
+            lease.remaining += granted
+            lease.refilling = False
+            if granted < size:
+                lease.exhausted = True
+
+    def _refill(self, client, lease, quotas, size):
+        try:
+            self._lease(client, lease, quotas, size)
+        except Exception:
+            logger.exception('Unable to lease quota')
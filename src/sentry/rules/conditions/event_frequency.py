@@ -8,9 +8,8 @@ sentry.rules.conditions.event_frequency
 
 from __future__ import absolute_import
 
-from datetime import datetime, timedelta
+from datetime import timedelta
 from django import forms
-from pytz import utc
 
 from django.utils import timezone
 from sentry.rules.conditions.base import EventCondition
@@ -21,6 +20,14 @@ class Interval(object):
     ONE_HOUR = '1h'
 
 
+# The length of each interval in seconds, which is the window of the counter
+# its rate is read from.
+INTERVAL_SECONDS = {
+    Interval.ONE_MINUTE: 60,
+    Interval.ONE_HOUR: 60 * 60,
+}
+
+
 class EventFrequencyForm(forms.Form):
     interval = forms.ChoiceField(choices=(
         (Interval.ONE_MINUTE, 'one minute'),
@@ -37,61 +44,88 @@ class EventFrequencyCondition(EventCondition):
     label = 'An event is seen more than {value} times in {interval}'
 
     def __init__(self, *args, **kwargs):
-        from sentry.app import tsdb
+        from sentry.app import counters, tsdb
 
+        self.counters = kwargs.pop('counters', counters)
         self.tsdb = kwargs.pop('tsdb', tsdb)
 
         super(EventFrequencyCondition, self).__init__(*args, **kwargs)
 
-    def passes(self, event, state):
+    def get_required_interval(self, state):
+        """
+        Return the interval whose rate ``passes`` needs to look up for the
+        given state, or ``None`` if it can be decided without it.
+        """
         # when a rule is not active (i.e. it hasnt gone from inactive -> active)
         # it means that we already notified the user about this condition and
         # shouldn't spam them again
         if state.rule_is_active:
-            return False
+            return None
 
         interval = self.get_option('interval')
+        if not interval:
+            return None
+
         try:
-            value = int(self.get_option('value'))
+            int(self.get_option('value'))
         except (TypeError, ValueError):
-            return False
-
-        if not interval:
-            return False
+            return None
 
         now = timezone.now()
 
         # XXX(dcramer): hardcode 30 minute frequency until rules support choices
         if state.rule_last_active and state.rule_last_active > (now - timedelta(minutes=30)):
+            return None
+
+        return interval
+
+    def passes(self, event, state):
+        interval = self.get_required_interval(state)
+        if interval is None:
             return False
 
         current_value = self.get_rate(event, interval)
 
-        return current_value > value
+        return current_value > int(self.get_option('value'))
 
     def clear_cache(self, event):
         event._rate_cache = {}
 
+    def prefetch_rates(self, event, intervals):
+        """
+        Look up the rates of the event's group for all of the given intervals
+        at once, so that conditions of other rules which use the same (or a
+        different) interval don't have to look them up one by one.
+        """
+        if not hasattr(event, '_rate_cache'):
+            event._rate_cache = {}
+
+        windows = dict(
+            (INTERVAL_SECONDS[interval], interval)
+            for interval in intervals
+            if interval in INTERVAL_SECONDS and interval not in event._rate_cache
+        )
+        if not windows:
+            return
+
+        counts = self.counters.get_counts(
+            self.counters.models.group,
+            event.group_id,
+            windows.keys(),
+        )
+        for window, count in counts.iteritems():
+            event._rate_cache[windows[window]] = count
+
     def get_rate(self, event, interval):
+        if interval not in INTERVAL_SECONDS:
+            raise ValueError(interval)
+
         if not hasattr(event, '_rate_cache'):
             event._rate_cache = {}
 
         result = event._rate_cache.get(interval)
         if result is None:
-            end = datetime.utcnow().replace(tzinfo=utc)
-            if interval == Interval.ONE_MINUTE:
-                start = end - timedelta(minutes=1)
-            elif interval == Interval.ONE_HOUR:
-                start = end - timedelta(hours=1)
-            else:
-                raise ValueError(interval)
-
-            result = self.tsdb.get_sums(
-                model=self.tsdb.models.group,
-                keys=[event.group_id],
-                start=start,
-                end=end,
-            )[event.group_id]
-            event._rate_cache[interval] = result
+            self.prefetch_rates(event, [interval])
+            result = event._rate_cache[interval]
 
         return result
@@ -3,14 +3,57 @@ from __future__ import absolute_import
 import logging
 
 from collections import defaultdict, namedtuple
+from django.db import IntegrityError, router, transaction
 from django.utils import timezone
 
 from sentry.models import GroupRuleStatus, Rule
 from sentry.rules import EventState, rules
+from sentry.rules.conditions.event_frequency import EventFrequencyCondition
+from sentry.utils.lru import LRUCache
 from sentry.utils.safe import safe_execute
 
 RuleFuture = namedtuple('RuleFuture', ['rule', 'kwargs'])
 
+logger = logging.getLogger('sentry.rules')
+
+# The compiled rules of recently processed projects, keyed by project ID, as
+# a ``(version, compiled_rules)`` tuple. They are recompiled whenever the
+# version of the project's rules changes (see ``Rule.get_versioned_for_project``.)
+compiled_rules_cache = LRUCache(1000)
+
+
+class CompiledRule(object):
+    """
+    A rule along with instances of its conditions, which are reused for every
+    event of the project until its rules change.
+
+    Conditions which are not registered are ``None``.
+    """
+    __slots__ = ('rule', 'match', 'conditions')
+
+    def __init__(self, rule, project):
+        self.rule = rule
+        self.match = rule.data.get('action_match', 'all')
+        self.conditions = []
+        for condition in rule.data.get('conditions', ()):
+            condition_cls = rules.get(condition['id'])
+            if condition_cls is None:
+                logger.warn('Unregistered condition %r', condition['id'])
+                self.conditions.append(None)
+                continue
+            self.conditions.append(
+                condition_cls(project, data=condition, rule=rule),
+            )
+
+
+def get_compiled_rules(project):
+    version, rules_list = Rule.get_versioned_for_project(project.id)
+    result = compiled_rules_cache.get(project.id)
+    if result is None or result[0] != version:
+        result = (version, [CompiledRule(rule, project) for rule in rules_list])
+        compiled_rules_cache.set(project.id, result)
+    return result[1]
+
 
 # TODO(dcramer): come up with a clean way to kill this either by renaming
 # the Event.message attribute or updating all plugins (former is better)
@@ -50,8 +93,50 @@ class RuleProcessor(object):
     def get_rules(self):
         return Rule.get_for_project(self.project.id)
 
+    def get_compiled_rules(self):
+        return get_compiled_rules(self.project)
+
+    def get_rule_statuses(self, rules):
+        """
+        Return a mapping of rule ID to the ``GroupRuleStatus`` of the group,
+        creating the missing ones.
+        """
+        statuses = dict(
+            (rule_status.rule_id, rule_status)
+            for rule_status in GroupRuleStatus.objects.filter(
+                group=self.group,
+                rule__in=[rule.id for rule in rules],
+            )
+        )
+
+        missing = [rule for rule in rules if rule.id not in statuses]
+        if not missing:
+            return statuses
+
+        # The statuses are updated by rule and group, so they aren't fetched
+        # again to get their IDs.
+        new_statuses = [
+            GroupRuleStatus(
+                rule=rule,
+                group=self.group,
+                project=self.project,
+                status=GroupRuleStatus.INACTIVE,
+            ) for rule in missing
+        ]
+        try:
+            with transaction.atomic(using=router.db_for_write(GroupRuleStatus)):
+                GroupRuleStatus.objects.bulk_create(new_statuses)
+        except IntegrityError:
+            # another event of the group created some of them concurrently
+            for rule in missing:
+                statuses[rule.id] = self.get_rule_status(rule)
+        else:
+            for rule_status in new_statuses:
+                statuses[rule_status.rule_id] = rule_status
+
+        return statuses
+
     def get_rule_status(self, rule):
-        # TODO(dcramer): this isnt the most efficient query pattern for this
         rule_status, _ = GroupRuleStatus.objects.get_or_create(
             rule=rule,
             group=self.group,
@@ -64,13 +149,10 @@ class RuleProcessor(object):
         return rule_status
 
     def condition_matches(self, condition, state, rule):
-        condition_cls = rules.get(condition['id'])
-        if condition_cls is None:
-            self.logger.warn('Unregistered condition %r', condition['id'])
+        if condition is None:
             return
 
-        condition_inst = condition_cls(self.project, data=condition, rule=rule)
-        return safe_execute(condition_inst.passes, self.event, state,
+        return safe_execute(condition.passes, self.event, state,
                             _with_transaction=False)
 
     def get_state(self, rule_status):
@@ -82,39 +164,36 @@ class RuleProcessor(object):
             rule_last_active=rule_status.last_active,
         )
 
-    def apply_rule(self, rule):
-        match = rule.data.get('action_match', 'all')
-        condition_list = rule.data.get('conditions', ())
+    def prefetch_rates(self, compiled_rules, states):
+        """
+        Look up the event frequencies which are needed by any of the rules
+        with a single query.
+        """
+        frequency_condition = None
+        intervals = set()
+        for compiled_rule in compiled_rules:
+            state = states[compiled_rule.rule.id]
+            for condition in compiled_rule.conditions:
+                if not isinstance(condition, EventFrequencyCondition):
+                    continue
+                interval = condition.get_required_interval(state)
+                if interval is not None:
+                    frequency_condition = condition
+                    intervals.add(interval)
 
-        # XXX(dcramer): if theres no condition should we really skip it,
-        # or should we just apply it blindly?
-        if not condition_list:
-            return
-
-        rule_status = self.get_rule_status(rule)
-        state = self.get_state(rule_status)
-
-        condition_iter = (
-            self.condition_matches(c, state, rule)
-            for c in condition_list
-        )
-
-        if match == 'all':
-            passed = all(condition_iter)
-        elif match == 'any':
-            passed = any(condition_iter)
-        elif match == 'none':
-            passed = not any(condition_iter)
-        else:
-            self.logger.error('Unsupported action_match %r for rule %d',
-                              match, rule.id)
-            return
+        if intervals:
+            safe_execute(frequency_condition.prefetch_rates, self.event, intervals,
+                         _with_transaction=False)
 
+    def update_rule_status(self, rule_status, passed):
         now = timezone.now()
+        queryset = GroupRuleStatus.objects.filter(
+            rule=rule_status.rule_id,
+            group=rule_status.group_id,
+        )
         if passed and rule_status.status == GroupRuleStatus.INACTIVE:
             # we only fire if we're able to say that the state has changed
-            GroupRuleStatus.objects.filter(
-                id=rule_status.id,
+            queryset.filter(
                 status=GroupRuleStatus.INACTIVE,
             ).update(
                 status=GroupRuleStatus.ACTIVE,
@@ -124,18 +203,38 @@ class RuleProcessor(object):
             rule_status.status = GroupRuleStatus.ACTIVE
         elif not passed and rule_status.status == GroupRuleStatus.ACTIVE:
             # update the state to suggest this rule can fire again
-            GroupRuleStatus.objects.filter(
-                id=rule_status.id,
+            queryset.filter(
                 status=GroupRuleStatus.ACTIVE,
             ).update(status=GroupRuleStatus.INACTIVE)
             rule_status.status = GroupRuleStatus.INACTIVE
         elif passed:
-            GroupRuleStatus.objects.filter(
-                id=rule_status.id,
+            queryset.filter(
                 status=GroupRuleStatus.ACTIVE,
             ).update(last_active=now)
             rule_status.last_active = now
 
+    def apply_rule(self, compiled_rule, rule_status, state):
+        rule = compiled_rule.rule
+        match = compiled_rule.match
+
+        condition_iter = (
+            self.condition_matches(c, state, rule)
+            for c in compiled_rule.conditions
+        )
+
+        if match == 'all':
+            passed = all(condition_iter)
+        elif match == 'any':
+            passed = any(condition_iter)
+        elif match == 'none':
+            passed = not any(condition_iter)
+        else:
+            self.logger.error('Unsupported action_match %r for rule %d',
+                              match, rule.id)
+            return
+
+        self.update_rule_status(rule_status, passed)
+
         if not passed:
             return
 
@@ -159,6 +258,28 @@ class RuleProcessor(object):
 
     def apply(self):
         self.futures_by_cb = defaultdict(list)
-        for rule in self.get_rules():
-            self.apply_rule(rule)
+
+        # XXX(dcramer): if theres no condition should we really skip it,
+        # or should we just apply it blindly?
+        compiled_rules = [
+            compiled_rule for compiled_rule in self.get_compiled_rules()
+            if compiled_rule.conditions
+        ]
+        if not compiled_rules:
+            return self.futures_by_cb.items()
+
+        rule_statuses = self.get_rule_statuses(
+            [compiled_rule.rule for compiled_rule in compiled_rules],
+        )
+        states = dict(
+            (rule_id, self.get_state(rule_status))
+            for rule_id, rule_status in rule_statuses.iteritems()
+        )
+
+        self.prefetch_rates(compiled_rules, states)
+
+        for compiled_rule in compiled_rules:
+            rule_id = compiled_rule.rule.id
+            self.apply_rule(compiled_rule, rule_statuses[rule_id], states[rule_id])
+
         return self.futures_by_cb.items()
@@ -48,6 +48,7 @@ def cli(ctx, config):
 map(lambda cmd: cli.add_command(import_string(cmd)), (
     'sentry.runner.commands.backup.export',
     'sentry.runner.commands.backup.import_',
+    'sentry.runner.commands.benchmark.benchmark',
     'sentry.runner.commands.cleanup.cleanup',
     'sentry.runner.commands.config.config',
     'sentry.runner.commands.createuser.createuser',
@@ -0,0 +1,100 @@
+"""
+sentry.runner.commands.benchmark
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import, print_function
+
+import click
+
+from contextlib import contextmanager
+
+from sentry.runner.decorators import configuration
+
+
+@click.group()
+def benchmark():
+    "Measure the performance of Sentry."
+
+
+@contextmanager
+def noop():
+    yield
+
+
+def format_duration(value):
+    if value is None:
+        return '-'
+    return '%.2f' % (value * 1000,)
+
+
+def format_rate(value):
+    if value is None:
+        return '-'
+    return '%.1f' % (value,)
+
+
+@benchmark.command()
+@click.option('--iterations', '-n', default=100, show_default=True,
+              help='The number of times every payload is ingested.')
+@click.option('--project', type=int, help='The ID of the project to store events in. '
+              'Defaults to the internal project.')
+@click.option('--payload', '-p', 'payloads', multiple=True,
+              help='A sample platform or synthetic payload to ingest (all by default).')
+@click.option('--local/--no-local', default=True, show_default=True,
+              help='Use in-process stand-ins for the time-series storage, buffer '
+              'and counters, and run queued tasks in process.')
+@configuration
+def ingest(iterations, project, payloads, local):
+    """Measure the throughput of event ingestion.
+
+    Sample events (and synthetic payloads with large stacktraces, many
+    breadcrumbs or many tags) are validated, normalized, saved and post
+    processed, reporting the throughput (events per second) and latency
+    percentiles (in milliseconds) of every stage.
+
+    Events are written to the configured database and node storage.
+    """
+    from sentry.models import Project
+    from sentry.utils.benchmark import (
+        IngestBenchmark, SAMPLE_PLATFORMS, SYNTHETIC_PAYLOADS, STAGES,
+        get_payloads, local_backends
+    )
+
+    if project is None:
+        from django.conf import settings
+        project = settings.SENTRY_PROJECT
+
+    try:
+        project = Project.objects.get(id=project)
+    except Project.DoesNotExist:
+        raise click.ClickException('Project %s does not exist.' % (project,))
+
+    try:
+        payloads = get_payloads(payloads)
+    except ValueError as e:
+        raise click.ClickException('%s (expected one of: %s)' % (
+            e, ', '.join(SAMPLE_PLATFORMS + tuple(SYNTHETIC_PAYLOADS))))
+
+    runner = IngestBenchmark(project, payloads)
+    with (local_backends() if local else noop()):
+        runner.run(iterations=iterations)
+
+    summary = runner.summarize()
+    click.echo('%-18s %-14s %8s %10s %8s %8s %8s %8s' % (
+        'payload', 'stage', 'count', 'events/s', 'p50', 'p90', 'p99', 'max'))
+    for name, stages in summary['payloads'].iteritems():
+        for stage in STAGES:
+            stats = stages[stage]
+            click.echo('%-18s %-14s %8d %10s %8s %8s %8s %8s' % (
+                name, stage, stats['count'],
+                format_rate(stats['throughput']),
+                format_duration(stats['p50']),
+                format_duration(stats['p90']),
+                format_duration(stats['p99']),
+                format_duration(stats['max']),
+            ))
+    click.echo('Ingested %d events at %s events/s' % (
+        runner.events, format_rate(summary['throughput'])))
@@ -36,9 +36,18 @@ def get_project(value):
 @click.option('--days', default=30, type=int, show_default=True, help='Numbers of days to truncate on.')
 @click.option('--project', help='Limit truncation to only entries from project.')
 @click.option('--concurrency', type=int, default=1, show_default=True, help='The number of concurrent workers to run.')
+@click.option('--partitions', type=int, default=None, help='The number of ID ranges rows are deleted in '
+              '(by concurrent workers.) Defaults to the concurrency.')
+@click.option('--max-rows-per-second', type=int, default=None, help='Limit the rate at which rows are deleted.')
+@click.option('--max-replication-lag', type=float, default=None, help='Pause deletions while the replica '
+              '(see `--replica`) is more than this many seconds behind.')
+@click.option('--replica', default=None, help='The alias of the database replica to check the lag of.')
+@click.option('--checkpoint', type=click.Path(dir_okay=False), default=None, help='Record the progress of '
+              'deletions in this file, resuming them if a previous run was interrupted.')
 @click.option('--silent', '-q', default=False, is_flag=True, help='Run quietly. No output on success.')
 @configuration
-def cleanup(days, project, concurrency, silent):
+def cleanup(days, project, concurrency, partitions, max_rows_per_second,
+            max_replication_lag, replica, checkpoint, silent):
     """Delete a portion of trailing data based on creation date.
 
     All data that is older than `--days` will be deleted.  The default for
@@ -46,9 +55,16 @@ def cleanup(days, project, concurrency, silent):
     but if you have a specific project you want to limit this to this can be
     done with the `--project` flag which accepts a project ID or a string
     with the form `org/project` where both are slugs.
+
+    Events and groups are deleted in `--partitions` ranges of IDs by
+    `--concurrency` workers. The rate of deletions can be limited with
+    `--max-rows-per-second` and `--max-replication-lag`, and with
+    `--checkpoint` an interrupted cleanup continues where it stopped. Old
+    nodes are removed from the node store by its own (single) cleanup, as
+    its IDs aren't sequential and can't be split into ranges.
     """
     from sentry.app import nodestore
-    from sentry.db.deletion import BulkDeleteQuery
+    from sentry.db.deletion import BulkDeleteQuery, Checkpoint, Throttle
     from sentry.models import (
         Event, EventMapping, Group, GroupRuleStatus, GroupTagValue,
         LostPasswordHash, TagValue, GroupEmailThread,
@@ -67,6 +83,18 @@ def cleanup(days, project, concurrency, silent):
         (Group, 'last_seen'),
     )
 
+    if max_replication_lag is not None and replica is None:
+        click.echo('Error: --max-replication-lag requires --replica', err=True)
+        raise click.Abort()
+
+    throttle = Throttle(
+        rows_per_second=max_rows_per_second,
+        max_replication_lag=max_replication_lag,
+        replica=replica,
+    )
+    if checkpoint is not None:
+        checkpoint = Checkpoint(checkpoint)
+
     if not silent:
         click.echo("Removing expired values for LostPasswordHash")
     LostPasswordHash.objects.filter(
@@ -101,7 +129,10 @@ def cleanup(days, project, concurrency, silent):
             dtfield=dtfield,
             days=days,
             project_id=project_id,
-        ).execute()
+        ).execute(throttle=throttle)
+
+    # the IDs of tag values are cached when events are indexed
+    TagValue.objects.clear_id_cache()
 
     # EventMapping is fairly expensive and is special cased as it's likely you
     # won't need a reference to an event for nearly as long
@@ -112,7 +143,7 @@ def cleanup(days, project, concurrency, silent):
         dtfield='date_added',
         days=min(days, 7),
         project_id=project_id,
-    ).execute()
+    ).execute(throttle=throttle)
 
     # Clean up FileBLob instances which are no longer used and aren't super
     # recent (as there could be a race between blob creation and reference)
@@ -132,7 +163,12 @@ def cleanup(days, project, concurrency, silent):
             dtfield=dtfield,
             days=days,
             project_id=project_id,
-        ).execute_generic()
+        ).execute_partitioned(
+            partitions=partitions or concurrency,
+            concurrency=concurrency,
+            throttle=throttle,
+            checkpoint=checkpoint,
+        )
 
 
 def cleanup_unused_files(quiet=False):
@@ -155,9 +191,20 @@ def cleanup_unused_files(quiet=False):
         timestamp__lte=cutoff,
     )
 
-    for blob in RangeQuerySetWrapper(queryset):
-        if FileBlobIndex.objects.filter(blob=blob).exists():
-            continue
-        if File.objects.filter(blob=blob).exists():
+    # references are looked up for every chunk of blobs at once
+    referenced = set()
+
+    def find_references(blobs):
+        blob_ids = [b.id for b in blobs]
+        referenced.clear()
+        referenced.update(FileBlobIndex.objects.filter(
+            blob__in=blob_ids,
+        ).values_list('blob_id', flat=True))
+        referenced.update(File.objects.filter(
+            blob__in=blob_ids,
+        ).values_list('blob_id', flat=True))
+
+    for blob in RangeQuerySetWrapper(queryset, callbacks=(find_references,)):
+        if blob.id in referenced:
             continue
         blob.delete()
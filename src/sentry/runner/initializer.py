@@ -272,6 +272,7 @@ def validate_backends():
 
     backends = (
         app.buffer,
+        app.counters,
         app.digests,
         app.nodestore,
         app.quotas,
@@ -0,0 +1,33 @@
+-- Increment the sliding window counters of a single key. The buckets of each
+-- window are kept as a ring in the hash ``KEYS[1]``, where every slot has
+-- the epoch of the bucket it holds (``<window>:e<slot>``) and its count
+-- (``<window>:c<slot>``.)
+--
+-- ``ARGV`` holds the TTL of the hash and the amount to increment by, followed
+-- by a ``window, slot, epoch`` triple for every window. For example, to count
+-- 1 item in the minute and hour windows at 1:00:30 (with buckets of 1 second
+-- and 1 minute respectively):
+--
+--   ARGV = {3660, 1, 60, 30, 3630, 3600, 0, 60}
+--
+-- A slot which holds an older bucket is reset, and items of buckets which are
+-- older than the one in their slot (i.e. which already left the window) are
+-- dropped.
+assert(#ARGV > 2 and (#ARGV - 2) % 3 == 0, "incorrect number of arguments provided")
+
+local key = KEYS[1]
+local amount = tonumber(ARGV[2])
+
+for i=3,#ARGV,3 do
+    local epoch_field = ARGV[i] .. ':e' .. ARGV[i + 1]
+    local count_field = ARGV[i] .. ':c' .. ARGV[i + 1]
+    local epoch = tonumber(ARGV[i + 2])
+    local current = tonumber(redis.call('HGET', key, epoch_field))
+    if current == nil or current < epoch then
+        redis.call('HMSET', key, epoch_field, ARGV[i + 2], count_field, amount)
+    elseif current == epoch then
+        redis.call('HINCRBY', key, count_field, amount)
+    end
+end
+
+redis.call('EXPIRE', key, ARGV[1])
@@ -11,18 +11,27 @@
 --   KEYS = {"foo", "bar"}
 --   ARGV = {10, 100, 20, 100}
 --
+-- An optional trailing ``ARGV`` value may be provided to specify the number
+-- of items being checked at once (defaults to 1), which allows a batch of
+-- items to be checked (and counted) with a single call.
+--
 -- If all checks pass (the item is accepted), the counters for all quotas are
 -- incremented. If any checks fail (the item is rejected), the counters for all
 -- quotas are unaffected. The result is a Lua table/array (Redis multi bulk
 -- reply) that specifies whether or not the item was *rejected* based on the
 -- provided limit.
-assert(#KEYS * 2 == #ARGV, "incorrect number of keys and arguments provided")
+assert(#KEYS * 2 == #ARGV or #KEYS * 2 + 1 == #ARGV, "incorrect number of keys and arguments provided")
+
+local quantity = 1
+if #ARGV > #KEYS * 2 then
+    quantity = tonumber(ARGV[#ARGV])
+end
 
 local results = {}
 local failed = false
 for i=1,#KEYS do
     local limit = tonumber(ARGV[(i * 2) - 1])
-    local rejected = (redis.call('GET', KEYS[i]) or 0) + 1 > limit
+    local rejected = (redis.call('GET', KEYS[i]) or 0) + quantity > limit
     if rejected then
         failed = true
     end
@@ -31,7 +40,7 @@ end
 
 if not failed then
     for i=1,#KEYS do
-        redis.call('INCR', KEYS[i])
+        redis.call('INCRBY', KEYS[i], quantity)
         redis.call('EXPIREAT', KEYS[i], ARGV[i * 2])
     end
 end
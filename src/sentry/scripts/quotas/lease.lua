@@ -0,0 +1,29 @@
+-- Lease items from a collection of quota counters, so that they can be
+-- consumed without checking the counters for every item. Values provided as
+-- ``KEYS`` specify the keys of the counters, and values provided as ``ARGV``
+-- specify the maximum value (quota limit) and expiration time for each key
+-- (as in ``is_rate_limited.lua``), followed by the number of items to lease.
+--
+-- The largest number of items (up to the number requested) which fits within
+-- all of the quotas is leased, and the counters of all quotas are incremented
+-- by it. The result is the number of items which were leased.
+assert(#KEYS * 2 + 1 == #ARGV, "incorrect number of keys and arguments provided")
+
+local granted = tonumber(ARGV[#ARGV])
+for i=1,#KEYS do
+    local available = tonumber(ARGV[(i * 2) - 1]) - (redis.call('GET', KEYS[i]) or 0)
+    if available < granted then
+        granted = available
+    end
+end
+
+if granted <= 0 then
+    return 0
+end
+
+for i=1,#KEYS do
+    redis.call('INCRBY', KEYS[i], granted)
+    redis.call('EXPIREAT', KEYS[i], ARGV[i * 2])
+end
+
+return granted
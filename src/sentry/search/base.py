@@ -36,3 +36,29 @@ class SearchBackend(object):
         CursorResult.
         """
         raise NotImplementedError
+
+    def index_event(self, group, event):
+        """
+        Called for every event saved to ``group``, allowing backends which
+        maintain their own index to record the group's message, culprit and
+        the time it was seen.
+        """
+
+    def index_tags(self, project_id, group_id, tags):
+        """
+        Called with the ``(key, value)`` tag pairs of an event once they have
+        been indexed in the database.
+        """
+
+    def remove_group(self, group):
+        """
+        Called before a group is deleted (or merged into another one), so
+        backends which maintain their own index can remove it.
+        """
+
+    def merge_group(self, group, new_group):
+        """
+        Called before ``group`` is deleted once it was merged into
+        ``new_group``.
+        """
+        self.remove_group(group)
@@ -64,6 +64,33 @@ class DjangoSearchBackend(SearchBackend):
               date_from=None, date_from_inclusive=True,
               date_to=None, date_to_inclusive=True,
               cursor=None, limit=100):
+        queryset = self._build_queryset(
+            project=project,
+            query=query,
+            status=status,
+            tags=tags,
+            bookmarked_by=bookmarked_by,
+            assigned_to=assigned_to,
+            first_release=first_release,
+            unassigned=unassigned,
+            age_from=age_from,
+            age_from_inclusive=age_from_inclusive,
+            age_to=age_to,
+            age_to_inclusive=age_to_inclusive,
+            date_from=date_from,
+            date_from_inclusive=date_from_inclusive,
+            date_to=date_to,
+            date_to_inclusive=date_to_inclusive,
+        )
+        return self._paginate_queryset(queryset, sort_by, cursor, limit)
+
+    def _build_queryset(self, project, query=None, status=None, tags=None,
+                        bookmarked_by=None, assigned_to=None, first_release=None,
+                        unassigned=None,
+                        age_from=None, age_from_inclusive=True,
+                        age_to=None, age_to_inclusive=True,
+                        date_from=None, date_from_inclusive=True,
+                        date_to=None, date_to_inclusive=True):
         from sentry.models import Event, Group, GroupStatus
 
         engine = get_db_engine('default')
@@ -169,6 +196,11 @@ class DjangoSearchBackend(SearchBackend):
                 id__in=group_ids,
             )
 
+        return queryset
+
+    def _paginate_queryset(self, queryset, sort_by, cursor, limit):
+        engine = get_db_engine('default')
+
         if engine.startswith('sqlite'):
             score_clause = SQLITE_SORT_CLAUSES[sort_by]
         elif engine.startswith('mysql'):
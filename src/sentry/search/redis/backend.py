@@ -0,0 +1,523 @@
+"""
+sentry.search.redis.backend
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import logging
+import pytz
+import re
+import uuid
+from hashlib import md5
+from time import time
+
+from django.db.models import Q
+from django.utils.encoding import force_bytes
+
+from sentry.search.base import ANY
+from sentry.search.django.backend import DjangoSearchBackend
+from sentry.utils import metrics
+from sentry.utils.dates import to_timestamp
+from sentry.utils.db import is_sqlite
+from sentry.utils.redis import check_cluster_versions, get_cluster_from_options
+from sentry.utils.versioning import Version
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r'\w+', re.U)
+
+# Parts of CamelCase and snake_case identifiers, i.e. "Type" and "Error" of
+# "TypeError".
+WORD_PART_RE = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+')
+
+# SQLite does not allow more than 999 variables in a query, some of which are
+# used by filters other than the candidate groups.
+SQLITE_MAX_CANDIDATES = 900
+
+
+def tokenize(value):
+    """
+    Split ``value`` into the set of lowercased words (and parts of
+    identifiers) which are indexed.
+    """
+    tokens = set()
+    if not value:
+        return tokens
+    for word in WORD_RE.findall(value):
+        tokens.add(word.lower())
+        parts = WORD_PART_RE.findall(word)
+        if len(parts) > 1:
+            tokens.update(part.lower() for part in parts)
+    return tokens
+
+
+def to_score(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=pytz.utc)
+    return repr(to_timestamp(value))
+
+
+class RedisSearchBackend(DjangoSearchBackend):
+    """
+    A search backend which keeps an inverted index of groups in Redis and
+    uses it to narrow down the groups which are queried from the database.
+
+    The index for a project lives on a single Redis host (so that it can be
+    intersected server-side) and looks something like this::
+
+        {
+            "<ns>:<project>:v": {<word>: 0, ...},  # vocabulary (sorted set)
+            "<ns>:<project>:w:<word>": set([<group id>, ...]),
+            "<ns>:<project>:k:<md5(key)>": set([<group id>, ...]),
+            "<ns>:<project>:t:<md5(key, value)>": set([<group id>, ...]),
+            "<ns>:<project>:ls": {<group id>: <last seen>, ...},
+            "<ns>:<project>:fs": {<group id>: <first seen>, ...},
+            "<ns>:<project>:i": <indexed since>,
+        }
+
+    Words of the message and culprit of a group, as well as the time it was
+    last seen, are updated for every saved event (``index_event``), and tag
+    values are added once the event's tags have been indexed in the database
+    (``index_tags``.)
+
+    Text, tag and date filters are answered by intersecting the matching sets,
+    keeping (at most) ``max_candidates`` of the most recently seen groups. The
+    remaining filters, sorting and cursor pagination are then applied to those
+    groups by the database. If there are more candidates than that, queries
+    which are not sorted by date or have filters which only the database
+    answers (and any query on SQLite, which limits the number of variables in
+    a query) are left to the database entirely.
+
+    Words of the query are matched against the beginning of the indexed words
+    (and parts of CamelCase or snake_case identifiers), and the text is then
+    matched exactly against the candidate groups only. Text which contains a
+    word that isn't indexed as a whole word (which may be part of another
+    word, i.e. the end of it) is left to the database.
+
+    The index of a project only covers the groups which were seen since it
+    was enabled (the time is recorded as "indexed since"), until the
+    remaining groups were indexed by ``backfill``, which the first query
+    that the index can't answer schedules. Until then, queries are left to
+    the database, unless they are limited to groups seen since. Groups are
+    removed from the index when they are deleted, and their words and tags
+    are added to the group they are merged into (``merge_group``.)
+    """
+
+    def __init__(self, **options):
+        self.cluster, options = get_cluster_from_options('SENTRY_SEARCH_OPTIONS', options)
+        self.namespace = options.pop('namespace', 's')
+
+        # The maximum number of groups (by most recently seen) that are
+        # passed to the database for a single query.
+        self.max_candidates = options.pop('max_candidates', 5000)
+
+        # The maximum number of indexed words that a single word of a query
+        # may expand to. Words which match more words than this are only
+        # matched by the database.
+        self.max_prefix_terms = options.pop('max_prefix_terms', 100)
+
+        # Index keys expire if their project has not seen an event within
+        # this many seconds (or, for the sets of words and tags, if no group
+        # with them did, which is why it should exceed the retention of
+        # events.)
+        self.ttl = options.pop('ttl', 60 * 60 * 24 * 90)
+
+        super(RedisSearchBackend, self).__init__(**options)
+
+    def validate(self):
+        logger.debug('Validating Redis version...')
+        check_cluster_versions(
+            self.cluster,
+            Version((2, 8, 9)),
+            label='Search',
+        )
+
+    def _make_key(self, project_id, *parts):
+        return ':'.join(
+            [self.namespace, str(project_id)] + [force_bytes(p) for p in parts]
+        )
+
+    def _make_tag_key(self, project_id, key, value=ANY):
+        if value is ANY:
+            return self._make_key(project_id, 'k', md5(force_bytes(key)).hexdigest())
+        return self._make_key(project_id, 't', md5(
+            '{}\x00{}'.format(force_bytes(key), force_bytes(value))
+        ).hexdigest())
+
+    def _get_client(self, project_id):
+        return self.cluster.get_local_client_for_key(self._make_key(project_id))
+
+    def _add_group_to_pipeline(self, pipe, project_id, group_id, words,
+                               last_seen, first_seen):
+        vocabulary_key = self._make_key(project_id, 'v')
+        last_seen_key = self._make_key(project_id, 'ls')
+        first_seen_key = self._make_key(project_id, 'fs')
+        indexed_since_key = self._make_key(project_id, 'i')
+
+        for word in words:
+            key = self._make_key(project_id, 'w', word)
+            pipe.sadd(key, group_id)
+            pipe.expire(key, self.ttl)
+            pipe.zadd(vocabulary_key, 0, force_bytes(word))
+        pipe.zadd(last_seen_key, to_score(last_seen), group_id)
+        pipe.zadd(first_seen_key, to_score(first_seen), group_id)
+        # groups which are seen from now on are indexed
+        pipe.setnx(indexed_since_key, repr(time()))
+        for key in (vocabulary_key, last_seen_key, first_seen_key, indexed_since_key):
+            pipe.expire(key, self.ttl)
+
+    def _add_tags_to_pipeline(self, pipe, project_id, group_id, tags):
+        for key, value in tags:
+            for index_key in (self._make_tag_key(project_id, key),
+                              self._make_tag_key(project_id, key, value)):
+                pipe.sadd(index_key, group_id)
+                pipe.expire(index_key, self.ttl)
+
+    def index_event(self, group, event):
+        project_id = group.project_id
+        words = tokenize(event.message) | tokenize(group.culprit)
+
+        with self._get_client(project_id).pipeline(transaction=False) as pipe:
+            self._add_group_to_pipeline(
+                pipe, project_id, group.id, words, group.last_seen, group.first_seen,
+            )
+            pipe.execute()
+
+    def index_tags(self, project_id, group_id, tags):
+        with self._get_client(project_id).pipeline(transaction=False) as pipe:
+            self._add_tags_to_pipeline(pipe, project_id, group_id, tags)
+            pipe.execute()
+
+    def _index_tag_values(self, project_id, queryset, chunk_size=1000):
+        """
+        Add the groups of the given ``GroupTagValue`` rows to the sets of
+        their tags, in chunks.
+        """
+        last_id = 0
+        while True:
+            rows = list(queryset.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'group_id', 'key', 'value')[:chunk_size])
+            if not rows:
+                return
+            with self._get_client(project_id).pipeline(transaction=False) as pipe:
+                for _, group_id, key, value in rows:
+                    self._add_tags_to_pipeline(pipe, project_id, group_id, [(key, value)])
+                pipe.execute()
+            last_id = rows[-1][0]
+
+    def backfill(self, project_id, chunk_size=1000):
+        """
+        Index all groups of a project (and their tags), including the ones
+        which weren't seen since the index was enabled, after which the index
+        covers every group of the project.
+        """
+        from sentry.models import Group, GroupStatus, GroupTagValue
+
+        client = self._get_client(project_id)
+        indexed_since_key = self._make_key(project_id, 'i')
+        # groups which are seen while the project is backfilled are indexed
+        # by ``index_event``
+        client.setnx(indexed_since_key, repr(time()))
+        client.expire(indexed_since_key, self.ttl)
+
+        queryset = Group.objects.filter(project=project_id).exclude(status__in=(
+            GroupStatus.PENDING_MERGE,
+            GroupStatus.PENDING_DELETION,
+            GroupStatus.DELETION_IN_PROGRESS,
+        ))
+        last_id = 0
+        while True:
+            groups = list(queryset.filter(id__gt=last_id).order_by('id')[:chunk_size])
+            if not groups:
+                break
+            with client.pipeline(transaction=False) as pipe:
+                for group in groups:
+                    self._add_group_to_pipeline(
+                        pipe, project_id, group.id,
+                        tokenize(group.message) | tokenize(group.culprit),
+                        group.last_seen, group.first_seen,
+                    )
+                pipe.execute()
+            last_id = groups[-1].id
+
+        self._index_tag_values(
+            project_id, GroupTagValue.objects.filter(project=project_id), chunk_size)
+
+        client.set(indexed_since_key, '0', ex=self.ttl)
+
+    def _schedule_backfill(self, client, project_id):
+        from sentry.tasks.search import backfill_search_index
+
+        # at most once an hour (i.e. if a backfill failed)
+        if client.set(self._make_key(project_id, 'b'), '1', nx=True, ex=60 * 60):
+            backfill_search_index.delay(project_id=project_id)
+
+    def merge_group(self, group, new_group):
+        from sentry.models import GroupTagValue
+
+        project_id = new_group.project_id
+        with self._get_client(project_id).pipeline(transaction=False) as pipe:
+            self._add_group_to_pipeline(
+                pipe, project_id, new_group.id,
+                tokenize(group.message) | tokenize(group.culprit),
+                max(group.last_seen, new_group.last_seen),
+                min(group.first_seen, new_group.first_seen),
+            )
+            pipe.execute()
+
+        # the tag values of the group belong to the new group by now
+        self._index_tag_values(
+            project_id, GroupTagValue.objects.filter(group=new_group.id))
+
+        self.remove_group(group)
+
+    def remove_group(self, group):
+        # Every query is intersected with the last seen times, so removing
+        # the group from those is enough to keep it out of the candidates.
+        # It's removed from the words of its current message and culprit as
+        # well, the remaining sets expire with the project's index.
+        project_id = group.project_id
+        words = tokenize(group.message) | tokenize(group.culprit)
+
+        with self._get_client(project_id).pipeline(transaction=False) as pipe:
+            for word in words:
+                pipe.srem(self._make_key(project_id, 'w', word), group.id)
+            pipe.zrem(self._make_key(project_id, 'ls'), group.id)
+            pipe.zrem(self._make_key(project_id, 'fs'), group.id)
+            pipe.execute()
+
+    def _expand_word(self, client, project_id, word):
+        """
+        Return the index keys of the words that start with ``word``, none if
+        it isn't indexed as a whole word, or ``None`` if there are too many of
+        them to be useful.
+        """
+        word = force_bytes(word)
+        matches = client.zrangebylex(
+            self._make_key(project_id, 'v'),
+            '[' + word,
+            '[' + word + '\xff',
+            start=0,
+            num=self.max_prefix_terms + 1,
+        )
+        if len(matches) > self.max_prefix_terms:
+            return None
+        if word not in matches:
+            return []
+        return [self._make_key(project_id, 'w', match) for match in matches]
+
+    def _get_candidate_group_ids(self, project, query=None, tags=None,
+                                 date_from=None, date_from_inclusive=True,
+                                 date_to=None, date_to_inclusive=True,
+                                 sort_by='date', exact=False):
+        """
+        Return the IDs of the most recently seen groups which match the text,
+        tag and date filters, or ``None`` if the index cannot narrow down the
+        query.
+
+        ``exact`` is whether the index answers all filters of the query, i.e.
+        the database doesn't filter the candidates any further. Otherwise
+        queries with more candidates than ``max_candidates`` are left to the
+        database, as the remaining filters may not match any of the most
+        recently seen groups.
+        """
+        project_id = project.id
+        client = self._get_client(project_id)
+
+        if not query and not tags and not date_from and not date_to:
+            return None
+
+        # Groups which were last seen before the project was indexed are
+        # only in the index once it was backfilled (or if the query is
+        # limited to groups seen since.)
+        indexed_since = client.get(self._make_key(project_id, 'i'))
+        if indexed_since is None or (float(indexed_since) and not (
+                date_from and float(to_score(date_from)) >= float(indexed_since))):
+            self._schedule_backfill(client, project_id)
+            return None
+
+        # Each item is a list of keys, at least one of which must contain the
+        # group for it to match.
+        clauses = []
+        if query:
+            for word in set(WORD_RE.findall(query.lower())):
+                keys = self._expand_word(client, project_id, word)
+                # Words which match too many indexed words don't narrow down
+                # the candidates, and are left to the database.
+                if keys is None:
+                    continue
+                # The text may start (or end) in the middle of a word, which
+                # only the database matches.
+                if not keys:
+                    return None
+                clauses.append(keys)
+
+        if tags:
+            for key, value in tags.iteritems():
+                clauses.append([self._make_tag_key(project_id, key, value)])
+
+        if not clauses and not date_from and not date_to:
+            return None
+
+        last_seen_key = self._make_key(project_id, 'ls')
+        first_seen_key = self._make_key(project_id, 'fs')
+
+        temporary_keys = []
+
+        def make_temporary_key():
+            key = self._make_key(project_id, 'q', uuid.uuid4().hex)
+            temporary_keys.append(key)
+            return key
+
+        with client.pipeline(transaction=False) as pipe:
+            # Scores of the intersection are the time each group was last seen
+            # so the most recent candidates are kept.
+            weights = {last_seen_key: 1}
+            for keys in clauses:
+                if len(keys) == 1:
+                    weights[keys[0]] = 0
+                else:
+                    union_key = make_temporary_key()
+                    pipe.sunionstore(union_key, keys)
+                    weights[union_key] = 0
+
+            result_key = make_temporary_key()
+            pipe.zinterstore(result_key, weights)
+
+            if date_to:
+                # A group can only have an event before ``date_to`` if it was
+                # first seen before it.
+                first_seen_result_key = make_temporary_key()
+                pipe.zinterstore(first_seen_result_key, {
+                    result_key: 0,
+                    first_seen_key: 1,
+                })
+                pipe.zremrangebyscore(
+                    first_seen_result_key,
+                    ('(' if date_to_inclusive else '') + to_score(date_to),
+                    '+inf',
+                )
+                pipe.zinterstore(result_key, {
+                    first_seen_result_key: 0,
+                    last_seen_key: 1,
+                })
+
+            if date_from:
+                # ... and after ``date_from`` if it was last seen after it.
+                pipe.zremrangebyscore(
+                    result_key,
+                    '-inf',
+                    ('(' if date_from_inclusive else '') + to_score(date_from),
+                )
+
+            pipe.zrevrange(result_key, 0, self.max_candidates)
+            pipe.delete(*temporary_keys)
+            group_ids = pipe.execute()[-2]
+
+        if len(group_ids) > self.max_candidates:
+            metrics.incr('search.index.truncated')
+            # the most recently seen groups are only the first page(s) of
+            # results if they're sorted by date (and nothing else filters
+            # them)
+            if sort_by != 'date' or not exact:
+                return None
+            group_ids = group_ids[:self.max_candidates]
+
+        if len(group_ids) > SQLITE_MAX_CANDIDATES and is_sqlite():
+            return None
+
+        return [int(group_id) for group_id in group_ids]
+
+    def query(self, project, query=None, status=None, tags=None,
+              bookmarked_by=None, assigned_to=None, first_release=None,
+              sort_by='date', unassigned=None,
+              age_from=None, age_from_inclusive=True,
+              age_to=None, age_to_inclusive=True,
+              date_from=None, date_from_inclusive=True,
+              date_to=None, date_to_inclusive=True,
+              cursor=None, limit=100):
+        from sentry.models import Event
+
+        group_ids = self._get_candidate_group_ids(
+            project=project,
+            query=query,
+            tags=tags,
+            date_from=date_from,
+            date_from_inclusive=date_from_inclusive,
+            date_to=date_to,
+            date_to_inclusive=date_to_inclusive,
+            sort_by=sort_by,
+            # the text is matched by the database, as are the times of
+            # events (given both ends of the range) and all other filters
+            exact=not (
+                query or (date_from and date_to) or
+                status is not None or bookmarked_by or assigned_to or
+                first_release or unassigned is not None or
+                age_from or age_to
+            ),
+        )
+        if group_ids is None:
+            return super(RedisSearchBackend, self).query(
+                project=project,
+                query=query,
+                status=status,
+                tags=tags,
+                bookmarked_by=bookmarked_by,
+                assigned_to=assigned_to,
+                first_release=first_release,
+                sort_by=sort_by,
+                unassigned=unassigned,
+                age_from=age_from,
+                age_from_inclusive=age_from_inclusive,
+                age_to=age_to,
+                age_to_inclusive=age_to_inclusive,
+                date_from=date_from,
+                date_from_inclusive=date_from_inclusive,
+                date_to=date_to,
+                date_to_inclusive=date_to_inclusive,
+                cursor=cursor,
+                limit=limit,
+            )
+
+        if group_ids and date_from and date_to:
+            # The index only knows when a group was first and last seen, so
+            # check that the candidates did see an event within the range.
+            params = {
+                'project_id': project.id,
+                'group_id__in': group_ids,
+            }
+            if date_from_inclusive:
+                params['datetime__gte'] = date_from
+            else:
+                params['datetime__gt'] = date_from
+            if date_to_inclusive:
+                params['datetime__lte'] = date_to
+            else:
+                params['datetime__lt'] = date_to
+            group_ids = list(Event.objects.filter(**params).values_list(
+                'group_id', flat=True,
+            ).distinct())
+
+        queryset = self._build_queryset(
+            project=project,
+            status=status,
+            bookmarked_by=bookmarked_by,
+            assigned_to=assigned_to,
+            first_release=first_release,
+            unassigned=unassigned,
+            age_from=age_from,
+            age_from_inclusive=age_from_inclusive,
+            age_to=age_to,
+            age_to_inclusive=age_to_inclusive,
+        ).filter(id__in=group_ids)
+
+        if query:
+            queryset = queryset.filter(
+                Q(message__icontains=query) |
+                Q(culprit__icontains=query)
+            )
+
+        return self._paginate_queryset(queryset, sort_by, cursor, limit)
@@ -10,10 +10,12 @@ from __future__ import absolute_import
 
 import logging
 
+from sentry.db.deletion import DeletionPlan
 from sentry.exceptions import DeleteAborted
 from sentry.signals import pending_delete
 from sentry.tasks.base import instrumented_task, retry
 from sentry.utils.query import bulk_delete_objects
+from sentry.utils.safe import safe_execute
 
 logger = logging.getLogger('sentry.deletions')
 
@@ -90,14 +92,7 @@ def delete_team(object_id, continuous=True, **kwargs):
                    default_retry_delay=60 * 5, max_retries=None)
 @retry(exclude=(DeleteAborted,))
 def delete_project(object_id, continuous=True, **kwargs):
-    from sentry.models import (
-        Activity, EventMapping, EventUser, Group, GroupAssignee, GroupBookmark,
-        GroupEmailThread, GroupHash, GroupMeta, GroupRelease, GroupResolution,
-        GroupRuleStatus, GroupSeen, GroupSubscription, GroupSnooze, GroupTagKey,
-        GroupTagValue, Project, ProjectBookmark, ProjectKey, ProjectStatus,
-        Release, ReleaseFile, SavedSearchUserDefault, SavedSearch, TagKey,
-        TagValue, UserReport
-    )
+    from sentry.models import Project, ProjectKey, ProjectStatus
 
     try:
         p = Project.objects.get(id=object_id)
@@ -114,46 +109,13 @@ def delete_project(object_id, continuous=True, **kwargs):
     # Immediately revoke keys
     ProjectKey.objects.filter(project_id=object_id).delete()
 
-    model_list = (
-        Activity, EventMapping, EventUser, GroupAssignee, GroupBookmark,
-        GroupEmailThread, GroupHash, GroupRelease, GroupRuleStatus, GroupSeen,
-        GroupSubscription, GroupTagKey, GroupTagValue, ProjectBookmark,
-        ProjectKey, TagKey, TagValue, SavedSearchUserDefault, SavedSearch,
-        UserReport
-    )
-    for model in model_list:
-        has_more = bulk_delete_objects(model, project_id=p.id, logger=logger)
-        if has_more:
-            if continuous:
-                delete_project.delay(object_id=object_id, countdown=15)
-            return
-
-    # TODO(dcramer): no project relation so we cant easily bulk
-    # delete today
-    has_more = delete_objects([GroupMeta, GroupResolution, GroupSnooze],
-                              relation={'group__project': p},
-                              logger=logger)
+    plan = DeletionPlan(Project, p.id)
+    has_more = plan.execute(limit=100000, logger=logger)
     if has_more:
         if continuous:
             delete_project.delay(object_id=object_id, countdown=15)
         return
 
-    has_more = delete_events(relation={'project_id': p.id}, logger=logger)
-    if has_more:
-        if continuous:
-            delete_project.delay(object_id=object_id, countdown=15)
-        return
-
-    # Release needs to handle deletes after Group is cleaned up as the foreign
-    # key is protected
-    model_list = (Group, ReleaseFile, Release)
-    for model in model_list:
-        has_more = bulk_delete_objects(model, project_id=p.id, logger=logger)
-        if has_more:
-            if continuous:
-                delete_project.delay(object_id=object_id, countdown=15)
-            return
-
     p.delete()
 
 
@@ -161,12 +123,8 @@ def delete_project(object_id, continuous=True, **kwargs):
                    default_retry_delay=60 * 5, max_retries=None)
 @retry(exclude=(DeleteAborted,))
 def delete_group(object_id, continuous=True, **kwargs):
-    from sentry.models import (
-        EventMapping, Group, GroupAssignee, GroupBookmark, GroupHash, GroupMeta,
-        GroupRelease, GroupResolution, GroupRuleStatus, GroupSnooze,
-        GroupSubscription, GroupStatus, GroupTagKey, GroupTagValue,
-        GroupEmailThread, GroupRedirect, UserReport
-    )
+    from sentry.app import search
+    from sentry.models import Group, GroupHash, GroupStatus
 
     try:
         group = Group.objects.get(id=object_id)
@@ -176,25 +134,15 @@ def delete_group(object_id, continuous=True, **kwargs):
     if group.status != GroupStatus.DELETION_IN_PROGRESS:
         group.update(status=GroupStatus.DELETION_IN_PROGRESS)
 
-    bulk_model_list = (
-        # prioritize GroupHash
-        GroupHash, GroupAssignee, GroupBookmark, GroupMeta, GroupRelease,
-        GroupResolution, GroupRuleStatus, GroupSnooze, GroupTagValue,
-        GroupTagKey, EventMapping, GroupEmailThread, UserReport, GroupRedirect,
-        GroupSubscription,
-    )
-    for model in bulk_model_list:
-        has_more = bulk_delete_objects(model, group_id=object_id, logger=logger)
-        if has_more:
-            if continuous:
-                delete_group.delay(object_id=object_id, countdown=15)
-            return
+    GroupHash.objects.clear_group_ids_for_group(group.id)
 
-    has_more = delete_events(relation={'group_id': object_id}, logger=logger)
+    plan = DeletionPlan(Group, group.id, priority=(GroupHash,))
+    has_more = plan.execute(limit=100000, logger=logger)
     if has_more:
         if continuous:
             delete_group.delay(object_id=object_id, countdown=15)
         return
+    safe_execute(search.remove_group, group, _with_transaction=False)
     group.delete()
 
 
@@ -233,30 +181,7 @@ def delete_tag_key(object_id, continuous=True, **kwargs):
         return
 
     tagkey.delete()
-
-
-def delete_events(relation, limit=100, logger=None):
-    from sentry.app import nodestore
-    from sentry.models import Event, EventTag
-
-    has_more = False
-    if logger is not None:
-        logger.info('remove.event', extra=relation)
-
-    result_set = list(Event.objects.filter(**relation)[:limit])
-    has_more = bool(result_set)
-    if has_more:
-        # delete objects from nodestore first
-        node_ids = set(r.data.id for r in result_set if r.data.id)
-        if node_ids:
-            nodestore.delete_multi(node_ids)
-
-        event_ids = [r.id for r in result_set]
-
-        # bulk delete by id
-        EventTag.objects.filter(event_id__in=event_ids).delete()
-        Event.objects.filter(id__in=event_ids).delete()
-    return has_more
+    TagKey.objects.clear_id_cache(tagkey.project_id, tagkey.key)
 
 
 def delete_objects(models, relation, limit=100, logger=None):
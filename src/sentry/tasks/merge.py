@@ -10,11 +10,14 @@ from __future__ import absolute_import
 
 import logging
 
-from django.db import DataError, IntegrityError, router, transaction
+from django.db import DataError, IntegrityError, transaction
 from django.db.models import F
 
+from sentry.db.merge import BulkMergeQuery
 from sentry.tasks.base import instrumented_task, retry
 from sentry.tasks.deletion import delete_group
+from sentry.utils import metrics
+from sentry.utils.safe import safe_execute
 
 # TODO(dcramer): probably should have a new logger for this, but it removes data
 # so lets bundle under deletions
@@ -26,10 +29,11 @@ logger = logging.getLogger('sentry.deletions')
 @retry
 def merge_group(from_object_id=None, to_object_id=None, **kwargs):
     # TODO(mattrobenolt): Write tests for all of this
+    from sentry.app import search
     from sentry.models import (
         Activity, Group, GroupAssignee, GroupHash, GroupRuleStatus,
-        GroupSubscription, GroupTagKey, GroupTagValue, EventMapping, Event,
-        UserReport, GroupRedirect, GroupMeta,
+        GroupStatus, GroupSubscription, GroupTagKey, GroupTagValue,
+        EventMapping, Event, UserReport, GroupRedirect, GroupMeta,
     )
 
     if not (from_object_id and to_object_id):
@@ -48,14 +52,43 @@ def merge_group(from_object_id=None, to_object_id=None, **kwargs):
         logger.warn('merge_group called with invalid to_object_id: %s', to_object_id)
         return
 
+    # new events should not be added to the group while it's being merged
+    # (nor cache its hashes again, see ``EventManager._save_aggregate``)
+    if group.status != GroupStatus.PENDING_MERGE:
+        group.update(status=GroupStatus.PENDING_MERGE)
+    hashes_by_project = GroupHash.objects.clear_group_ids_for_group(group.id)
+
+    # how the rows of every model are merged, see ``BulkMergeQuery``
     model_list = (
-        Activity, GroupAssignee, GroupHash, GroupRuleStatus, GroupSubscription,
-        GroupTagValue, GroupTagKey, EventMapping, Event, UserReport,
-        GroupRedirect, GroupMeta,
+        (Activity, {}),
+        (GroupAssignee, {'unique_fields': ()}),
+        (GroupHash, {}),
+        (GroupRuleStatus, {'unique_fields': ('rule',)}),
+        (GroupSubscription, {'unique_fields': ('user',)}),
+        (GroupTagValue, {
+            'unique_fields': ('key', 'value'),
+            'sum_fields': ('times_seen',),
+            'min_fields': ('first_seen',),
+            'max_fields': ('last_seen',),
+        }),
+        (GroupTagKey, {
+            'unique_fields': ('project', 'key'),
+            'sum_fields': ('values_seen',),
+        }),
+        (EventMapping, {}),
+        (Event, {}),
+        (UserReport, {}),
+        (GroupRedirect, {}),
+        (GroupMeta, {'unique_fields': ('key',)}),
     )
 
     has_more = merge_objects(model_list, group, new_group, logger=logger)
 
+    # events which were saved before the hashes were moved may have cached
+    # the group again
+    for project_id, hashes in hashes_by_project.iteritems():
+        GroupHash.objects.clear_group_ids(project_id, hashes)
+
     if has_more:
         merge_group.delay(
             from_object_id=from_object_id,
@@ -65,6 +98,9 @@ def merge_group(from_object_id=None, to_object_id=None, **kwargs):
 
     previous_group_id = group.id
 
+    # the hashes of the group belong to the new group by now
+    GroupHash.objects.clear_group_ids_for_group(new_group.id)
+    safe_execute(search.merge_group, group, new_group, _with_transaction=False)
     group.delete()
 
     try:
@@ -102,6 +138,7 @@ def rehash_group_events(group_id, **kwargs):
     # Clear out existing hashes to preempt new events being added
     # This can cause the new groups to be created before we get to them, but
     # its a tradeoff we're willing to take
+    GroupHash.objects.clear_group_ids_for_group(group.id)
     GroupHash.objects.filter(group=group).delete()
 
     has_more = _rehash_group_events(group)
@@ -125,6 +162,7 @@ def _rehash_group_events(group, limit=100):
     event_list = list(Event.objects.filter(group_id=group.id)[:limit])
     Event.objects.bind_nodes(event_list, 'data')
 
+    events_by_group = {}
     for event in event_list:
         fingerprint = event.data.get('fingerprint', ['{{ default }}'])
         if fingerprint and not isinstance(fingerprint, (list, tuple)):
@@ -147,72 +185,42 @@ def _rehash_group_events(group, limit=100):
 
         # XXX(dcramer): doesnt support checksums as they're not stored
         hashes = map(md5_from_hash, get_hashes_from_fingerprint(event, fingerprint))
-        for hash in hashes:
-            new_group, _, _, _ = manager._save_aggregate(
-                event=event,
-                hashes=hashes,
-                release=None,
-                **group_kwargs
-            )
-            event.update(group_id=new_group.id)
-            if event.data.get('tags'):
-                Group.objects.add_tags(new_group, event.data['tags'])
+        new_group, _, _, _ = manager._save_aggregate(
+            event=event,
+            hashes=hashes,
+            release=None,
+            **group_kwargs
+        )
+        events_by_group.setdefault(new_group.id, []).append(event.id)
+        if event.data.get('tags'):
+            Group.objects.add_tags(new_group, event.data['tags'])
+
+    # the events are moved with a query per group (rather than per event)
+    for group_id, event_ids in events_by_group.iteritems():
+        Event.objects.filter(id__in=event_ids).update(group_id=group_id)
     return bool(event_list)
 
 
-def merge_objects(models, group, new_group, limit=1000,
+def merge_objects(models, group, new_group, chunk_size=1000, limit=50000,
                   logger=None):
-    from sentry.models import GroupTagKey, GroupTagValue
-
-    has_more = False
-    for model in models:
+    """
+    Merge the rows of ``models`` (a sequence of models and the options of
+    their ``BulkMergeQuery``) of ``group`` into ``new_group``.
+
+    Stops once ``limit`` rows were merged, returning whether rows are left
+    (so the caller continues in another task.)
+    """
+    for model, options in models:
+        query = BulkMergeQuery(model, group.id, new_group.id, **options)
+        merged, has_more = query.execute(chunk_size=chunk_size, limit=limit)
+        if merged:
+            metrics.incr('merge.rows', merged, instance=model.__name__)
         if logger is not None:
-            logger.info('Merging %r objects where %r into %r', model, group,
-                        new_group)
-        all_fields = model._meta.get_all_field_names()
-        has_group = 'group' in all_fields
-        if has_group:
-            queryset = model.objects.filter(group=group)
-        else:
-            queryset = model.objects.filter(group_id=group.id)
-        for obj in queryset[:limit]:
-            try:
-                with transaction.atomic(using=router.db_for_write(model)):
-                    if has_group:
-                        model.objects.filter(
-                            id=obj.id
-                        ).update(group=new_group)
-                    else:
-                        model.objects.filter(
-                            id=obj.id
-                        ).update(group_id=new_group.id)
-            except IntegrityError:
-                delete = True
-            else:
-                delete = False
-
-            if delete:
-                # Before deleting, we want to merge in counts
-                try:
-                    if model == GroupTagKey:
-                        with transaction.atomic(using=router.db_for_write(model)):
-                            model.objects.filter(
-                                group=new_group,
-                                key=obj.key,
-                            ).update(values_seen=F('values_seen') + obj.values_seen)
-                    elif model == GroupTagValue:
-                        with transaction.atomic(using=router.db_for_write(model)):
-                            model.objects.filter(
-                                group=new_group,
-                                key=obj.key,
-                                value=obj.value,
-                            ).update(times_seen=F('times_seen') + obj.times_seen)
-                except DataError:
-                    # it's possible to hit an out of range value for counters
-                    pass
-                obj.delete()
-            has_more = True
-
+            logger.info('Merged %d %r objects where %r into %r%s', merged,
+                        model, group, new_group, ' (continuing)' if has_more else '')
         if has_more:
             return True
-    return has_more
+        limit -= merged
+        if limit <= 0:
+            return True
+    return False
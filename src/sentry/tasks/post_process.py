@@ -17,6 +17,7 @@ from sentry.plugins import plugins
 from sentry.signals import event_processed
 from sentry.tasks.base import instrumented_task
 from sentry.utils import metrics
+from sentry.utils.ingest import stage
 from sentry.utils.safe import safe_execute
 
 logger = logging.getLogger('sentry')
@@ -66,30 +67,31 @@ def post_process_group(event, is_new, is_regression, is_sample, **kwargs):
     # which may contain a stale Project.
     event.project = Project.objects.get_from_cache(id=project_id)
 
-    _capture_stats(event, is_new)
-
-    rp = RuleProcessor(event, is_new, is_regression, is_sample)
-    # TODO(dcramer): ideally this would fanout, but serializing giant
-    # objects back and forth isn't super efficient
-    for callback, futures in rp.apply():
-        safe_execute(callback, event, futures)
-
-    for plugin in plugins.for_project(event.project):
-        plugin_post_process_group(
-            plugin_slug=plugin.slug,
+    with stage('post_process'):
+        _capture_stats(event, is_new)
+
+        rp = RuleProcessor(event, is_new, is_regression, is_sample)
+        # TODO(dcramer): ideally this would fanout, but serializing giant
+        # objects back and forth isn't super efficient
+        for callback, futures in rp.apply():
+            safe_execute(callback, event, futures)
+
+        for plugin in plugins.for_project(event.project):
+            plugin_post_process_group(
+                plugin_slug=plugin.slug,
+                event=event,
+                is_new=is_new,
+                is_regresion=is_regression,
+                is_sample=is_sample,
+            )
+
+        event_processed.send_robust(
+            sender=post_process_group,
+            project=event.project,
+            group=event.group,
             event=event,
-            is_new=is_new,
-            is_regresion=is_regression,
-            is_sample=is_sample,
         )
 
-    event_processed.send_robust(
-        sender=post_process_group,
-        project=event.project,
-        group=event.group,
-        event=event,
-    )
-
 
 def record_additional_tags(event):
     from sentry.models import Group
@@ -147,33 +149,72 @@ def record_affected_user(event, **kwargs):
     ])
 
 
+def index_tags(events):
+    """
+    Index the tags of many events at once. ``events`` is an iterable of
+    ``(project_id, event_id, group_id, tags)``.
+
+    The IDs of the tag keys and values of each project are looked up (and
+    the missing ones created) in bulk, and all ``EventTag`` rows are written
+    with a single insert.
+    """
+    from sentry.models import EventTag, TagKey, TagValue
+
+    events = list(events)
+
+    tags_by_project = {}
+    for project_id, _, _, tags in events:
+        tags_by_project.setdefault(project_id, set()).update(
+            (key, value) for key, value in tags
+        )
+
+    key_ids = {}
+    value_ids = {}
+    for project_id, tags in tags_by_project.iteritems():
+        project_key_ids = TagKey.objects.get_or_create_ids(
+            project_id, set(key for key, _ in tags))
+        project_value_ids = TagValue.objects.get_or_create_ids(
+            project_id, tags, project_key_ids)
+        for key, key_id in project_key_ids.iteritems():
+            key_ids[project_id, key] = key_id
+        for tag, value_id in project_value_ids.iteritems():
+            value_ids[project_id, tag] = value_id
+
+    rows = {}
+    for project_id, event_id, group_id, tags in events:
+        for key, value in tags:
+            ids = (event_id, key_ids[project_id, key], value_ids[project_id, (key, value)])
+            rows[ids] = EventTag(
+                project_id=project_id,
+                group_id=group_id,
+                event_id=ids[0],
+                key_id=ids[1],
+                value_id=ids[2],
+            )
+    if not rows:
+        return
+
+    try:
+        with transaction.atomic(using=router.db_for_write(EventTag)):
+            EventTag.objects.bulk_create(rows.values())
+    except IntegrityError:
+        # handle replaying of this task
+        for row in rows.itervalues():
+            try:
+                with transaction.atomic(using=router.db_for_write(EventTag)):
+                    row.save()
+            except IntegrityError:
+                pass
+
+
 @instrumented_task(
     name='sentry.tasks.index_event_tags',
     default_retry_delay=60 * 5, max_retries=None)
 def index_event_tags(project_id, event_id, tags, group_id=None, **kwargs):
-    from sentry.models import EventTag, Project, TagKey, TagValue
+    from sentry.app import search
 
-    for key, value in tags:
-        tagkey, _ = TagKey.objects.get_or_create(
-            project=Project(id=project_id),
-            key=key,
-        )
-
-        tagvalue, _ = TagValue.objects.get_or_create(
-            project=Project(id=project_id),
-            key=key,
-            value=value,
-        )
+    index_tags([(project_id, event_id, group_id, tags)])
 
-        try:
-            # handle replaying of this task
-            with transaction.atomic():
-                EventTag.objects.create(
-                    project_id=project_id,
-                    group_id=group_id,
-                    event_id=event_id,
-                    key_id=tagkey.id,
-                    value_id=tagvalue.id,
-                )
-        except IntegrityError:
-            pass
+    if group_id is not None:
+        safe_execute(search.index_tags, project_id, group_id, tags,
+                     _with_transaction=False)
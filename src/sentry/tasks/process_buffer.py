@@ -19,15 +19,24 @@ logger = logging.getLogger(__name__)
 
 @instrumented_task(
     name='sentry.tasks.process_buffer.process_pending')
-def process_pending():
+def process_pending(partition=None):
     """
     Process pending buffers.
     """
     from sentry import app
-    lock = app.locks.get('buffer:process_pending', duration=60)
+
+    if partition is None:
+        lock_key = 'buffer:process_pending'
+    else:
+        lock_key = 'buffer:process_pending:%s' % (partition,)
+
+    lock = app.locks.get(lock_key, duration=60)
     try:
         with lock.acquire():
-            app.buffer.process_pending()
+            if partition is None:
+                app.buffer.process_pending()
+            else:
+                app.buffer.process_pending(partition=partition)
     except UnableToAcquireLock as error:
         logger.warning('Failed to process pending buffers due to error: %s', error)
 
@@ -41,3 +50,14 @@ def process_incr(**kwargs):
     from sentry import app
 
     app.buffer.process(**kwargs)
+
+
+@instrumented_task(
+    name='sentry.tasks.process_buffer.process_incr_batch')
+def process_incr_batch(keys):
+    """
+    Processes many buffer events at once.
+    """
+    from sentry import app
+
+    app.buffer.process_batch(keys)
@@ -0,0 +1,17 @@
+"""
+sentry.tasks.search
+~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+from sentry.tasks.base import instrumented_task
+
+
+@instrumented_task(name='sentry.tasks.search.backfill_search_index', queue='search')
+def backfill_search_index(project_id, **kwargs):
+    from sentry.app import search
+
+    search.backfill(project_id)
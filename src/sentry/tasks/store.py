@@ -8,6 +8,7 @@ sentry.tasks.store
 
 from __future__ import absolute_import
 
+import inspect
 import logging
 
 from raven.contrib.django.models import client as Raven
@@ -16,11 +17,53 @@ from time import time
 from sentry.cache import default_cache
 from sentry.tasks.base import instrumented_task
 from sentry.utils import metrics
+from sentry.utils.codecs import decode_event, encode_event
+from sentry.utils.ingest import get_payload_tags, stage
+from sentry.utils.profile import sampled_profile
 from sentry.utils.safe import safe_execute
 
 logger = logging.getLogger('sentry')
 
 
+# whether the ``get_event_preprocessors`` of a plugin class accepts the event
+# (plugins written before it was passed don't)
+_accepts_data = {}
+
+
+def _preprocessors_accept_data(plugin):
+    cls = type(plugin)
+    accepts_data = _accepts_data.get(cls)
+    if accepts_data is None:
+        args, _, keywords, _ = inspect.getargspec(plugin.get_event_preprocessors)
+        accepts_data = _accepts_data[cls] = 'data' in args or keywords is not None
+    return accepts_data
+
+
+def get_event_preprocessors(data):
+    """
+    Return the preprocessors of all plugins which apply to an event.
+    """
+    from sentry.plugins import plugins
+
+    preprocessors = []
+    for plugin in plugins.all(version=2):
+        if _preprocessors_accept_data(plugin):
+            kwargs = {'data': data}
+        else:
+            kwargs = {}
+        preprocessors.extend(safe_execute(
+            plugin.get_event_preprocessors, _with_transaction=False, **kwargs
+        ) or ())
+    return preprocessors
+
+
+def _decode_event(data):
+    if not isinstance(data, basestring):
+        return decode_event(data)
+    with stage('decode', get_payload_tags(size=len(data))):
+        return decode_event(data)
+
+
 @instrumented_task(
     name='sentry.tasks.store.preprocess_event',
     queue='events',
@@ -28,10 +71,11 @@ logger = logging.getLogger('sentry')
     soft_time_limit=60,
 )
 def preprocess_event(cache_key=None, data=None, start_time=None, **kwargs):
-    from sentry.plugins import plugins
-
+    # payloads are encoded with ``sentry.utils.codecs``, but may also be
+    # plain dictionaries (i.e. when they were queued by an older version)
     if cache_key:
-        data = default_cache.get(cache_key)
+        data = default_cache.get(cache_key, raw=True)
+    data = _decode_event(data)
 
     if data is None:
         metrics.incr('events.failed', tags={'reason': 'cache', 'stage': 'pre'})
@@ -45,9 +89,8 @@ def preprocess_event(cache_key=None, data=None, start_time=None, **kwargs):
 
     # TODO(dcramer): ideally we would know if data changed by default
     has_changed = False
-    for plugin in plugins.all(version=2):
-        processors = safe_execute(plugin.get_event_preprocessors, _with_transaction=False)
-        for processor in (processors or ()):
+    with stage('preprocess', get_payload_tags(data)), sampled_profile('preprocess_event'):
+        for processor in get_event_preprocessors(data):
             result = safe_execute(processor, data)
             if result:
                 data = result
@@ -55,25 +98,31 @@ def preprocess_event(cache_key=None, data=None, start_time=None, **kwargs):
 
     assert data['project'] == project, 'Project cannot be mutated by preprocessor'
 
-    if has_changed and cache_key:
-        default_cache.set(cache_key, data, 3600)
-
     if cache_key:
+        if has_changed:
+            default_cache.set(cache_key, encode_event(data), 3600, raw=True)
         data = None
+    else:
+        data = encode_event(data)
     save_event.delay(cache_key=cache_key, data=data, start_time=start_time)
 
 
 @instrumented_task(
     name='sentry.tasks.store.save_event',
     queue='events')
-def save_event(cache_key=None, data=None, start_time=None, **kwargs):
+def save_event(cache_key=None, data=None, start_time=None, single_hop=False,
+               **kwargs):
     """
     Saves an event to the database.
+
+    ``single_hop`` is set for events which were queued to this task directly
+    (as they are not preprocessed), instead of through ``preprocess_event``.
     """
     from sentry.event_manager import EventManager
 
     if cache_key:
-        data = default_cache.get(cache_key)
+        data = default_cache.get(cache_key, raw=True)
+    data = _decode_event(data)
 
     if data is None:
         metrics.incr('events.failed', tags={'reason': 'cache', 'stage': 'post'})
@@ -86,9 +135,12 @@ def save_event(cache_key=None, data=None, start_time=None, **kwargs):
 
     try:
         manager = EventManager(data)
-        manager.save(project)
+        with sampled_profile('save_event'):
+            manager.save(project)
     finally:
         if cache_key:
             default_cache.delete(cache_key)
         if start_time:
-            metrics.timing('events.time-to-process', time() - start_time)
+            metrics.timing('events.time-to-process', time() - start_time, tags={
+                'path': 'single-hop' if single_hop else 'two-hop',
+            })
@@ -7,6 +7,8 @@ sentry.tsdb.base
 """
 from __future__ import absolute_import
 
+from datetime import timedelta
+
 from django.conf import settings
 from django.utils import timezone
 from enum import Enum
@@ -67,6 +69,46 @@ class TSDBModel(Enum):
     frequent_releases_by_groups = 407
 
 
+class TimeSeriesMatrix(object):
+    """
+    Dense counter values for a list of keys over a series of rollup epochs.
+
+    ``values`` holds one row per key (in the same order as ``keys``), and
+    each row holds one count per epoch (in the same order as ``series``), so
+    ``values[i][j]`` is the count for ``keys[i]`` at ``series[j]``.
+    """
+    __slots__ = ['keys', 'series', 'values', 'rollup', '_rows']
+
+    def __init__(self, keys, series, values, rollup):
+        self.keys = keys
+        self.series = series
+        self.values = values
+        self.rollup = rollup
+        self._rows = dict((key, idx) for idx, key in enumerate(keys))
+
+    def get(self, key):
+        return self.values[self._rows[key]]
+
+    def get_points(self, key):
+        return zip(self.series, self.get(key))
+
+    def to_points(self):
+        """
+        Returns the matrix in the format used by ``get_range``, a mapping of
+        key => [(timestamp, count), ...].
+        """
+        return dict(
+            (key, zip(self.series, row))
+            for key, row in zip(self.keys, self.values)
+        )
+
+    def sums(self):
+        return dict(
+            (key, sum(row))
+            for key, row in zip(self.keys, self.values)
+        )
+
+
 class BaseTSDB(object):
     models = TSDBModel
 
@@ -182,6 +224,51 @@ class BaseTSDB(object):
         """
         raise NotImplementedError
 
+    def get_range_epochs(self, start, end, rollup):
+        """
+        Returns the (ascending) rollup epochs which are covered by a
+        ``get_range`` query.
+        """
+        series = []
+        timestamp = end
+        while timestamp >= start:
+            series.append(self.normalize_to_epoch(timestamp, rollup))
+            timestamp = timestamp - timedelta(seconds=rollup)
+        series.reverse()
+        return series
+
+    def get_range_series(self, model, keys, start, end, rollup=None):
+        """
+        Fetch the same data as ``get_range``, returned as a
+        ``TimeSeriesMatrix`` which is indexed by (key, epoch).
+        """
+        return self.get_range_series_multi([
+            (model, keys, start, end, rollup),
+        ])[0]
+
+    def get_range_series_multi(self, queries):
+        """
+        Fetch the data for many ``get_range`` queries at once. Each query is
+        a ``(model, keys, start, end, rollup)`` tuple, and a
+        ``TimeSeriesMatrix`` is returned for each query (in the same order.)
+
+        Backends should override this to fetch all queries in as few
+        requests as possible.
+        """
+        results = []
+        for model, keys, start, end, rollup in queries:
+            if rollup is None:
+                rollup = self.get_optimal_rollup(start, end)
+            keys = list(keys)
+            series = self.get_range_epochs(start, end, rollup)
+            points = self.get_range(model, keys, start, end, rollup)
+            values = []
+            for key in keys:
+                counts = dict(points.get(key, ()))
+                values.append([counts.get(epoch, 0) for epoch in series])
+            results.append(TimeSeriesMatrix(keys, series, values, rollup))
+        return results
+
     def get_sums(self, model, keys, start, end, rollup=None):
         range_set = self.get_range(model, keys, start, end, rollup)
         sum_set = dict(
@@ -14,7 +14,6 @@ import random
 import uuid
 from binascii import crc32
 from collections import defaultdict, namedtuple
-from datetime import timedelta
 from hashlib import md5
 
 import six
@@ -22,7 +21,7 @@ from django.utils import timezone
 from pkg_resources import resource_string
 from redis.client import Script
 
-from sentry.tsdb.base import BaseTSDB
+from sentry.tsdb.base import BaseTSDB, TimeSeriesMatrix
 from sentry.utils.dates import to_timestamp
 from sentry.utils.redis import check_cluster_versions, get_cluster_from_options
 from sentry.utils.versioning import Version
@@ -183,35 +182,59 @@ class RedisTSDB(BaseTSDB):
         >>>          start=now - timedelta(days=1),
         >>>          end=now)
         """
-        normalize_to_epoch = self.normalize_to_epoch
-        normalize_to_rollup = self.normalize_to_rollup
-        make_key = self.make_counter_key
+        return self.get_range_series(model, keys, start, end, rollup).to_points()
 
-        if rollup is None:
-            rollup = self.get_optimal_rollup(start, end)
+    def get_sums(self, model, keys, start, end, rollup=None):
+        return self.get_range_series(model, keys, start, end, rollup).sums()
 
-        results = []
-        timestamp = end
+    def get_range_series_multi(self, queries):
+        """
+        Fetch the data for many ``get_range`` queries at once.
+
+        Counters for keys which share a hash (the same model, epoch and
+        vnode) are fetched together with a single ``HMGET``, and all queries
+        are executed in one pipeline per host.
+        """
+        make_key = self.make_counter_key
+        normalize_ts_to_rollup = self.normalize_ts_to_rollup
+
+        requests = []
         with self.cluster.map() as client:
-            while timestamp >= start:
-                real_epoch = normalize_to_epoch(timestamp, rollup)
-                norm_epoch = normalize_to_rollup(timestamp, rollup)
+            for model, keys, start, end, rollup in queries:
+                if rollup is None:
+                    rollup = self.get_optimal_rollup(start, end)
 
-                for key in keys:
-                    model_key = self.get_model_key(key)
-                    hash_key = make_key(model, norm_epoch, model_key)
-                    results.append((real_epoch, key,
-                                    client.hget(hash_key, model_key)))
+                keys = list(keys)
+                series = self.get_range_epochs(start, end, rollup)
+                model_keys = [self.get_model_key(key) for key in keys]
+
+                fetches = []
+                for column, epoch in enumerate(series):
+                    norm_epoch = normalize_ts_to_rollup(epoch, rollup)
 
-                timestamp = timestamp - timedelta(seconds=rollup)
+                    fields_by_hash = defaultdict(list)
+                    for row, model_key in enumerate(model_keys):
+                        hash_key = make_key(model, norm_epoch, model_key)
+                        fields_by_hash[hash_key].append((row, model_key))
 
-        results_by_key = defaultdict(dict)
-        for epoch, key, count in results:
-            results_by_key[key][epoch] = int(count.value or 0)
+                    for hash_key, fields in fields_by_hash.iteritems():
+                        fetches.append((
+                            column,
+                            [row for row, _ in fields],
+                            client.hmget(hash_key, [model_key for _, model_key in fields]),
+                        ))
 
-        for key, points in results_by_key.iteritems():
-            results_by_key[key] = sorted(points.items())
-        return dict(results_by_key)
+                requests.append((keys, series, rollup, fetches))
+
+        results = []
+        for keys, series, rollup, fetches in requests:
+            values = [[0] * len(series) for _ in keys]
+            for column, rows, counts in fetches:
+                for row, count in zip(rows, counts.value):
+                    if count is not None:
+                        values[row][column] = int(count)
+            results.append(TimeSeriesMatrix(keys, series, values, rollup))
+        return results
 
     def record(self, model, key, values, timestamp=None):
         self.record_multi(((model, key, values),), timestamp)
@@ -0,0 +1,555 @@
+"""
+sentry.tsdb.ringbuffer
+~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import fcntl
+import math
+import mmap
+import os
+import struct
+import threading
+
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from hashlib import md5
+
+from django.utils import timezone
+
+from sentry.exceptions import InvalidConfiguration
+from sentry.tsdb.base import BaseTSDB, TimeSeriesMatrix
+from sentry.utils import json
+
+# Each cell starts with the rollup epoch number it currently holds, which is
+# how stale cells (from a previous trip around the ring) are identified.
+EPOCH = struct.Struct('<q')
+COUNTER_CELL = struct.Struct('<qq')
+FREQUENCY_ENTRY = struct.Struct('<qd')
+
+
+@contextmanager
+def file_lock(fileobj):
+    fcntl.flock(fileobj.fileno(), fcntl.LOCK_EX)
+    try:
+        yield
+    finally:
+        fcntl.flock(fileobj.fileno(), fcntl.LOCK_UN)
+
+
+class KeyIndex(object):
+    """
+    A persistent, append-only mapping of keys to row numbers.
+
+    Keys are stored as one JSON value per line, and the row number of a key
+    is the line it was written on. The index can be safely shared between
+    processes: new keys are appended while holding an exclusive lock, after
+    picking up any keys that were appended by other processes.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.rows = {}
+        self._fp = open(path, 'a+')
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        self._fp.seek(self._offset)
+        for line in self._fp:
+            if not line.endswith('\n'):
+                # partially written line, pick it up on the next refresh
+                break
+            self.rows[json.loads(line)] = len(self.rows)
+            self._offset += len(line)
+
+    def get(self, key):
+        row = self.rows.get(key)
+        if row is None:
+            with self._lock:
+                self._refresh()
+            row = self.rows.get(key)
+        return row
+
+    def get_or_create(self, key):
+        row = self.rows.get(key)
+        if row is not None:
+            return row
+
+        with self._lock, file_lock(self._fp):
+            self._refresh()
+            row = self.rows.get(key)
+            if row is None:
+                line = json.dumps(key) + '\n'
+                self._fp.seek(0, os.SEEK_END)
+                self._fp.write(line)
+                self._fp.flush()
+                self._offset += len(line)
+                row = self.rows[key] = len(self.rows)
+        return row
+
+    def get_key(self, row):
+        # Reverse lookups are rare (only for frequency table members), so the
+        # reverse mapping is built lazily.
+        reverse = getattr(self, '_reverse', None)
+        if reverse is None or len(reverse) != len(self.rows):
+            with self._lock:
+                self._refresh()
+            reverse = self._reverse = dict((v, k) for k, v in self.rows.iteritems())
+        return reverse[row]
+
+
+class RingBufferFile(object):
+    """
+    A memory-mapped file of fixed-size rows.
+
+    Every row holds ``samples`` cells of ``cell_size`` bytes, and every cell
+    holds the data for a single rollup epoch (indexed by ``epoch % samples``.)
+    The file is grown (and remapped) in chunks as new rows are needed.
+    """
+    grow_rows = 1024
+
+    def __init__(self, path, samples, cell_size):
+        self.path = path
+        self.samples = samples
+        self.cell_size = cell_size
+        self.row_size = samples * cell_size
+        self._fp = open(path, 'a+b')
+        self._map = None
+        self._size = 0
+        self._lock = threading.Lock()
+        self._remap()
+
+    def _remap(self):
+        size = os.fstat(self._fp.fileno()).st_size
+        if size == self._size:
+            return
+        # The previous map is not closed, as readers (which don't hold the
+        # lock) may still be using it. It's unmapped once it's collected.
+        self._map = mmap.mmap(self._fp.fileno(), size) if size else None
+        self._size = size
+
+    def _ensure_row(self, row):
+        end = (row + 1) * self.row_size
+        if end <= self._size:
+            return
+        # another process may have already grown the file
+        self._remap()
+        if end <= self._size:
+            return
+        # sparse files mean rows don't use disk space until they're written
+        rows = (row // self.grow_rows + 1) * self.grow_rows
+        self._fp.truncate(rows * self.row_size)
+        self._remap()
+
+    def offset(self, row, epoch):
+        return row * self.row_size + (epoch % self.samples) * self.cell_size
+
+    @contextmanager
+    def writer(self):
+        """
+        Hold an exclusive lock for a series of read-modify-write operations.
+        """
+        with self._lock, file_lock(self._fp):
+            yield self
+
+    def buffer(self, row):
+        """
+        Returns the memory map (which is valid for ``row``) to read from.
+        Reading a row which has never been written returns ``None``.
+        """
+        if (row + 1) * self.row_size > self._size:
+            with self._lock:
+                self._remap()
+            if (row + 1) * self.row_size > self._size:
+                return None
+        return self._map
+
+    def writable(self, row):
+        self._ensure_row(row)
+        return self._map
+
+
+class HyperLogLog(object):
+    """
+    Helpers for HyperLogLog registers stored as ``bytearray`` values.
+    """
+    def __init__(self, precision):
+        self.precision = precision
+        self.size = 1 << precision
+        if self.size >= 128:
+            alpha = 0.7213 / (1 + 1.079 / self.size)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[self.size]
+        self.alpha = alpha
+
+    def hash(self, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        value = struct.unpack('<Q', md5(str(value)).digest()[:8])[0]
+        index = value >> (64 - self.precision)
+        remainder = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        return index, rank
+
+    def merge(self, registers, other):
+        for i, value in enumerate(other):
+            if value > registers[i]:
+                registers[i] = value
+
+    def estimate(self, registers):
+        m = self.size
+        estimate = self.alpha * m * m / sum(2.0 ** -r for r in registers)
+        zeros = sum(1 for r in registers if not r)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(float(m) / zeros)
+        return int(round(estimate))
+
+
+class RingBufferTSDB(BaseTSDB):
+    """
+    A single node time series storage backend which keeps every counter in
+    fixed-size ring buffers stored in memory-mapped files.
+
+    Each model and rollup (as defined by ``SENTRY_TSDB_ROLLUPS``) is stored
+    in a separate file, containing one row per key with a cell for each of
+    the samples that the rollup retains. Cells are tagged with the epoch
+    they belong to, so expired data is overwritten (rather than deleted) as
+    the ring wraps around, and the files never grow beyond one row per key.
+
+    * Simple counters use 16 bytes per sample.
+    * Distinct counters are HyperLogLog estimates using ``2 **
+      hll_precision`` registers per sample.
+    * Frequency tables keep (approximately) the ``frequency_capacity`` most
+      frequent members per sample.
+
+    The files in ``path`` may be shared by all Sentry processes on the same
+    host, but not across hosts.
+    """
+    def __init__(self, path, hll_precision=10, frequency_capacity=50, **options):
+        self.path = path
+        self.hll = HyperLogLog(hll_precision)
+        self.frequency_capacity = frequency_capacity
+        self._files = {}
+        self._indexes = {}
+        self._lock = threading.Lock()
+        super(RingBufferTSDB, self).__init__(**options)
+
+    def validate(self):
+        if not os.path.isdir(self.path):
+            try:
+                os.makedirs(self.path)
+            except OSError as e:
+                raise InvalidConfiguration(unicode(e))
+        if not os.access(self.path, os.W_OK):
+            raise InvalidConfiguration('TSDB path is not writable: %s' % (self.path,))
+
+    def _get_index(self, name, model):
+        key = (name, model)
+        index = self._indexes.get(key)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(key)
+                if index is None:
+                    index = self._indexes[key] = KeyIndex(os.path.join(
+                        self.path, '{}-{}.idx'.format(name, model.value),
+                    ))
+        return index
+
+    def _get_file(self, kind, model, rollup, cell_size):
+        key = (kind, model, rollup)
+        f = self._files.get(key)
+        if f is None:
+            with self._lock:
+                f = self._files.get(key)
+                if f is None:
+                    samples = dict(self.rollups)[rollup]
+                    f = self._files[key] = RingBufferFile(os.path.join(
+                        self.path, '{}-{}-{}.dat'.format(kind, model.value, rollup),
+                    ), samples, cell_size)
+        return f
+
+    def _get_series(self, start, end, rollup):
+        if rollup is None:
+            rollup = self.get_optimal_rollup(start, end)
+        return rollup, [
+            (epoch, self.normalize_ts_to_rollup(epoch, rollup))
+            for epoch in self.get_range_epochs(start, end, rollup)
+        ]
+
+    # Simple counters
+
+    def incr(self, model, key, timestamp=None, count=1):
+        self.incr_multi([(model, key)], timestamp, count)
+
+    def incr_multi(self, items, timestamp=None, count=1):
+        if timestamp is None:
+            timestamp = timezone.now()
+
+        items_by_model = defaultdict(list)
+        for model, key in items:
+            items_by_model[model].append(key)
+
+        for model, keys in items_by_model.iteritems():
+            index = self._get_index('keys', model)
+            rows = [index.get_or_create(key) for key in keys]
+            for rollup, _ in self.rollups:
+                norm_epoch = self.normalize_to_rollup(timestamp, rollup)
+                f = self._get_file('counters', model, rollup, COUNTER_CELL.size)
+                with f.writer():
+                    for row in rows:
+                        buf = f.writable(row)
+                        offset = f.offset(row, norm_epoch)
+                        epoch, value = COUNTER_CELL.unpack_from(buf, offset)
+                        if epoch != norm_epoch:
+                            value = 0
+                        COUNTER_CELL.pack_into(buf, offset, norm_epoch, value + count)
+
+    def get_range(self, model, keys, start, end, rollup=None):
+        return self.get_range_series(model, keys, start, end, rollup).to_points()
+
+    def get_sums(self, model, keys, start, end, rollup=None):
+        return self.get_range_series(model, keys, start, end, rollup).sums()
+
+    def get_range_series_multi(self, queries):
+        results = []
+        for model, keys, start, end, rollup in queries:
+            keys = list(keys)
+            rollup, series = self._get_series(start, end, rollup)
+            index = self._get_index('keys', model)
+            f = self._get_file('counters', model, rollup, COUNTER_CELL.size)
+            row_format = struct.Struct('<%dq' % (f.samples * 2))
+
+            values = []
+            for key in keys:
+                row = index.get(key)
+                buf = f.buffer(row) if row is not None else None
+                if buf is None:
+                    values.append([0] * len(series))
+                    continue
+                # read the entire ring at once, then pick out the cells
+                cells = row_format.unpack_from(buf, row * f.row_size)
+                counts = []
+                for _, norm_epoch in series:
+                    i = (norm_epoch % f.samples) * 2
+                    counts.append(cells[i + 1] if cells[i] == norm_epoch else 0)
+                values.append(counts)
+
+            results.append(TimeSeriesMatrix(
+                keys, [epoch for epoch, _ in series], values, rollup,
+            ))
+        return results
+
+    # Distinct counters
+
+    def record(self, model, key, values, timestamp=None):
+        self.record_multi(((model, key, values),), timestamp)
+
+    def record_multi(self, items, timestamp=None):
+        if timestamp is None:
+            timestamp = timezone.now()
+
+        cell_size = EPOCH.size + self.hll.size
+        for model, key, values in items:
+            row = self._get_index('keys', model).get_or_create(key)
+            hashes = [self.hll.hash(value) for value in values]
+            for rollup, _ in self.rollups:
+                norm_epoch = self.normalize_to_rollup(timestamp, rollup)
+                f = self._get_file('distinct', model, rollup, cell_size)
+                with f.writer():
+                    buf = f.writable(row)
+                    offset = f.offset(row, norm_epoch)
+                    if EPOCH.unpack_from(buf, offset)[0] != norm_epoch:
+                        EPOCH.pack_into(buf, offset, norm_epoch)
+                        buf[offset + EPOCH.size:offset + cell_size] = '\x00' * self.hll.size
+                    for i, rank in hashes:
+                        position = offset + EPOCH.size + i
+                        if ord(buf[position]) < rank:
+                            buf[position] = chr(rank)
+
+    def _get_registers(self, model, key, rollup, norm_epoch):
+        row = self._get_index('keys', model).get(key)
+        if row is None:
+            return None
+        f = self._get_file('distinct', model, rollup, EPOCH.size + self.hll.size)
+        buf = f.buffer(row)
+        if buf is None:
+            return None
+        offset = f.offset(row, norm_epoch)
+        if EPOCH.unpack_from(buf, offset)[0] != norm_epoch:
+            return None
+        return bytearray(buf[offset + EPOCH.size:offset + f.cell_size])
+
+    def _merge_registers(self, model, keys, rollup, series):
+        registers = bytearray(self.hll.size)
+        for key in keys:
+            for _, norm_epoch in series:
+                other = self._get_registers(model, key, rollup, norm_epoch)
+                if other is not None:
+                    self.hll.merge(registers, other)
+        return registers
+
+    def get_distinct_counts_series(self, model, keys, start, end=None, rollup=None):
+        if end is None:
+            end = timezone.now()
+        rollup, series = self._get_series(start, end, rollup)
+
+        results = {}
+        for key in keys:
+            counts = results[key] = []
+            for epoch, norm_epoch in series:
+                registers = self._get_registers(model, key, rollup, norm_epoch)
+                counts.append((
+                    epoch,
+                    self.hll.estimate(registers) if registers is not None else 0,
+                ))
+        return results
+
+    def get_distinct_counts_totals(self, model, keys, start, end=None, rollup=None):
+        if end is None:
+            end = timezone.now()
+        rollup, series = self._get_series(start, end, rollup)
+
+        return dict(
+            (key, self.hll.estimate(self._merge_registers(model, [key], rollup, series)))
+            for key in keys
+        )
+
+    def get_distinct_counts_union(self, model, keys, start, end=None, rollup=None):
+        if not keys:
+            return 0
+        if end is None:
+            end = timezone.now()
+        rollup, series = self._get_series(start, end, rollup)
+
+        return self.hll.estimate(self._merge_registers(model, keys, rollup, series))
+
+    # Frequency tables
+
+    def record_frequency_multi(self, requests, timestamp=None):
+        if timestamp is None:
+            timestamp = timezone.now()
+
+        capacity = self.frequency_capacity
+        cell_size = EPOCH.size + FREQUENCY_ENTRY.size * capacity
+        for model, request in requests:
+            keys = self._get_index('keys', model)
+            members = self._get_index('members', model)
+            for key, items in request.iteritems():
+                row = keys.get_or_create(key)
+                items = [
+                    (members.get_or_create(member) + 1, float(score))
+                    for member, score in items.iteritems()
+                ]
+                for rollup, _ in self.rollups:
+                    norm_epoch = self.normalize_to_rollup(timestamp, rollup)
+                    f = self._get_file('frequency', model, rollup, cell_size)
+                    with f.writer():
+                        buf = f.writable(row)
+                        offset = f.offset(row, norm_epoch)
+                        if EPOCH.unpack_from(buf, offset)[0] != norm_epoch:
+                            EPOCH.pack_into(buf, offset, norm_epoch)
+                            buf[offset + EPOCH.size:offset + cell_size] = '\x00' * (cell_size - EPOCH.size)
+                        self._update_frequency_cell(buf, offset + EPOCH.size, items)
+
+    def _update_frequency_cell(self, buf, offset, items):
+        # This implements the "space saving" algorithm: when the table is
+        # full, the member with the lowest score is replaced by the new member
+        # (which inherits its score), which keeps frequent members accurate.
+        entries = [
+            list(FREQUENCY_ENTRY.unpack_from(buf, offset + i * FREQUENCY_ENTRY.size))
+            for i in xrange(self.frequency_capacity)
+        ]
+        positions = dict((member, i) for i, (member, _) in enumerate(entries) if member)
+        for member, score in items:
+            i = positions.get(member)
+            if i is None:
+                # prefer an empty slot, otherwise the lowest score
+                i = min(
+                    xrange(len(entries)),
+                    key=lambda idx: (entries[idx][0] != 0, entries[idx][1]),
+                )
+                if entries[i][0]:
+                    del positions[entries[i][0]]
+                entries[i][0] = member
+                positions[member] = i
+            entries[i][1] += score
+        for i, (member, score) in enumerate(entries):
+            FREQUENCY_ENTRY.pack_into(buf, offset + i * FREQUENCY_ENTRY.size, member, score)
+
+    def _get_frequencies(self, model, key, rollup, norm_epoch):
+        result = Counter()
+        row = self._get_index('keys', model).get(key)
+        if row is None:
+            return result
+        capacity = self.frequency_capacity
+        f = self._get_file('frequency', model, rollup, EPOCH.size + FREQUENCY_ENTRY.size * capacity)
+        buf = f.buffer(row)
+        if buf is None:
+            return result
+        offset = f.offset(row, norm_epoch)
+        if EPOCH.unpack_from(buf, offset)[0] != norm_epoch:
+            return result
+        members = self._get_index('members', model)
+        for i in xrange(capacity):
+            member, score = FREQUENCY_ENTRY.unpack_from(
+                buf, offset + EPOCH.size + i * FREQUENCY_ENTRY.size)
+            if member:
+                result[members.get_key(member - 1)] = score
+        return result
+
+    def _most_common(self, scores, limit=None):
+        # Ties are broken by member in descending order, matching the
+        # ordering of ``ZREVRANGE`` used by the Redis backend.
+        items = sorted(scores.iteritems(), key=lambda item: (item[1], item[0]), reverse=True)
+        return items[:limit] if limit is not None else items
+
+    def get_most_frequent(self, model, keys, start, end=None, rollup=None, limit=None):
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+
+        results = {}
+        for key in keys:
+            result = Counter()
+            for timestamp in series:
+                result.update(self._get_frequencies(
+                    model, key, rollup, self.normalize_ts_to_rollup(timestamp, rollup)))
+            results[key] = self._most_common(result, limit)
+        return results
+
+    def get_most_frequent_series(self, model, keys, start, end=None, rollup=None, limit=None):
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+
+        results = {}
+        for key in keys:
+            result = results[key] = []
+            for timestamp in series:
+                scores = self._get_frequencies(
+                    model, key, rollup, self.normalize_ts_to_rollup(timestamp, rollup))
+                result.append((timestamp, dict(self._most_common(scores, limit))))
+        return results
+
+    def get_frequency_series(self, model, items, start, end=None, rollup=None):
+        rollup, series = self.get_optimal_rollup_series(start, end, rollup)
+
+        results = {}
+        for key, members in items.iteritems():
+            result = results[key] = []
+            for timestamp in series:
+                scores = self._get_frequencies(
+                    model, key, rollup, self.normalize_ts_to_rollup(timestamp, rollup))
+                result.append((
+                    timestamp,
+                    dict((member, scores.get(member, 0.0)) for member in members),
+                ))
+        return results
+
+    def get_frequency_totals(self, model, items, start, end=None, rollup=None):
+        results = {}
+        for key, series in self.get_frequency_series(model, items, start, end, rollup).iteritems():
+            result = results[key] = {}
+            for timestamp, scores in series:
+                for member, score in scores.iteritems():
+                    result[member] = result.get(member, 0.0) + score
+        return results
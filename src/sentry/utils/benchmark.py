@@ -0,0 +1,236 @@
+"""
+sentry.utils.benchmark
+~~~~~~~~~~~~~~~~~~~~~~
+
+Measures the throughput of event ingestion, by replaying sample and synthetic
+payloads through the stages events go through once they were received.
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import copy
+import sys
+import uuid
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import time
+
+from sentry.utils.samples import load_data
+
+SAMPLE_PLATFORMS = ('python', 'javascript', 'java', 'php', 'ruby', 'cocoa')
+
+STAGES = ('validate_data', 'normalize', 'save', 'post_process')
+
+
+def _make_large_stacktrace(frames=500):
+    data = load_data('python')
+    template = data['sentry.interfaces.Stacktrace']['frames'][0]
+    stacktrace = []
+    for idx in xrange(frames):
+        frame = dict(template)
+        frame['function'] = 'function_%d' % (idx,)
+        frame['lineno'] = idx
+        stacktrace.append(frame)
+    data['sentry.interfaces.Stacktrace']['frames'] = stacktrace
+    return data
+
+
+def _make_breadcrumbs(breadcrumbs=100):
+    data = load_data('python')
+    data['sentry.interfaces.Breadcrumbs'] = {
+        'values': [{
+            'timestamp': 1463400000 + idx,
+            'type': 'default',
+            'category': 'query',
+            'message': 'SELECT * FROM table WHERE id = %d' % (idx,),
+            'data': {'duration': idx},
+        } for idx in xrange(breadcrumbs)],
+    }
+    return data
+
+
+def _make_many_tags(tags=50):
+    data = load_data('python')
+    data['tags'] = [('tag_%d' % (idx,), 'value_%d' % (idx,)) for idx in xrange(tags)]
+    return data
+
+
+SYNTHETIC_PAYLOADS = OrderedDict((
+    ('large-stacktrace', _make_large_stacktrace),
+    ('breadcrumbs', _make_breadcrumbs),
+    ('many-tags', _make_many_tags),
+))
+
+
+def get_payloads(names=None):
+    """
+    Return a mapping of the names of payloads to the payloads: the sample
+    events of ``SAMPLE_PLATFORMS`` and the ``SYNTHETIC_PAYLOADS``.
+    """
+    if not names:
+        names = SAMPLE_PLATFORMS + tuple(SYNTHETIC_PAYLOADS)
+
+    payloads = OrderedDict()
+    for name in names:
+        if name in SYNTHETIC_PAYLOADS:
+            payloads[name] = SYNTHETIC_PAYLOADS[name]()
+        else:
+            data = load_data(name)
+            if data is None:
+                raise ValueError('Unknown payload: %r' % (name,))
+            payloads[name] = data
+    return payloads
+
+
+def percentile(values, p):
+    """
+    Return the ``p``th percentile of a sorted list (the nearest rank.)
+    """
+    if not values:
+        return None
+    idx = max(int(round(p / 100.0 * len(values))) - 1, 0)
+    return values[min(idx, len(values) - 1)]
+
+
+class StageStats(object):
+    def __init__(self):
+        self.durations = []
+
+    def add(self, duration):
+        self.durations.append(duration)
+
+    def summarize(self):
+        durations = sorted(self.durations)
+        total = sum(durations)
+        return {
+            'count': len(durations),
+            'throughput': len(durations) / total if total else None,
+            'p50': percentile(durations, 50),
+            'p90': percentile(durations, 90),
+            'p99': percentile(durations, 99),
+            'max': durations[-1] if durations else None,
+        }
+
+
+def _replace_references(old, new):
+    # Backends are bound to module level names when modules are imported
+    # (``from sentry.app import tsdb``), so every reference is replaced.
+    for module in sys.modules.values():
+        if module is None:
+            continue
+        for name, value in vars(module).items():
+            if value is old:
+                setattr(module, name, new)
+
+
+@contextmanager
+def local_backends():
+    """
+    Replace the time-series storage, buffer and counters with in-process
+    stand-ins, and run tasks which are queued in process, so a benchmark
+    does not depend on (or write to) external services.
+    """
+    from sentry import app
+    from sentry.buffer.base import Buffer
+    from sentry.celery import app as celery_app
+    from sentry.counters.base import Counters
+    from sentry.tsdb.inmemory import InMemoryTSDB
+
+    replacements = [
+        (app.tsdb, InMemoryTSDB()),
+        (app.buffer, Buffer()),
+        (app.counters, Counters()),
+    ]
+    always_eager = celery_app.conf.CELERY_ALWAYS_EAGER
+
+    for old, new in replacements:
+        _replace_references(old, new)
+    celery_app.conf.CELERY_ALWAYS_EAGER = True
+    try:
+        yield
+    finally:
+        celery_app.conf.CELERY_ALWAYS_EAGER = always_eager
+        for old, new in replacements:
+            _replace_references(new, old)
+
+
+class IngestBenchmark(object):
+    """
+    Replays payloads through ``ClientApiHelper.validate_data``,
+    ``EventManager.normalize``, ``EventManager.save`` and
+    ``post_process_group``, timing each stage.
+
+    Every iteration uses a copy of the payload with a new event ID, so all
+    of them are saved as new events (of the same group.)
+    """
+    def __init__(self, project, payloads):
+        self.project = project
+        self.payloads = payloads
+        self.stats = OrderedDict(
+            (name, OrderedDict((stage, StageStats()) for stage in STAGES))
+            for name in payloads
+        )
+        self.duration = 0
+        self.events = 0
+
+    def run_once(self, name):
+        from sentry.coreapi import ClientApiHelper
+        from sentry.event_manager import EventManager
+        from sentry.tasks.post_process import post_process_group
+
+        stats = self.stats[name]
+        data = copy.deepcopy(self.payloads[name])
+        data['event_id'] = uuid.uuid4().hex
+        data['timestamp'] = time()
+
+        helper = ClientApiHelper(project_id=self.project.id)
+
+        start = time()
+        data = helper.validate_data(self.project, data)
+        stats['validate_data'].add(time() - start)
+
+        start = time()
+        manager = EventManager(data)
+        data = manager.normalize()
+        stats['normalize'].add(time() - start)
+
+        start = time()
+        # raw events are not post processed, which is timed on its own
+        event = manager.save(self.project.id, raw=True)
+        stats['save'].add(time() - start)
+
+        start = time()
+        post_process_group(
+            event=event,
+            is_new=False,
+            is_regression=False,
+            is_sample=False,
+        )
+        stats['post_process'].add(time() - start)
+
+    def run(self, iterations=100):
+        start = time()
+        for _ in xrange(iterations):
+            for name in self.payloads:
+                self.run_once(name)
+        self.duration += time() - start
+        self.events += iterations * len(self.payloads)
+
+    def summarize(self):
+        """
+        Return the throughput of the benchmark (events per second) and the
+        summary of every stage, per payload.
+        """
+        return {
+            'throughput': self.events / self.duration if self.duration else None,
+            'payloads': OrderedDict(
+                (name, OrderedDict(
+                    (stage, stats.summarize())
+                    for stage, stats in stages.iteritems()
+                ))
+                for name, stages in self.stats.iteritems()
+            ),
+        }
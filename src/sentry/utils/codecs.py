@@ -0,0 +1,179 @@
+"""
+sentry.utils.codecs
+~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import zlib
+
+from sentry.utils import json
+
+__all__ = (
+    'EventCodec', 'EventDecodeError', 'encode_event', 'decode_event',
+    'decode_event_stream',
+)
+
+MAGIC = 'SE'
+
+# Strings which are common in event payloads (most common first.) They are
+# used as the preset dictionary of the compressor, so their occurrences in a
+# payload are encoded as (short) references into the dictionary. The table of
+# a version must never change: new strings can only be added by a new version
+# of the codec.
+INTERNED_STRINGS = {
+    1: (
+        # attributes
+        u'event_id', u'project', u'message', u'platform', u'culprit',
+        u'level', u'logger', u'server_name', u'site', u'release',
+        u'environment', u'timestamp', u'time_spent', u'received', u'tags',
+        u'extra', u'fingerprint', u'modules', u'errors', u'sdk', u'contexts',
+        u'checksum', u'type', u'metadata', u'version', u'name', u'id',
+        # interfaces
+        u'sentry.interfaces.Message', u'sentry.interfaces.Exception',
+        u'sentry.interfaces.Stacktrace', u'sentry.interfaces.Http',
+        u'sentry.interfaces.User', u'sentry.interfaces.Template',
+        u'sentry.interfaces.Breadcrumbs', u'sentry.interfaces.Csp',
+        u'sentry.interfaces.Query', u'sentry.interfaces.DebugMeta',
+        u'sentry.interfaces.AppleCrashReport', u'sentry.interfaces.Threads',
+        u'request', u'exception', u'stacktrace', u'user', u'breadcrumbs',
+        u'threads', u'template', u'query', u'csp',
+        # interface attributes
+        u'values', u'value', u'module', u'frames', u'frames_omitted',
+        u'filename', u'abs_path', u'function', u'lineno', u'colno', u'in_app',
+        u'context_line', u'pre_context', u'post_context', u'vars', u'package',
+        u'symbol_addr', u'instruction_addr', u'image_addr', u'mechanism',
+        u'thread_id', u'formatted', u'params', u'url', u'method', u'data',
+        u'query_string', u'cookies', u'headers', u'env', u'email',
+        u'username', u'ip_address', u'category', u'crashed', u'current',
+        # values
+        u'error', u'warning', u'info', u'debug', u'fatal', u'default',
+        u'python', u'javascript', u'java', u'cocoa', u'php', u'ruby', u'node',
+        u'csharp', u'go', u'elixir', u'perl', u'objc', u'other', u'<unknown>',
+    ),
+}
+
+CURRENT_VERSION = 1
+
+
+class EventDecodeError(ValueError):
+    pass
+
+
+def _make_dictionary(strings):
+    # Matches which are closer to the end of the dictionary are cheaper to
+    # encode, so the most common strings go last.
+    return ''.join(
+        '"%s": ' % (string.encode('utf-8'),)
+        for string in reversed(strings)
+    )
+
+
+class EventCodec(object):
+    """
+    A compact encoding of event payloads, which are passed between the web
+    and worker processes (through the cache and the task queue.)
+
+    Payloads start with ``MAGIC`` and the version of the codec they were
+    encoded with, followed by the zlib compressed JSON of the event. The
+    compressor is primed with the version's table of interned strings (i.e.
+    attribute and interface names), so even small payloads compress well.
+
+    Python 2 has no support for preset dictionaries, so the compressor and
+    decompressor are primed once by feeding the dictionary through them, and
+    copied for every payload.
+    """
+
+    def __init__(self, version=CURRENT_VERSION, level=1):
+        try:
+            dictionary = _make_dictionary(INTERNED_STRINGS[version])
+        except KeyError:
+            raise ValueError('Unsupported version %r' % (version,))
+        self.version = version
+        self.header = '%s%s' % (MAGIC, chr(version))
+
+        self._compressor = zlib.compressobj(level)
+        # the flush aligns the stream to a byte boundary, so the compressed
+        # dictionary can be cut off the payloads
+        primer = self._compressor.compress(dictionary)
+        primer += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self._decompressor = zlib.decompressobj()
+        self._decompressor.decompress(primer)
+
+    def encode(self, value):
+        compressor = self._compressor.copy()
+        body = compressor.compress(json.dumps(value)) + compressor.flush()
+        return self.header + body
+
+    def decode(self, value):
+        return self.decode_chunks([value])
+
+    def decode_stream(self, fp, chunk_size=64 * 1024):
+        """
+        Decode a payload from a file-like object, which is read and
+        decompressed in chunks.
+        """
+        return self.decode_chunks(iter(lambda: fp.read(chunk_size), ''))
+
+    def decode_chunks(self, chunks):
+        chunks = iter(chunks)
+        header = ''
+        for chunk in chunks:
+            header += chunk
+            if len(header) >= len(self.header):
+                break
+
+        if header[:len(self.header)] != self.header:
+            raise EventDecodeError('Not an encoded event (of version %d)' % (
+                self.version,))
+
+        decompressor = self._decompressor.copy()
+        try:
+            parts = [decompressor.decompress(header[len(self.header):])]
+            for chunk in chunks:
+                parts.append(decompressor.decompress(chunk))
+            # Once the end of the stream was reached, the decompressor leaves
+            # any further data alone, which is the only way to tell a
+            # truncated payload apart on Python 2.
+            decompressor.decompress('\x00')
+        except zlib.error as e:
+            raise EventDecodeError(unicode(e))
+        if not decompressor.unused_data:
+            raise EventDecodeError('Unexpected end of payload')
+        return json.loads(''.join(parts))
+
+
+_codecs = {}
+
+
+def get_codec(version=CURRENT_VERSION):
+    try:
+        return _codecs[version]
+    except KeyError:
+        codec = _codecs[version] = EventCodec(version)
+        return codec
+
+
+def encode_event(data):
+    return get_codec().encode(data)
+
+
+def decode_event(value):
+    """
+    Decode an event payload. Payloads which were queued before they were
+    encoded (plain dictionaries, or JSON) are passed through.
+    """
+    if value is None or isinstance(value, dict):
+        return value
+    if not value.startswith(MAGIC):
+        return json.loads(value)
+    version = ord(value[len(MAGIC)]) if len(value) > len(MAGIC) else None
+    if version not in INTERNED_STRINGS:
+        raise EventDecodeError('Unsupported version %r' % (version,))
+    return get_codec(version).decode(value)
+
+
+def decode_event_stream(fp):
+    return get_codec().decode_stream(fp)
@@ -11,6 +11,7 @@ import re
 import six
 
 from sentry.constants import DEFAULT_SCRUBBED_FIELDS, FILTER_MASK
+from sentry.utils.lru import LRUCache
 
 
 def varmap(func, var, context=None, name=None):
@@ -41,10 +42,31 @@ def varmap(func, var, context=None, name=None):
     return ret
 
 
+def compile_fields(fields):
+    """
+    Compile the scrubbed ``fields`` into a single pattern which matches any
+    string that contains one of them (ignoring the case of the string), or
+    ``None`` if there are no fields.
+    """
+    # Fields are matched against lowercased strings, so ones which contain
+    # uppercase characters can never match.
+    fields = sorted(f for f in fields if f == f.lower())
+    if not fields:
+        return None
+    return re.compile('|'.join(re.escape(f) for f in fields), re.I | re.U)
+
+
+# Compiled patterns by set of fields, shared by the filters of all projects
+# which have the same configuration.
+compiled_fields_cache = LRUCache(1000)
+
+
 class SensitiveDataFilter(object):
     """
     Asterisk out things that look like passwords, credit card numbers,
     and API keys in frames, http, and basic extra data.
+
+    Data is scrubbed in place, in a single pass over each value.
     """
     # http://www.richardsramblings.com/regex/credit-card-numbers/
     VALUES_RE = re.compile(r'\b(?:3[47]\d|(?:4\d|5[1-5]|65)\d{2}|6011)\d{12}\b')
@@ -59,6 +81,12 @@ class SensitiveDataFilter(object):
             fields += DEFAULT_SCRUBBED_FIELDS
         self.fields = set(fields)
 
+        key = frozenset(self.fields)
+        self.fields_re = compiled_fields_cache.get(key)
+        if self.fields_re is None and key:
+            self.fields_re = compile_fields(self.fields)
+            compiled_fields_cache.set(key, self.fields_re)
+
     def apply(self, data):
         # TODO(dcramer): move this into each interface
         if 'sentry.interfaces.Stacktrace' in data:
@@ -77,12 +105,14 @@ class SensitiveDataFilter(object):
             self.filter_http(data['sentry.interfaces.Http'])
 
         if 'extra' in data:
-            data['extra'] = varmap(self.sanitize, data['extra'])
+            data['extra'] = self.scrub(data['extra'])
 
     def sanitize(self, key, value):
         if value is None:
             return
 
+        fields_re = self.fields_re
+
         if isinstance(value, six.string_types):
             if self.VALUES_RE.search(value):
                 return FILTER_MASK
@@ -93,22 +123,48 @@ class SensitiveDataFilter(object):
             if '//' in value and '@' in value:
                 value = self.URL_PASSWORD_RE.sub(r'\1' + FILTER_MASK + '@', value)
 
-        if isinstance(key, six.string_types):
-            key = key.lower()
-        else:
-            key = ''
+            if fields_re is not None and fields_re.search(value):
+                # store mask as a fixed length for security
+                return FILTER_MASK
 
-        original_value = value
-        if isinstance(value, basestring):
-            value = value.lower()
+        if fields_re is not None and isinstance(key, six.string_types) and \
+                fields_re.search(key):
+            return FILTER_MASK
+        return value
+
+    def scrub(self, var, name=None, context=None):
+        """
+        Sanitize all values nested in ``var`` (like ``varmap(self.sanitize,
+        var)``), updating dicts and lists in place rather than copying them.
+        """
+        if not isinstance(var, (dict, list, tuple)):
+            return self.sanitize(name, var)
+
+        if context is None:
+            context = set()
+
+        objid = id(var)
+        if objid in context:
+            return self.sanitize(name, '<...>')
+        context.add(objid)
+
+        if isinstance(var, dict):
+            for k, v in six.iteritems(var):
+                var[k] = self.scrub(v, k, context)
+        elif all(isinstance(v, (list, tuple)) and len(v) == 2 for v in var):
+            # treat it like a mapping
+            if isinstance(var, tuple):
+                var = list(var)
+            for idx, (k, v) in enumerate(var):
+                var[idx] = [k, self.scrub(v, k, context)]
         else:
-            value = ''
+            if isinstance(var, tuple):
+                var = list(var)
+            for idx, v in enumerate(var):
+                var[idx] = self.scrub(v, name, context)
 
-        for field in self.fields:
-            if field in key or field in value:
-                # store mask as a fixed length for security
-                return FILTER_MASK
-        return original_value
+        context.remove(objid)
+        return var
 
     def filter_stacktrace(self, data):
         if 'frames' not in data:
@@ -116,7 +172,7 @@ class SensitiveDataFilter(object):
         for frame in data['frames']:
             if 'vars' not in frame:
                 continue
-            frame['vars'] = varmap(self.sanitize, frame['vars'])
+            frame['vars'] = self.scrub(frame['vars'])
 
     def filter_http(self, data):
         for n in ('data', 'cookies', 'headers', 'env', 'query_string'):
@@ -135,10 +191,10 @@ class SensitiveDataFilter(object):
 
                 data[n] = '&'.join('='.join(k) for k in querybits)
             else:
-                data[n] = varmap(self.sanitize, data[n])
+                data[n] = self.scrub(data[n])
 
     def filter_crumb(self, data):
         for key in 'data', 'message':
             val = data.get(key)
             if val:
-                data[key] = varmap(self.sanitize, val)
+                data[key] = self.scrub(val)
@@ -34,6 +34,19 @@ def is_sqlite(alias='default'):
     return 'sqlite' in engine
 
 
+def get_replication_lag(alias='default'):
+    """
+    Return the number of seconds a (Postgres) replica is behind its primary,
+    or ``None`` if that is unknown (i.e. the database is not a replica.)
+    """
+    if not is_postgres(alias):
+        return None
+    cursor = connections[alias].cursor()
+    cursor.execute('select extract(epoch from now() - pg_last_xact_replay_timestamp())')
+    lag = cursor.fetchone()[0]
+    return float(lag) if lag is not None else None
+
+
 def has_charts(db):
     if is_sqlite(db):
         return False
@@ -0,0 +1,75 @@
+"""
+sentry.utils.ingest
+~~~~~~~~~~~~~~~~~~~
+
+Timing of the stages events go through while they are ingested.
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+from contextlib import contextmanager
+
+from sentry.utils import metrics
+
+# Payload sizes and counts are reported as buckets (the upper bound of the
+# bucket they fall in), which keeps the cardinality of the tags low.
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 * 1024)
+COUNT_BUCKETS = (0, 10, 50, 100, 500)
+
+
+def _bucket(value, buckets):
+    for bucket in buckets:
+        if value <= bucket:
+            return str(bucket)
+    return 'more'
+
+
+def count_frames(data):
+    """
+    Return the number of stack frames in an event (of its stacktrace, and
+    the stacktraces of its exceptions and threads.)
+    """
+    stacktraces = [data.get('sentry.interfaces.Stacktrace')]
+    for path in ('sentry.interfaces.Exception', 'threads'):
+        container = data.get(path)
+        if isinstance(container, dict):
+            container = container.get('values')
+        if isinstance(container, list):
+            stacktraces.extend(
+                value.get('stacktrace') for value in container
+                if isinstance(value, dict)
+            )
+
+    frames = 0
+    for stacktrace in stacktraces:
+        if isinstance(stacktrace, dict):
+            frames += len(stacktrace.get('frames') or ())
+    return frames
+
+
+def get_payload_tags(data=None, size=None):
+    """
+    Return the metric tags which describe a payload: its (encoded) size, and
+    the number of frames and tags of the event.
+    """
+    tags = {}
+    if size is not None:
+        tags['size'] = _bucket(size, SIZE_BUCKETS)
+    if isinstance(data, dict):
+        tags['frames'] = _bucket(count_frames(data), COUNT_BUCKETS)
+        tags['tags'] = _bucket(len(data.get('tags') or ()), COUNT_BUCKETS)
+    return tags
+
+
+@contextmanager
+def stage(name, tags=None):
+    """
+    Time a stage of the ingestion of an event, which is reported as
+    ``events.stages.<name>`` (with the result of the stage in the ``result``
+    tag.) Use ``get_payload_tags`` to tag the timing with the size of the
+    payload.
+    """
+    with metrics.timer('events.stages.%s' % (name,), tags=dict(tags or {})) as tags:
+        yield tags
@@ -0,0 +1,74 @@
+"""
+sentry.utils.lru
+~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import threading
+
+from collections import OrderedDict
+from time import time
+
+
+class LRUCache(object):
+    """
+    A thread safe, in-process mapping which holds up to ``max_size`` items,
+    evicting the least recently used item when full.
+
+    If ``ttl`` is provided, items are also discarded when they are looked up
+    more than ``ttl`` seconds after they were set.
+    """
+    def __init__(self, max_size, ttl=None):
+        assert max_size > 0
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._items.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires <= time():
+                return default
+            # re-insert the item to mark it as the most recently used
+            self._items[key] = (value, expires)
+            return value
+
+    def get_many(self, keys):
+        """
+        Return a mapping of the keys which are present to their values.
+        """
+        results = {}
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                results[key] = value
+        return results
+
+    def set(self, key, value):
+        expires = time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (value, expires)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
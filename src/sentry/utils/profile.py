@@ -1,8 +1,25 @@
+from __future__ import absolute_import
+
+import logging
+import os
 import sys
+import tempfile
 import time
+from contextlib import contextmanager
 from cProfile import Profile
 from pstats import Stats
 from functools import update_wrapper
+from random import random
+
+from django.conf import settings
+
+try:
+    # Python 3, or the pytracemalloc backport on a patched Python 2
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+logger = logging.getLogger('sentry.profile')
 
 
 def profile_call(_func, *args, **kwargs):
@@ -21,3 +38,45 @@ def profile(func):
     def newfunc(*args, **kwargs):
         return profile_call(func, *args, **kwargs)
     return update_wrapper(newfunc, func)
+
+
+def _get_dump_path(name, extension):
+    directory = settings.SENTRY_PROFILE_DIR or tempfile.gettempdir()
+    return os.path.join(directory, 'sentry-%s-%s-%s.%s' % (
+        name, os.getpid(), time.time(), extension))
+
+
+@contextmanager
+def sampled_profile(name):
+    """
+    Profile a block for a sample (``SENTRY_PROFILE_SAMPLE_RATE``) of the
+    times it runs, dumping the ``cProfile`` stats to ``SENTRY_PROFILE_DIR``.
+
+    If ``tracemalloc`` is available and tracing (i.e. started with
+    ``PYTHONTRACEMALLOC``), the allocations made by the block are dumped as
+    well. Blocks which are profiled should not be nested.
+    """
+    sample_rate = settings.SENTRY_PROFILE_SAMPLE_RATE
+    if not sample_rate or random() >= sample_rate:
+        yield
+        return
+
+    tracing = tracemalloc is not None and tracemalloc.is_tracing()
+    if tracing:
+        before = tracemalloc.take_snapshot()
+
+    profiler = Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        try:
+            profiler.dump_stats(_get_dump_path(name, 'prof'))
+            if tracing:
+                stats = tracemalloc.take_snapshot().compare_to(before, 'lineno')
+                with open(_get_dump_path(name, 'alloc'), 'w') as f:
+                    for stat in stats:
+                        f.write('%s\n' % (stat,))
+        except Exception:
+            logger.exception('Unable to dump profile of %s', name)
@@ -253,6 +253,20 @@ def pytest_runtest_teardown(item):
     from sentry.app import tsdb
     tsdb.flush()
 
+    # object IDs are reused between tests, so nothing that is cached by ID
+    # may outlive a test
+    from django.core.cache import cache
+    cache.clear()
+
+    from sentry.models.grouphash import local_group_ids
+    local_group_ids.clear()
+
+    from sentry.db.models.manager import clear_local_cache
+    clear_local_cache()
+
+    from sentry.plugins import plugins
+    plugins.clear_project_cache()
+
     from sentry.utils.redis import clusters
 
     with clusters.get('default').all() as client:
@@ -0,0 +1,158 @@
+"""
+sentry.utils.symboltable
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+:copyright: (c) 2010-2016 by the Sentry Team, see AUTHORS for more details.
+:license: BSD, see LICENSE for more details.
+"""
+from __future__ import absolute_import
+
+import mmap
+import os
+import struct
+import sys
+import uuid
+
+from array import array
+from bisect import bisect_right
+
+MAGIC = 'SYT\x01'
+
+HEADER = struct.Struct('<4sQQ')
+INT64 = struct.Struct('<q')
+
+
+def _make_int64_array(values=()):
+    # Addresses are signed 64 bit integers, which only fit a native array
+    # where a long is 64 bits wide.
+    if array('l').itemsize == 8:
+        return array('l', values)
+    return list(values)
+
+
+def _to_little_endian(values):
+    if not isinstance(values, array):
+        return struct.pack('<%dq' % len(values), *values)
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tostring()
+
+
+class _Int64View(object):
+    """
+    A read only sequence of little endian 64 bit integers in a buffer.
+    """
+    __slots__ = ('buffer', 'offset', 'length')
+
+    def __init__(self, buffer, offset, length):
+        self.buffer = buffer
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, idx):
+        if not 0 <= idx < self.length:
+            raise IndexError(idx)
+        return INT64.unpack_from(self.buffer, self.offset + idx * 8)[0]
+
+
+class SymbolTable(object):
+    """
+    The symbols of a single object, sorted by address.
+
+    Addresses are kept in a flat array and the symbol names in a single
+    UTF-8 encoded string (with an array of offsets into it), so a table of a
+    few hundred thousand symbols only takes a few megabytes and can be
+    searched by bisection. Tables can be written to disk and memory mapped
+    (``SymbolTable.load``) so they are shared between processes.
+    """
+    __slots__ = ('addresses', 'offsets', 'names', 'mapping')
+
+    def __init__(self, addresses, offsets, names, mapping=None):
+        self.addresses = addresses
+        self.offsets = offsets
+        self.names = names
+        self.mapping = mapping
+
+    @classmethod
+    def from_symbols(cls, symbols):
+        """
+        Build a table from an iterable of ``(address, name)`` pairs which is
+        sorted by address.
+        """
+        addresses = _make_int64_array()
+        offsets = _make_int64_array([0])
+        names = []
+        offset = 0
+        for address, name in symbols:
+            if isinstance(name, unicode):
+                name = name.encode('utf-8')
+            addresses.append(address)
+            offset += len(name)
+            offsets.append(offset)
+            names.append(name)
+        return cls(addresses, offsets, ''.join(names))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory map a table which was written with ``dump``. Returns ``None``
+        if the file does not contain a table.
+        """
+        with open(path, 'rb') as f:
+            try:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                return None
+        if len(mapping) < HEADER.size:
+            mapping.close()
+            return None
+        magic, count, names_size = HEADER.unpack_from(mapping, 0)
+        offset = HEADER.size
+        if magic != MAGIC or len(mapping) != offset + (count * 2 + 1) * 8 + names_size:
+            mapping.close()
+            return None
+        addresses = _Int64View(mapping, offset, count)
+        offset += count * 8
+        offsets = _Int64View(mapping, offset, count + 1)
+        offset += (count + 1) * 8
+        names = buffer(mapping, offset, names_size)
+        return cls(addresses, offsets, names, mapping=mapping)
+
+    def dump(self, path):
+        """
+        Atomically write the table to ``path``.
+        """
+        temporary_path = '%s.%s' % (path, uuid.uuid4().hex)
+        try:
+            with open(temporary_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, len(self), len(self.names)))
+                f.write(_to_little_endian(self.addresses))
+                f.write(_to_little_endian(self.offsets))
+                f.write(self.names)
+            os.rename(temporary_path, path)
+        finally:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def get_name(self, idx):
+        return self.names[self.offsets[idx]:self.offsets[idx + 1]].decode('utf-8')
+
+    def find(self, lower, upper):
+        """
+        Return the ``(address, name)`` of the symbol with the highest address
+        between ``lower`` and ``upper`` (both inclusive), or ``None``.
+        """
+        idx = bisect_right(self.addresses, upper) - 1
+        if idx < 0:
+            return None
+        address = self.addresses[idx]
+        if address < lower:
+            return None
+        return address, self.get_name(idx)
@@ -29,6 +29,8 @@ from sentry.utils.data_scrubber import SensitiveDataFilter
 from sentry.utils.http import (
     is_valid_origin, get_origins, is_same_domain, is_valid_ip,
 )
+from sentry.utils.ingest import get_payload_tags, stage
+from sentry.utils.profile import sampled_profile
 from sentry.utils.safe import safe_execute
 from sentry.web.helpers import render_to_response
 
@@ -263,7 +265,8 @@ class StoreView(APIView):
     """
     def post(self, request, **kwargs):
         data = request.body
-        response_or_event_id = self.process(request, data=data, **kwargs)
+        with sampled_profile('store'):
+            response_or_event_id = self.process(request, data=data, **kwargs)
         if isinstance(response_or_event_id, HttpResponse):
             return response_or_event_id
         return HttpResponse(json.dumps({
@@ -272,7 +275,8 @@ class StoreView(APIView):
 
     def get(self, request, **kwargs):
         data = request.GET.get('sentry_data', '')
-        response_or_event_id = self.process(request, data=data, **kwargs)
+        with sampled_profile('store'):
+            response_or_event_id = self.process(request, data=data, **kwargs)
 
         # Return a simple 1x1 gif for browser so they don't throw a warning
         response = HttpResponse(PIXEL, 'image/gif')
@@ -289,19 +293,66 @@ class StoreView(APIView):
             sender=type(self),
         )
 
+        with stage('quota'):
+            self._check_ip_and_quota(request, project, helper)
+
+        data = self._decode_data(request, helper, data)
+
+        org_options = OrganizationOption.objects.get_all_values(project.organization_id)
+
+        data = self._prepare_event(request, project, auth, helper, data, org_options)
+
+        event_id = data['event_id']
+
+        # TODO(dcramer): ideally we'd only validate this if the event_id was
+        # supplied by the user
+        cache_key = 'ev:%s:%s' % (project.id, event_id,)
+
+        if cache.get(cache_key) is not None:
+            raise APIForbidden('An event with the same ID already exists (%s)' % (event_id,))
+
+        # mutates data (strips a lot of context if not queued)
+        with stage('queue'):
+            helper.insert_data_to_database(data)
+
+        cache.set(cache_key, '', 60 * 5)
+
+        helper.log.debug('New event received (%s)', event_id)
+
+        event_accepted.send_robust(
+            ip=remote_addr,
+            data=data,
+            project=project,
+            sender=type(self),
+        )
+
+        return event_id
+
+    def _check_ip_and_quota(self, request, project, helper, quantity=1):
+        """
+        Apply IP filtering and quotas to ``quantity`` incoming events, recording
+        the outcome in the TSDB counters. Raises ``APIForbidden`` or
+        ``APIRateLimited`` if the events should be rejected.
+        """
+        remote_addr = request.META['REMOTE_ADDR']
+
         if not is_valid_ip(remote_addr, project):
             app.tsdb.incr_multi([
                 (app.tsdb.models.project_total_received, project.id),
                 (app.tsdb.models.project_total_blacklisted, project.id),
                 (app.tsdb.models.organization_total_received, project.organization_id),
                 (app.tsdb.models.organization_total_blacklisted, project.organization_id),
-            ])
-            metrics.incr('events.blacklisted')
+            ], count=quantity)
+            metrics.incr('events.blacklisted', amount=quantity)
             raise APIForbidden('Blacklisted IP address: %s' % (remote_addr,))
 
         # TODO: improve this API (e.g. make RateLimit act on __ne__)
-        rate_limit = safe_execute(app.quotas.is_rate_limited, project=project,
-                                  _with_transaction=False)
+        if quantity == 1:
+            rate_limit = safe_execute(app.quotas.is_rate_limited, project=project,
+                                      _with_transaction=False)
+        else:
+            rate_limit = safe_execute(app.quotas.is_rate_limited, project=project,
+                                      quantity=quantity, _with_transaction=False)
         if isinstance(rate_limit, bool):
             rate_limit = RateLimit(is_limited=rate_limit, retry_after=None)
 
@@ -315,29 +366,41 @@ class StoreView(APIView):
                 (app.tsdb.models.project_total_rejected, project.id),
                 (app.tsdb.models.organization_total_received, project.organization_id),
                 (app.tsdb.models.organization_total_rejected, project.organization_id),
-            ])
-            metrics.incr('events.dropped')
+            ], count=quantity)
+            metrics.incr('events.dropped', amount=quantity)
             if rate_limit is not None:
                 raise APIRateLimited(rate_limit.retry_after)
         else:
             app.tsdb.incr_multi([
                 (app.tsdb.models.project_total_received, project.id),
                 (app.tsdb.models.organization_total_received, project.organization_id),
-            ])
+            ], count=quantity)
 
+    def _decode_data(self, request, helper, data, allow_list=False):
         content_encoding = request.META.get('HTTP_CONTENT_ENCODING', '')
 
         if isinstance(data, basestring):
-            if content_encoding == 'gzip':
-                data = helper.decompress_gzip(data)
-            elif content_encoding == 'deflate':
-                data = helper.decompress_deflate(data)
-            elif not data.startswith('{'):
-                data = helper.decode_and_decompress_data(data)
-            data = helper.safely_load_json_string(data)
+            with stage('decompress', get_payload_tags(size=len(data))):
+                if content_encoding == 'gzip':
+                    data = helper.decompress_gzip(data)
+                elif content_encoding == 'deflate':
+                    data = helper.decompress_deflate(data)
+                elif not data.startswith(('{', '[')):
+                    data = helper.decode_and_decompress_data(data)
+                data = helper.safely_load_json_string(data, allow_list=allow_list)
+
+        return data
+
+    def _prepare_event(self, request, project, auth, helper, data, org_options):
+        """
+        Validate, normalize and scrub a single decoded event payload.
+        """
+        remote_addr = request.META['REMOTE_ADDR']
+        payload_tags = get_payload_tags(data)
 
         # mutates data
-        data = helper.validate_data(project, data)
+        with stage('validate_data', payload_tags):
+            data = helper.validate_data(project, data)
 
         if 'sdk' not in data:
             sdk = helper.parse_client_as_sdk(auth.client)
@@ -345,10 +408,9 @@ class StoreView(APIView):
                 data['sdk'] = sdk
 
         # mutates data
-        manager = EventManager(data, version=auth.version)
-        data = manager.normalize()
-
-        org_options = OrganizationOption.objects.get_all_values(project.organization_id)
+        with stage('normalize', payload_tags):
+            manager = EventManager(data, version=auth.version)
+            data = manager.normalize()
 
         if org_options.get('sentry:require_scrub_ip_address', False):
             scrub_ip_address = True
@@ -361,15 +423,6 @@ class StoreView(APIView):
                 data, remote_addr, set_if_missing=auth.is_public or
                 data.get('platform') in ('javascript', 'cocoa', 'objc'))
 
-        event_id = data['event_id']
-
-        # TODO(dcramer): ideally we'd only validate this if the event_id was
-        # supplied by the user
-        cache_key = 'ev:%s:%s' % (project.id, event_id,)
-
-        if cache.get(cache_key) is not None:
-            raise APIForbidden('An event with the same ID already exists (%s)' % (event_id,))
-
         if org_options.get('sentry:require_scrub_data', False):
             scrub_data = True
         else:
@@ -392,27 +445,124 @@ class StoreView(APIView):
                 fields=sensitive_fields,
                 include_defaults=scrub_defaults,
             )
-            inst.apply(data)
+            with stage('scrub', payload_tags):
+                inst.apply(data)
 
         if scrub_ip_address:
             # We filter data immediately before it ever gets into the queue
             helper.ensure_does_not_have_ip(data)
 
-        # mutates data (strips a lot of context if not queued)
-        helper.insert_data_to_database(data)
+        return data
 
-        cache.set(cache_key, '', 60 * 5)
 
-        helper.log.debug('New event received (%s)', event_id)
+class BatchStoreView(StoreView):
+    """
+    Stores multiple events sent in a single request.
+
+    The body is a JSON list of event payloads (optionally compressed in the
+    same ways as a regular store request). IP filtering, quotas, TSDB
+    counters, duplicate detection and queueing are applied once for the
+    whole batch rather than once per event. The batch is accepted or rejected
+    by the quota as a unit, while validation errors only reject the
+    individual event they apply to.
+
+    The response contains the list of accepted event IDs (``null`` for
+    rejected events) and the errors for rejected events keyed by their
+    index in the batch.
+    """
+    http_method_names = ['post', 'options']
 
-        event_accepted.send_robust(
-            ip=remote_addr,
-            data=data,
-            project=project,
-            sender=type(self),
+    def post(self, request, **kwargs):
+        with sampled_profile('store_batch'):
+            ids, errors = self.process_batch(request, data=request.body, **kwargs)
+        return HttpResponse(json.dumps({
+            'ids': ids,
+            'errors': errors,
+        }), content_type='application/json')
+
+    def process_batch(self, request, project, auth, helper, data, **kwargs):
+        data = self._decode_data(request, helper, data, allow_list=True)
+        if not isinstance(data, list):
+            raise APIError('Batch payload must be a list of events')
+        if not data:
+            raise APIError('Batch payload must contain at least one event')
+        if len(data) > settings.SENTRY_MAX_BATCH_EVENTS:
+            raise APIError('Batch payload cannot contain more than %d events' % (
+                settings.SENTRY_MAX_BATCH_EVENTS,
+            ))
+
+        quantity = len(data)
+        metrics.incr('events.total', amount=quantity)
+
+        remote_addr = request.META['REMOTE_ADDR']
+        for _ in xrange(quantity):
+            event_received.send_robust(
+                ip=remote_addr,
+                sender=type(self),
+            )
+
+        with stage('quota'):
+            self._check_ip_and_quota(request, project, helper, quantity=quantity)
+
+        org_options = OrganizationOption.objects.get_all_values(project.organization_id)
+
+        ids = [None] * quantity
+        errors = {}
+        prepared = []
+        for index, item in enumerate(data):
+            if not isinstance(item, dict):
+                errors[index] = 'Invalid event payload'
+                continue
+            try:
+                item = self._prepare_event(request, project, auth, helper, item, org_options)
+            except APIError as e:
+                errors[index] = force_bytes(e.msg, errors='replace')
+                continue
+            prepared.append((index, item))
+
+        # TODO(dcramer): ideally we'd only validate this if the event_id was
+        # supplied by the user
+        cache_keys = dict(
+            (index, 'ev:%s:%s' % (project.id, item['event_id']))
+            for index, item in prepared
         )
+        existing = cache.get_many(cache_keys.values()) if cache_keys else {}
+
+        accepted = []
+        seen = set()
+        for index, item in prepared:
+            cache_key = cache_keys[index]
+            if existing.get(cache_key) is not None or cache_key in seen:
+                errors[index] = 'An event with the same ID already exists (%s)' % (
+                    item['event_id'],
+                )
+                continue
+            seen.add(cache_key)
+            accepted.append((index, item))
+
+        if accepted:
+            # mutates data (strips a lot of context if not queued)
+            with stage('queue'):
+                helper.insert_data_to_database_many([item for _, item in accepted])
+
+            cache.set_many(dict(
+                (cache_keys[index], '') for index, _ in accepted
+            ), 60 * 5)
+
+        for index, item in accepted:
+            ids[index] = item['event_id']
+            helper.log.debug('New event received (%s)', item['event_id'])
+            event_accepted.send_robust(
+                ip=remote_addr,
+                data=item,
+                project=project,
+                sender=type(self),
+            )
 
-        return event_id
+        if errors:
+            metrics.incr('events.batch.rejected', amount=len(errors))
+
+        return ids, errors
 
 
 class CspReportView(StoreView):
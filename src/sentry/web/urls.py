@@ -189,6 +189,8 @@ urlpatterns += patterns(
         name='sentry-api-store'),
     url(r'^api/(?P<project_id>[\w_-]+)/store/$', api.StoreView.as_view(),
         name='sentry-api-store'),
+    url(r'^api/(?P<project_id>[\w_-]+)/store/batch/$', api.BatchStoreView.as_view(),
+        name='sentry-api-store-batch'),
     url(r'^api/(?P<project_id>\d+)/csp-report/$', api.CspReportView.as_view(),
         name='sentry-api-csp-report'),
 
@@ -137,3 +137,42 @@ class GroupSerializerTest(TestCase):
 
         result = serialize(group)
         assert not result['isSubscribed']
+
+    def test_plugin_annotations(self):
+        from sentry.plugins import Plugin, Plugin2
+
+        class LegacyPlugin(Plugin):
+            def tags(self, request, group, tag_list, **kwargs):
+                tag_list.append('legacy-%s' % (group.id,))
+                return tag_list
+
+        class BatchPlugin(Plugin2):
+            def get_annotations_for_groups(self, groups, **kwargs):
+                return dict((group, ['batch-%s' % (group.id,)]) for group in groups)
+
+        legacy_plugin = LegacyPlugin()
+        batch_plugin = BatchPlugin()
+
+        def for_project(project, version=1):
+            return [legacy_plugin] if version == 1 else [batch_plugin]
+
+        user = self.create_user()
+        other_project = self.create_project()
+        groups = [
+            self.create_group(),
+            self.create_group(),
+            self.create_group(project=other_project),
+        ]
+
+        with patch('sentry.plugins.plugins.for_project', side_effect=for_project), \
+                patch.object(BatchPlugin, 'get_annotations_for_groups',
+                             wraps=batch_plugin.get_annotations_for_groups) as batch:
+            results = serialize(groups, user)
+
+        # called once per project
+        assert batch.call_count == 2
+        for group, result in zip(groups, results):
+            assert result['annotations'] == [
+                'legacy-%s' % (group.id,),
+                'batch-%s' % (group.id,),
+            ]
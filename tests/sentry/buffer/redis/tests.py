@@ -32,6 +32,68 @@ class RedisBufferTest(TestCase):
         client = self.buf.cluster.get_routing_client()
         assert client.zrange('b:p', 0, -1) == []
 
+    @mock.patch('sentry.buffer.redis.process_incr_batch')
+    def test_process_pending_batches_keys(self, process_incr_batch):
+        buf = RedisBuffer(incr_batch_size=2, pending_chunk_size=2)
+        with buf.cluster.map() as client:
+            client.zadd('b:p', 1, 'foo')
+            client.zadd('b:p', 2, 'bar')
+            client.zadd('b:p', 3, 'baz')
+        buf.process_pending()
+        assert len(process_incr_batch.apply_async.mock_calls) == 2
+        process_incr_batch.apply_async.assert_any_call(kwargs={'keys': ['foo', 'bar']})
+        process_incr_batch.apply_async.assert_any_call(kwargs={'keys': ['baz']})
+        client = buf.cluster.get_routing_client()
+        assert client.zrange('b:p', 0, -1) == []
+
+    @mock.patch('sentry.buffer.redis.process_pending_task')
+    def test_process_pending_fans_out_partitions(self, process_pending_task):
+        buf = RedisBuffer(pending_partitions=3)
+        buf.process_pending()
+        assert len(process_pending_task.apply_async.mock_calls) == 3
+        for partition in range(3):
+            process_pending_task.apply_async.assert_any_call(kwargs={'partition': partition})
+
+    @mock.patch('sentry.buffer.redis.process_incr')
+    def test_process_pending_partition(self, process_incr):
+        buf = RedisBuffer(pending_partitions=2)
+        with buf.cluster.map() as client:
+            client.zadd('b:p', 1, 'foo')
+            client.zadd('b:p:1', 1, 'bar')
+        buf.process_pending(partition=1)
+        process_incr.apply_async.assert_called_once_with(kwargs={'key': 'bar'})
+        client = buf.cluster.get_routing_client()
+        assert client.zrange('b:p', 0, -1) == ['foo']
+        assert client.zrange('b:p:1', 0, -1) == []
+
+    def test_make_pending_key(self):
+        buf = RedisBuffer(pending_partitions=4)
+        assert buf._make_pending_key(0) == 'b:p'
+        assert buf._make_pending_key(3) == 'b:p:3'
+        assert 0 <= buf._get_partition('foo') < 4
+
+    @mock.patch('sentry.buffer.base.Buffer.process_many')
+    def test_process_batch(self, process_many):
+        client = self.buf.cluster.get_routing_client()
+        client.hmset('foo', {
+            'f': "(dp1\nS'pk'\np2\nI1\ns.",
+            'i+times_seen': '2',
+            'm': 'sentry.models.Group',
+        })
+        client.hmset('bar', {
+            'f': "(dp1\nS'pk'\np2\nI2\ns.",
+            'i+times_seen': '3',
+            'm': 'sentry.models.Group',
+        })
+        self.buf.process_batch(['foo', 'bar', 'baz'])
+        items = process_many.call_args[0][0]
+        assert sorted(items) == sorted([
+            (Group, {'times_seen': 2}, {'pk': 1}, {}),
+            (Group, {'times_seen': 3}, {'pk': 2}, {}),
+        ])
+        assert client.hgetall('foo') == {}
+        assert client.hgetall('bar') == {}
+
     @mock.patch('sentry.buffer.redis.RedisBuffer._make_key', mock.Mock(return_value='foo'))
     @mock.patch('sentry.buffer.base.Buffer.process')
     def test_process_does_bubble_up(self, process):
@@ -76,3 +138,81 @@ class RedisBufferTest(TestCase):
         }
         pending = client.zrange('b:p', 0, -1)
         assert pending == ['foo']
+
+    @mock.patch('sentry.buffer.redis.RedisBuffer._make_key', mock.Mock(return_value='foo'))
+    def test_incr_coalesces_until_flush(self):
+        buf = RedisBuffer(coalesce_interval=60)
+        client = buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = 'Mock'
+        filters = {'pk': 1}
+        buf.incr(model, {'times_seen': 1}, filters, extra={'foo': 'bar'})
+        buf.incr(model, {'times_seen': 2}, filters, extra={'foo': 'baz'})
+        assert client.hgetall('foo') == {}
+
+        buf.flush()
+        result = client.hgetall('foo')
+        assert result == {
+            'e+foo': "S'baz'\np1\n.",
+            'f': "(dp1\nS'pk'\np2\nI1\ns.",
+            'i+times_seen': '3',
+            'm': 'mock.Mock',
+        }
+        assert client.zrange('b:p', 0, -1) == ['foo']
+
+    @mock.patch('sentry.buffer.redis.RedisBuffer._make_key', mock.Mock(return_value='foo'))
+    def test_incr_flushes_at_max_keys(self):
+        buf = RedisBuffer(coalesce_interval=60, coalesce_max_keys=1)
+        client = buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = 'Mock'
+        buf.incr(model, {'times_seen': 1}, {'pk': 1})
+        assert client.hget('foo', 'i+times_seen') == '1'
+
+    @mock.patch('sentry.buffer.redis.RedisBuffer._make_key', mock.Mock(return_value='foo'))
+    def test_flush_keeps_increments_which_failed(self):
+        buf = RedisBuffer(coalesce_interval=60)
+        client = buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = 'Mock'
+        filters = {'pk': 1}
+        buf.incr(model, {'times_seen': 1}, filters, extra={'foo': 'bar'})
+
+        def execute():
+            # incremented again while the pending increments are written
+            buf.incr(model, {'times_seen': 2}, filters, extra={'foo': 'baz'})
+            raise Exception('boom')
+
+        with mock.patch('redis.client.BasePipeline.execute', side_effect=execute):
+            buf.flush()
+        assert client.hgetall('foo') == {}
+        assert buf._flush_timer is not None
+
+        buf.flush()
+        result = client.hgetall('foo')
+        assert result == {
+            'e+foo': "S'baz'\np1\n.",
+            'f': "(dp1\nS'pk'\np2\nI1\ns.",
+            'i+times_seen': '3',
+            'm': 'mock.Mock',
+        }
+        assert buf._flush_timer is None
+
+    @mock.patch('sentry.buffer.redis.RedisBuffer._make_key', mock.Mock(return_value='foo'))
+    def test_forked_process_starts_without_pending_increments(self):
+        buf = RedisBuffer(coalesce_interval=60)
+        client = buf.cluster.get_routing_client()
+        model = mock.Mock()
+        model.__name__ = 'Mock'
+        buf.incr(model, {'times_seen': 1}, {'pk': 1})
+        assert buf._flush_timer is not None
+
+        with mock.patch('os.getpid', return_value=buf._pid + 1):
+            # the increments belong to the parent
+            buf.flush()
+            assert client.hgetall('foo') == {}
+
+            buf.incr(model, {'times_seen': 2}, {'pk': 1})
+            assert buf._flush_timer is not None
+            buf.flush()
+        assert client.hget('foo', 'i+times_seen') == '2'
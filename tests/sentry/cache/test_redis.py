@@ -23,3 +23,27 @@ class RedisCacheTest(TestCase):
 
         with self.assertRaises(ValueTooLarge):
             self.backend.set('foo', 'x' * (RedisCache.max_size + 1), 0)
+
+    def test_many(self):
+        self.backend.set_many({'foo': 1, 'bar': [2]}, 50)
+
+        assert self.backend.get_many(['foo', 'bar', 'baz']) == {
+            'foo': 1,
+            'bar': [2],
+        }
+
+        self.backend.delete_many(['foo', 'baz'])
+
+        assert self.backend.get_many(['foo', 'bar', 'baz']) == {
+            'bar': [2],
+        }
+
+    def test_raw(self):
+        self.backend.set('foo', '\x00\xff', 50, raw=True)
+        self.backend.set_many({'bar': '\x01'}, 50, raw=True)
+
+        assert self.backend.get('foo', raw=True) == '\x00\xff'
+        assert self.backend.get_many(['foo', 'bar'], raw=True) == {
+            'foo': '\x00\xff',
+            'bar': '\x01',
+        }
@@ -469,6 +469,53 @@ class EnsureHasIpTest(BaseAPITest):
         assert out['sentry.interfaces.User']['ip_address'] == '127.0.0.1'
 
 
+class InsertDataToDatabaseTest(BaseAPITest):
+    def get_data(self, platform):
+        return {
+            'project': self.project.id,
+            'event_id': 'a' * 32,
+            'platform': platform,
+        }
+
+    @mock.patch('sentry.coreapi.save_event')
+    @mock.patch('sentry.coreapi.preprocess_event')
+    def test_two_hop(self, preprocess_event, save_event):
+        self.helper.insert_data_to_database(self.get_data('python'))
+        assert preprocess_event.delay.call_count == 1
+        assert save_event.delay.call_count == 0
+
+    @mock.patch('sentry.coreapi.save_event')
+    @mock.patch('sentry.coreapi.preprocess_event')
+    def test_single_hop(self, preprocess_event, save_event):
+        with self.settings(SENTRY_SINGLE_HOP_INGEST=True):
+            self.helper.insert_data_to_database(self.get_data('python'))
+        assert preprocess_event.delay.call_count == 0
+        assert save_event.delay.call_count == 1
+        assert save_event.delay.call_args[1]['single_hop'] is True
+
+    @mock.patch('sentry.coreapi.save_event')
+    @mock.patch('sentry.coreapi.preprocess_event')
+    def test_single_hop_with_preprocessors(self, preprocess_event, save_event):
+        with self.settings(SENTRY_SINGLE_HOP_INGEST=True):
+            self.helper.insert_data_to_database(self.get_data('javascript'))
+        assert preprocess_event.delay.call_count == 1
+        assert save_event.delay.call_count == 0
+
+    @mock.patch('sentry.coreapi.save_event')
+    @mock.patch('sentry.coreapi.preprocess_event')
+    def test_many(self, preprocess_event, save_event):
+        data_list = [self.get_data('python'), self.get_data('javascript')]
+        data_list[1]['event_id'] = 'b' * 32
+        with self.settings(SENTRY_SINGLE_HOP_INGEST=True):
+            self.helper.insert_data_to_database_many(data_list)
+        assert save_event.apply_async.call_count == 1
+        assert save_event.apply_async.call_args[1]['kwargs']['cache_key'] == \
+            'e:{}:{}'.format('a' * 32, self.project.id)
+        assert preprocess_event.apply_async.call_count == 1
+        assert preprocess_event.apply_async.call_args[1]['kwargs']['cache_key'] == \
+            'e:{}:{}'.format('b' * 32, self.project.id)
+
+
 class CspApiHelperTest(BaseAPITest):
     helper_cls = CspApiHelper
 
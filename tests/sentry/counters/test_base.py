@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+from sentry.app import tsdb
+from sentry.counters.base import Counters
+from sentry.testutils import TestCase
+
+
+class CountersTest(TestCase):
+    def test_get_counts(self):
+        backend = Counters()
+        tsdb.incr(tsdb.models.group, 1, count=3)
+        backend.incr_multi([(backend.models.group, 1)])
+        assert backend.get_counts(backend.models.group, 1, [60, 3600]) == {
+            60: 3,
+            3600: 3,
+        }
+        assert backend.get_counts(backend.models.group, 1, []) == {}
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+from datetime import datetime
+
+from pytz import utc
+
+from sentry.app import tsdb
+from sentry.counters.redis import RedisCounters
+from sentry.testutils import TestCase
+from sentry.utils.dates import to_timestamp
+
+
+class RedisCountersTest(TestCase):
+    def setUp(self):
+        self.backend = RedisCounters(namespace='c-test', windows=(60, 3600), resolution=60)
+        self.model = self.backend.models.group
+        with self.backend.cluster.all() as client:
+            client.delete(self.backend.make_key(self.model, 1))
+            client.delete(self.backend.make_key(self.model, 2))
+
+    def test_sliding_windows(self):
+        now = 1000000 * 3600
+        self.backend.incr_multi([(self.model, 1)], timestamp=now - 3000)
+        self.backend.incr_multi([(self.model, 1)], timestamp=now - 30, count=2)
+        self.backend.incr_multi([
+            (self.model, 1),
+            (self.model, 2),
+        ], timestamp=now)
+
+        assert self.backend.get_counts(self.model, 1, [60, 3600], timestamp=now) == {
+            60: 3,
+            3600: 4,
+        }
+        assert self.backend.get_counts(self.model, 2, [60, 3600], timestamp=now) == {
+            60: 1,
+            3600: 1,
+        }
+
+        # the minute window slides past the items counted 30 seconds ago
+        assert self.backend.get_counts(self.model, 1, [60, 3600], timestamp=now + 45) == {
+            60: 1,
+            3600: 4,
+        }
+        assert self.backend.get_counts(self.model, 1, [60, 3600], timestamp=now + 3540) == {
+            60: 0,
+            3600: 1,
+        }
+
+    def test_reused_slot(self):
+        now = 1000000 * 3600
+        self.backend.incr_multi([(self.model, 1)], timestamp=now, count=5)
+        # the same slot of the minute window, a minute later
+        self.backend.incr_multi([(self.model, 1)], timestamp=now + 60)
+        assert self.backend.get_counts(self.model, 1, [60], timestamp=now + 60) == {60: 1}
+
+        # items which already left the window are dropped
+        self.backend.incr_multi([(self.model, 1)], timestamp=now)
+        assert self.backend.get_counts(self.model, 1, [60], timestamp=now + 60) == {60: 1}
+        assert self.backend.get_counts(self.model, 1, [3600], timestamp=now + 60) == {3600: 7}
+
+    def test_datetime_timestamp(self):
+        now = datetime(2016, 8, 1, 12, 0, 0, tzinfo=utc)
+        self.backend.incr_multi([(self.model, 1)], timestamp=now)
+        assert self.backend.get_counts(self.model, 1, [60], timestamp=to_timestamp(now)) == {60: 1}
+
+    def test_unconfigured_window(self):
+        tsdb.incr(tsdb.models.group, 1, count=3)
+        self.backend.incr_multi([(self.model, 1)])
+        assert self.backend.get_counts(self.model, 1, [60, 600]) == {
+            60: 1,
+            600: 3,
+        }
@@ -0,0 +1,183 @@
+from __future__ import absolute_import
+
+from django.test.utils import override_settings
+from mock import patch
+from time import time
+
+from sentry.db.models.manager import clear_local_cache, make_key
+from sentry.models import Organization, Project
+from sentry.testutils import TestCase
+from sentry.utils.cache import cache
+from sentry.utils.lru import LRUCache
+
+
+def other_process():
+    """
+    Act as another process, i.e. with a local cache of its own.
+    """
+    return patch('sentry.db.models.manager.get_local_cache',
+                 return_value=LRUCache(100))
+
+
+def later(seconds=60):
+    """
+    Act as if the local cache was populated ``seconds`` ago.
+    """
+    return patch('sentry.db.models.manager.time',
+                 return_value=time() + seconds)
+
+
+class GetFromCacheTest(TestCase):
+    def test_simple(self):
+        project = self.create_project()
+        Project.objects.uncache_object(project.id)
+        with self.assertNumQueries(1):
+            assert Project.objects.get_from_cache(id=project.id) == project
+        with self.assertNumQueries(0):
+            assert Project.objects.get_from_cache(id=project.id) == project
+
+    @override_settings(SENTRY_MODEL_CACHE_LOCAL_TTL=60)
+    def test_local_cache(self):
+        project = self.create_project(name='foo')
+        assert Project.objects.get_from_cache(id=project.id) == project
+
+        # the shared cache isn't asked for items which are cached locally
+        with patch('sentry.db.models.manager.cache.get_many',
+                   wraps=cache.get_many) as get_many:
+            with self.assertNumQueries(0):
+                cached = Project.objects.get_from_cache(id=project.id)
+        assert not get_many.called
+        assert cached == project
+        assert cached.name == 'foo'
+
+        # ... but for their version stamp once the TTL passed
+        stamp_key = make_key(Project, 'modelstamp', {'id': project.id})
+        with patch('sentry.db.models.manager.cache.get_many',
+                   wraps=cache.get_many) as get_many, later():
+            assert Project.objects.get_from_cache(id=project.id) == project
+        get_many.assert_called_once_with(
+            [stamp_key], version=Project.objects.cache_version)
+
+        # each lookup returns its own copy
+        cached.name = 'bar'
+        assert Project.objects.get_from_cache(id=project.id).name == 'foo'
+
+        # saving invalidates the local copy
+        project.update(name='baz')
+        project.save()
+        with self.assertNumQueries(0):
+            assert Project.objects.get_from_cache(id=project.id).name == 'baz'
+
+        clear_local_cache()
+        project.delete()
+        with self.assertRaises(Project.DoesNotExist):
+            Project.objects.get_from_cache(id=project.id)
+
+    @override_settings(SENTRY_MODEL_CACHE_LOCAL_TTL=60)
+    def test_local_cache_deleted(self):
+        project = self.create_project()
+        assert Project.objects.get_from_cache(id=project.id) == project
+        project_id = project.id
+        project.delete()
+        with self.assertRaises(Project.DoesNotExist):
+            Project.objects.get_from_cache(id=project_id)
+
+    @override_settings(SENTRY_MODEL_CACHE_LOCAL_TTL=60)
+    def test_local_cache_changed_by_other_process(self):
+        project = self.create_project(name='foo')
+        assert Project.objects.get_from_cache(id=project.id).name == 'foo'
+
+        with other_process():
+            project.name = 'bar'
+            project.save()
+
+        # seen once the TTL passed
+        assert Project.objects.get_from_cache(id=project.id).name == 'foo'
+        with self.assertNumQueries(0), later():
+            assert Project.objects.get_from_cache(id=project.id).name == 'bar'
+
+        with other_process():
+            project_id = project.id
+            project.delete()
+
+        with self.assertRaises(Project.DoesNotExist), later():
+            Project.objects.get_from_cache(id=project_id)
+
+    @override_settings(SENTRY_MODEL_CACHE_LOCAL_TTL=60)
+    def test_lookup_field_changed_by_other_process(self):
+        organization = self.create_organization(slug='foo')
+        assert Organization.objects.get_from_cache(slug='foo') == organization
+        assert Organization.objects.get_many_from_cache(
+            ['foo'], key='slug') == [organization]
+
+        with other_process():
+            organization.slug = 'bar'
+            organization.save()
+
+        with later():
+            with self.assertRaises(Organization.DoesNotExist):
+                Organization.objects.get_from_cache(slug='foo')
+            assert Organization.objects.get_many_from_cache(['foo'], key='slug') == []
+            assert Organization.objects.get_from_cache(slug='bar') == organization
+
+    @override_settings(SENTRY_MODEL_CACHE_LOCAL_TTL=60)
+    def test_changed_lookup_field(self):
+        organization = self.create_organization(slug='foo')
+        assert Organization.objects.get_from_cache(slug='foo') == organization
+
+        organization.slug = 'bar'
+        organization.save()
+        with self.assertRaises(Organization.DoesNotExist):
+            Organization.objects.get_from_cache(slug='foo')
+        assert Organization.objects.get_from_cache(slug='bar') == organization
+
+
+class GetManyFromCacheTest(TestCase):
+    def test_by_pk(self):
+        projects = [self.create_project() for _ in range(3)]
+        ids = [p.id for p in projects]
+        for project_id in ids:
+            Project.objects.uncache_object(project_id)
+
+        Project.objects.get_from_cache(id=ids[1])
+        with self.assertNumQueries(1):
+            assert Project.objects.get_many_from_cache(ids + [0]) == projects
+        with self.assertNumQueries(0):
+            assert Project.objects.get_many_from_cache(reversed(ids)) == projects[::-1]
+
+    @override_settings(SENTRY_MODEL_CACHE_LOCAL_TTL=60)
+    def test_by_pk_local_cache(self):
+        projects = [self.create_project() for _ in range(3)]
+        ids = [p.id for p in projects]
+        assert Project.objects.get_many_from_cache(ids) == projects
+        with patch('sentry.db.models.manager.cache.get_many',
+                   wraps=cache.get_many) as get_many:
+            with self.assertNumQueries(0):
+                assert Project.objects.get_many_from_cache(ids) == projects
+            assert not get_many.called
+            with self.assertNumQueries(0), later():
+                assert Project.objects.get_many_from_cache(ids) == projects
+        # a single request for the version stamps, once the TTL passed
+        assert get_many.call_count == 1
+        assert sorted(get_many.call_args[0][0]) == sorted(
+            make_key(Project, 'modelstamp', {'id': i}) for i in ids)
+
+    def test_by_cache_field(self):
+        organizations = [
+            self.create_organization(slug=slug)
+            for slug in ('foo', 'bar')
+        ]
+        for organization in organizations:
+            Organization.objects.uncache_object(organization.id)
+        cache.delete_many([
+            make_key(Organization, 'modelcache', {'slug': slug})
+            for slug in ('foo', 'bar')
+        ], version=Organization.objects.cache_version)
+
+        Organization.objects.get_from_cache(slug='foo')
+        with self.assertNumQueries(1):
+            assert Organization.objects.get_many_from_cache(
+                ['foo', 'bar', 'baz'], key='slug') == organizations
+        with self.assertNumQueries(0):
+            assert Organization.objects.get_many_from_cache(
+                ['bar', 'foo'], key='slug') == organizations[::-1]
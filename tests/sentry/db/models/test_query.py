@@ -0,0 +1,40 @@
+from __future__ import absolute_import
+
+from mock import patch
+
+from sentry.db.models.query import bulk_get_or_create
+from sentry.models import TagKey
+from sentry.testutils import TestCase
+
+
+class BulkGetOrCreateTest(TestCase):
+    def test_simple(self):
+        project = self.create_project()
+        existing = TagKey.objects.create(project=project, key='foo')
+
+        result = bulk_get_or_create(TagKey, ('project_id', 'key'), [
+            (project.id, 'foo'),
+            (project.id, 'bar'),
+            (project.id, u'b\xe4z'),
+        ])
+
+        assert TagKey.objects.filter(project=project).count() == 3
+        assert result == {
+            (project.id, 'foo'): existing.id,
+            (project.id, 'bar'): TagKey.objects.get(project=project, key='bar').id,
+            (project.id, u'b\xe4z'): TagKey.objects.get(project=project, key=u'b\xe4z').id,
+        }
+
+    def test_caches_ids(self):
+        project = self.create_project()
+        cache_key = lambda value: 'test:%s:%s' % value
+
+        result = bulk_get_or_create(TagKey, ('project_id', 'key'), [
+            (project.id, 'foo'),
+        ], cache_key=cache_key)
+
+        with patch.object(TagKey.objects, 'using') as using:
+            assert bulk_get_or_create(TagKey, ('project_id', 'key'), [
+                (project.id, 'foo'),
+            ], cache_key=cache_key) == result
+        assert not using.called
@@ -1,14 +1,31 @@
 from __future__ import absolute_import
 
+import os
+import shutil
+import tempfile
+
 from datetime import timedelta
 from django.utils import timezone
+from mock import patch
 
-from sentry.db.deletion import BulkDeleteQuery
-from sentry.models import Group, Project
+from sentry.db.deletion import (
+    BulkDeleteQuery, Checkpoint, DeletionPlan, Throttle
+)
+from sentry.models import (
+    Event, EventTag, Group, GroupHash, GroupMeta, Project, Release
+)
 from sentry.testutils import TestCase
 
 
 class BulkDeleteQueryTest(TestCase):
+    def setUp(self):
+        super(BulkDeleteQueryTest, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        super(BulkDeleteQueryTest, self).tearDown()
+
     def test_project_restriction(self):
         project1 = self.create_project()
         group1_1 = self.create_group(project1)
@@ -41,3 +58,139 @@ class BulkDeleteQueryTest(TestCase):
         assert not Group.objects.filter(id=group1_1.id).exists()
         assert not Group.objects.filter(id=group1_2.id).exists()
         assert Group.objects.filter(id=group1_3.id).exists()
+
+    def test_partitions(self):
+        project = self.create_project()
+        groups = [self.create_group(project) for _ in range(5)]
+        lower, upper = groups[0].id, groups[-1].id
+
+        query = BulkDeleteQuery(model=Group)
+        assert query.get_partitions(2) == [
+            (lower, lower + 2), (lower + 3, upper),
+        ]
+        assert query.get_partitions(4) == [
+            (lower, lower + 1), (lower + 2, lower + 3), (upper, upper),
+        ]
+        assert query.get_partitions(10) == [(id, id) for id in range(lower, upper + 1)]
+        assert BulkDeleteQuery(model=Group, project_id=project.id + 1).get_partitions(2) == []
+
+    def test_execute_partitioned(self):
+        project1 = self.create_project()
+        groups = [self.create_group(project1) for _ in range(5)]
+        project2 = self.create_project()
+        group2 = self.create_group(project2)
+
+        BulkDeleteQuery(
+            model=Group,
+            project_id=project1.id,
+        ).execute_partitioned(partitions=2, chunk_size=2)
+
+        assert not Group.objects.filter(id__in=[g.id for g in groups]).exists()
+        assert Group.objects.filter(id=group2.id).exists()
+
+    @patch('sentry.app.nodestore.delete_multi')
+    def test_execute_partitioned_deletes_nodes(self, delete_multi):
+        group = self.create_group()
+        event1 = self.create_event('a' * 32, group=group)
+        event2 = self.create_event('b' * 32, group=group)
+        node_ids = [event1.data.id, event2.data.id]
+
+        BulkDeleteQuery(model=Event).execute_partitioned(chunk_size=10)
+
+        assert not Event.objects.filter(id__in=[event1.id, event2.id]).exists()
+        delete_multi.assert_called_once_with(node_ids)
+
+    def test_execute_partitioned_checkpoint(self):
+        path = os.path.join(self.tmpdir, 'checkpoint.json')
+        project = self.create_project()
+        groups = [self.create_group(project) for _ in range(4)]
+
+        query = BulkDeleteQuery(model=Group, project_id=project.id)
+        key = 'sentry_groupedmessage:None:None:%s' % (project.id,)
+
+        # an interrupted run which left the last two groups
+        checkpoint = Checkpoint(path)
+        checkpoint.set(key, [(groups[2].id, groups[3].id)])
+
+        query.execute_partitioned(checkpoint=Checkpoint(path))
+
+        assert list(Group.objects.filter(
+            id__in=[g.id for g in groups],
+        ).values_list('id', flat=True)) == [groups[0].id, groups[1].id]
+        assert Checkpoint(path).get(key) is None
+
+
+class ThrottleTest(TestCase):
+    @patch('sentry.db.deletion.time')
+    def test_rows_per_second(self, time):
+        time.time.return_value = 100
+        throttle = Throttle(rows_per_second=10)
+
+        throttle.wait(5)
+        assert not time.sleep.called
+        throttle.wait(10)
+        time.sleep.assert_called_once_with(0.5)
+
+    @patch('sentry.db.deletion.time')
+    @patch('sentry.utils.db.get_replication_lag')
+    def test_replication_lag(self, get_replication_lag, time):
+        time.time.return_value = 100
+        get_replication_lag.side_effect = [30.0, 2.0]
+        throttle = Throttle(max_replication_lag=5, replica='replica')
+
+        throttle.wait(10)
+        assert get_replication_lag.call_count == 2
+        time.sleep.assert_called_once_with(5)
+
+
+class DeletionPlanTest(TestCase):
+    def test_order(self):
+        plan = DeletionPlan(Project, 1)
+        models = [step.model for step in plan.steps]
+
+        assert Project not in models
+        assert GroupMeta in models
+        # rows are deleted before the rows they refer to
+        assert models.index(EventTag) < models.index(Event)
+        assert max(i for i, m in enumerate(models) if m is Event) < models.index(Group)
+        assert models.index(Group) < models.index(Release)
+
+    def test_priority(self):
+        plan = DeletionPlan(Group, 1, priority=(GroupHash,))
+        assert plan.steps[0].model is GroupHash
+
+    @patch('sentry.app.nodestore.delete_multi')
+    def test_execute(self, delete_multi):
+        project = self.create_project()
+        group = self.create_group(project)
+        GroupMeta.objects.create(group=group, key='foo', value='bar')
+        events = [self.create_event(group=group) for _ in range(3)]
+        EventTag.objects.create(
+            event_id=events[0].id, project_id=project.id, key_id=1, value_id=1,
+        )
+        other_group = self.create_group()
+        other_event = self.create_event(group=other_group)
+
+        plan = DeletionPlan(Project, project.id, chunk_size=2)
+        assert plan.execute(limit=2)
+        # the first step, and a chunk of the second
+        assert plan.deleted['EventTag'] == 1
+        assert sum(plan.deleted.values()) == 3
+
+        assert not plan.execute()
+        assert plan.deleted['Event'] == 3
+        assert plan.rows_per_second > 0
+
+        assert Project.objects.filter(id=project.id).exists()
+        assert not Group.objects.filter(id=group.id).exists()
+        assert not GroupMeta.objects.filter(group=group.id).exists()
+        assert not Event.objects.filter(id__in=[e.id for e in events]).exists()
+        assert not EventTag.objects.filter(project_id=project.id).exists()
+        assert Event.objects.filter(id=other_event.id).exists()
+        assert Group.objects.filter(id=other_group.id).exists()
+
+        node_ids = [
+            node_id for call in delete_multi.call_args_list
+            for node_id in call[0][0]
+        ]
+        assert sorted(node_ids) == sorted(e.data.id for e in events)
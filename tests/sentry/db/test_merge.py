@@ -0,0 +1,75 @@
+from __future__ import absolute_import
+
+from datetime import timedelta
+from django.utils import timezone
+
+from sentry.db.merge import BulkMergeQuery
+from sentry.models import Event, GroupAssignee, GroupTagValue
+from sentry.testutils import TestCase
+
+
+class BulkMergeQueryTest(TestCase):
+    def test_moves_rows(self):
+        group1 = self.create_group()
+        group2 = self.create_group()
+        events = [self.create_event(group=group1) for _ in range(5)]
+
+        query = BulkMergeQuery(Event, group1.id, group2.id)
+        assert query.execute(chunk_size=2, limit=3) == (4, True)
+        assert query.execute(chunk_size=2) == (1, False)
+
+        assert sorted(Event.objects.filter(
+            group_id=group2.id,
+        ).values_list('id', flat=True)) == [e.id for e in events]
+
+    def test_merges_unique_rows(self):
+        now = timezone.now()
+        project = self.create_project()
+        group1 = self.create_group(project)
+        group2 = self.create_group(project)
+
+        GroupTagValue.objects.create(
+            project=project, group=group1, key='foo', value='bar',
+            times_seen=2, first_seen=now - timedelta(days=2), last_seen=now,
+        )
+        GroupTagValue.objects.create(
+            project=project, group=group1, key='foo', value='baz',
+            times_seen=1, first_seen=now, last_seen=now,
+        )
+        GroupTagValue.objects.create(
+            project=project, group=group2, key='foo', value='bar',
+            times_seen=3, first_seen=now - timedelta(days=1),
+            last_seen=now - timedelta(days=1),
+        )
+
+        BulkMergeQuery(
+            GroupTagValue, group1.id, group2.id,
+            unique_fields=('key', 'value'),
+            sum_fields=('times_seen',),
+            min_fields=('first_seen',),
+            max_fields=('last_seen',),
+        ).execute()
+
+        assert not GroupTagValue.objects.filter(group=group1).exists()
+        tag_value = GroupTagValue.objects.get(group=group2, key='foo', value='bar')
+        assert tag_value.times_seen == 5
+        assert tag_value.first_seen == now - timedelta(days=2)
+        assert tag_value.last_seen == now
+        assert GroupTagValue.objects.get(
+            group=group2, key='foo', value='baz',
+        ).times_seen == 1
+
+    def test_keeps_single_row(self):
+        group1 = self.create_group()
+        group2 = self.create_group()
+        user1 = self.create_user('foo@example.com')
+        user2 = self.create_user('bar@example.com')
+        GroupAssignee.objects.create(project=group1.project, group=group1, user=user1)
+        GroupAssignee.objects.create(project=group2.project, group=group2, user=user2)
+
+        BulkMergeQuery(
+            GroupAssignee, group1.id, group2.id, unique_fields=(),
+        ).execute()
+
+        assert not GroupAssignee.objects.filter(group=group1).exists()
+        assert GroupAssignee.objects.get(group=group2).user == user2
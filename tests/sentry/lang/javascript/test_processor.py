@@ -2,16 +2,20 @@
 
 from __future__ import absolute_import
 
+import base64
 import pytest
 import responses
+import threading
 
+from array import array
 from mock import patch
 from requests.exceptions import RequestException
 
 from sentry.interfaces.stacktrace import Stacktrace
 from sentry.lang.javascript.processor import (
-    BadSource, discover_sourcemap, fetch_sourcemap, fetch_file, generate_module,
-    SourceProcessor, trim_line, UrlResult
+    BadSource, CannotFetchSource, coalesce_fetch, discover_sourcemap, fetch_sourcemap,
+    fetch_file, generate_module, get_http_session, SourceProcessor, sourcemap_index_cache,
+    trim_line, UrlResult
 )
 from sentry.lang.javascript.sourcemaps import SourceMap, SourceMapIndex
 from sentry.lang.javascript.errormapping import (
@@ -112,6 +116,94 @@ class FetchFileTest(TestCase):
             fetch_file('/example.js', release=release)
 
 
+class CoalesceFetchTest(TestCase):
+    def test_shares_pending_fetch(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def func(url, headers):
+            calls.append(url)
+            started.set()
+            release.wait()
+            return ({}, 'foo', 200)
+
+        results = []
+        owner = threading.Thread(target=lambda: results.append(
+            coalesce_fetch('http://example.com', {}, func)))
+        owner.start()
+        started.wait()
+
+        waiting = threading.Event()
+        with patch('sentry.lang.javascript.processor.metrics.incr') as incr:
+            incr.side_effect = lambda *args, **kwargs: waiting.set()
+            waiter = threading.Thread(target=lambda: results.append(
+                coalesce_fetch('http://example.com', {}, func)))
+            waiter.start()
+            waiting.wait()
+        release.set()
+        owner.join()
+        waiter.join()
+
+        assert calls == ['http://example.com']
+        assert results == [({}, 'foo', 200), ({}, 'foo', 200)]
+
+    def test_propagates_errors(self):
+        def func(url, headers):
+            raise CannotFetchSource({'url': url})
+
+        with pytest.raises(CannotFetchSource):
+            coalesce_fetch('http://example.com', {}, func)
+
+        # the failed fetch is no longer pending
+        assert coalesce_fetch('http://example.com', {}, lambda url, headers: 1) == 1
+
+
+class SourceProcessorFetchFilesTest(TestCase):
+    @responses.activate
+    def test_fetches_concurrently(self):
+        responses.add(responses.GET, 'http://example.com/foo.js', body='foo')
+        responses.add(responses.GET, 'http://example.com/bar.js', body='bar')
+        responses.add(responses.GET, 'http://example.com/baz.js', body='baz', status=404)
+
+        processor = SourceProcessor(project=self.project)
+        results = processor.fetch_files([
+            'http://example.com/foo.js',
+            'http://example.com/bar.js',
+            'http://example.com/baz.js',
+            '/qux.js',
+        ], release=None)
+
+        assert len(responses.calls) == 3
+        assert results['http://example.com/foo.js'].body == 'foo'
+        assert results['http://example.com/bar.js'].body == 'bar'
+        assert isinstance(results['http://example.com/baz.js'], BadSource)
+        assert isinstance(results['/qux.js'], BadSource)
+
+    @responses.activate
+    def test_uses_release_artifacts(self):
+        responses.add(responses.GET, 'http://example.com/bar.js', body='bar')
+
+        release = Release.objects.create(project=self.project, version='abc')
+        processor = SourceProcessor(project=self.project)
+        with patch('sentry.lang.javascript.processor.fetch_release_file') as fetch_release_file:
+            fetch_release_file.side_effect = lambda url, release: (
+                ({}, 'foo', 200) if url.endswith('foo.js') else None
+            )
+            results = processor.fetch_files([
+                'http://example.com/foo.js',
+                'http://example.com/bar.js',
+            ], release=release)
+
+        assert len(responses.calls) == 1
+        assert results['http://example.com/foo.js'].body == 'foo'
+        assert results['http://example.com/bar.js'].body == 'bar'
+
+    def test_reuses_http_sessions(self):
+        assert get_http_session('example.com') is get_http_session('example.com')
+        assert get_http_session('example.com') is not get_http_session('example.org')
+
+
 class DiscoverSourcemapTest(TestCase):
     # discover_sourcemap(result)
     def test_simple(self):
@@ -175,14 +267,35 @@ class GenerateModuleTest(TestCase):
 
 
 class FetchBase64SourcemapTest(TestCase):
+    def tearDown(self):
+        sourcemap_index_cache.clear()
+
     def test_simple(self):
         index = fetch_sourcemap(base64_sourcemap)
-        states = [SourceMap(1, 0, '/test.js', 0, 0, None)]
-        sources = set(['/test.js'])
-        keys = [(1, 0)]
-        content = {'/test.js': ['console.log("hello, World!")']}
 
-        assert index == SourceMapIndex(states, keys, sources, content)
+        assert len(index) == 1
+        assert index.get_state(0) == SourceMap(1, 0, '/test.js', 0, 0, None)
+        assert index.sources == set(['/test.js'])
+        assert index.content == {'/test.js': ['console.log("hello, World!")']}
+
+    @patch('sentry.lang.javascript.processor.sourcemap_to_index')
+    def test_caches_index(self, sourcemap_to_index):
+        url = 'data:application/json;base64,' + base64.b64encode('{"cached": true}')
+        index = sourcemap_to_index.return_value = SourceMapIndex(
+            *[array('i', [1]) for _ in SourceMapIndex.arrays],
+            source_table=['/test.js'],
+            name_table=['foo'],
+            content={}
+        )
+
+        assert fetch_sourcemap(url) is index
+        assert fetch_sourcemap(url) is index
+        assert sourcemap_to_index.call_count == 1
+
+        # other workers load the serialized index from the shared cache
+        sourcemap_index_cache.clear()
+        assert fetch_sourcemap(url) == index
+        assert sourcemap_to_index.call_count == 1
 
 
 class TrimLineTest(TestCase):
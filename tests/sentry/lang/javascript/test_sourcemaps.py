@@ -3,7 +3,8 @@
 from __future__ import absolute_import
 
 from sentry.lang.javascript.sourcemaps import (
-    SourceMap, parse_vlq, parse_sourcemap, sourcemap_to_index, find_source, get_inline_content_sources
+    SourceMap, parse_vlq, parse_sourcemap, sourcemap_to_index, find_source, get_inline_content_sources,
+    dump_sourcemap_index, load_sourcemap_index
 )
 from sentry.testutils import TestCase
 
@@ -107,6 +108,42 @@ class FindSourceTest(TestCase):
         assert result == SourceMap(dst_line=0, dst_col=191, src='foo/file2.js', src_line=9, src_col=25, name='e')
 
 
+class SourceMapIndexTest(TestCase):
+    def test_matches_parsed_states(self):
+        index = sourcemap_to_index(sourcemap)
+        states = list(parse_sourcemap(json.loads(sourcemap)))
+
+        assert [index.get_state(i) for i in xrange(len(index))] == states
+        assert index.sources == set(['foo/file1.js', 'foo/file2.js'])
+
+    def test_find_before_first_segment_of_line(self):
+        index = sourcemap_to_index(json.dumps({
+            'version': 3,
+            'sources': ['file1.js'],
+            'names': [],
+            'mappings': 'AAAA;CAAC',
+        }))
+
+        assert index.find(0, 0) == 0
+        assert index.find(0, 5) == 0
+        # the only segment of the second line is at column 1, so column 0
+        # maps to the last segment of the first line
+        assert index.find(1, 0) == 0
+        assert index.find(1, 1) == 1
+        assert index.find(5, 0) == 1
+
+    def test_serialization(self):
+        index = sourcemap_to_index(sourcemap)
+        assert load_sourcemap_index(dump_sourcemap_index(index)) == index
+
+        index = sourcemap_to_index(indexed_sourcemap_example)
+        result = load_sourcemap_index(dump_sourcemap_index(index))
+        assert result == index
+        assert find_source(result, 2, 12) == find_source(index, 2, 12)
+        assert get_inline_content_sources(result, 'https://example.com/static/') == \
+            get_inline_content_sources(index, 'https://example.com/static/')
+
+
 class GetInlineContentSourcesTest(TestCase):
     def test_no_inline(self):
         # basic sourcemap fixture has no inlined sources, so expect an empty list
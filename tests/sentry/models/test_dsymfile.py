@@ -0,0 +1,98 @@
+from __future__ import absolute_import
+
+import shutil
+import tempfile
+
+from sentry.models import DSymBundle, DSymObject, DSymSDK, DSymSymbol
+from sentry.models.dsymfile import symbol_objects, symbol_tables
+from sentry.testutils import TestCase
+
+
+class LookupSymbolTest(TestCase):
+    sdk_info = {
+        'dsym_type': 'macho',
+        'sdk_name': 'iOS',
+        'version_major': 9,
+        'version_minor': 3,
+        'version_patchlevel': 0,
+    }
+
+    def setUp(self):
+        self.object = DSymObject.objects.create(
+            cpu_name='arm64',
+            object_path='/usr/lib/libobjc.A.dylib',
+            uuid='c0bcc3f1-9827-3de9-9f9e-6fb2e1b4b5ed',
+            vmaddr=0x10000000,
+            vmsize=0x10000,
+        )
+        sdk = DSymSDK.objects.create(
+            version_build='13E238',
+            version_patchlevel=0,
+            version_minor=3,
+            version_major=9,
+            sdk_name='iOS',
+            dsym_type='macho',
+        )
+        DSymBundle.objects.create(sdk=sdk, object=self.object)
+        DSymSymbol.objects.create(object=self.object, address=0x10000000, symbol='start')
+        DSymSymbol.objects.create(object=self.object, address=0x10001000, symbol='objc_msgSend')
+
+    def tearDown(self):
+        symbol_tables.clear()
+        symbol_objects.clear()
+
+    def lookup(self, instruction_addr, **kwargs):
+        kwargs.setdefault('uuid', 'C0BCC3F1-9827-3DE9-9F9E-6FB2E1B4B5ED')
+        return DSymSymbol.objects.lookup_symbol(
+            instruction_addr=instruction_addr,
+            image_addr='0x1000000',
+            **kwargs
+        )
+
+    def test_by_uuid(self):
+        assert self.lookup('0x1000010') == 'start'
+        assert self.lookup('0x1001010') == 'objc_msgSend'
+        assert self.lookup('0xfffffff') == 'objc_msgSend'
+
+    def test_by_absolute_address(self):
+        DSymObject.objects.filter(id=self.object.id).update(vmaddr=None)
+        assert self.lookup('0x1000010') is None
+        assert self.lookup('0x1000010', image_vmaddr='0x10001000') == 'objc_msgSend'
+        assert self.lookup('0x1000010', image_vmaddr='0x20000000') is None
+
+    def test_by_path(self):
+        kwargs = {
+            'uuid': '00000000-0000-0000-0000-000000000000',
+            'cpu_name': 'arm64',
+            'object_path': '/usr/lib/libobjc.A.dylib',
+        }
+        assert self.lookup('0x1001010', sdk_info=self.sdk_info, **kwargs) == 'objc_msgSend'
+        assert self.lookup('0x1001010', **kwargs) is None
+        assert self.lookup('0x1001010', sdk_info=dict(
+            self.sdk_info, version_minor=2), **kwargs) is None
+        assert self.lookup('0x1001010', sdk_info=dict(
+            self.sdk_info, dsym_type='none'), **kwargs) is None
+
+    def test_caches_symbol_tables(self):
+        assert self.lookup('0x1000010') == 'start'
+        with self.assertNumQueries(0):
+            assert self.lookup('0x1001010') == 'objc_msgSend'
+
+    def test_memory_mapped_symbol_tables(self):
+        path = tempfile.mkdtemp()
+        try:
+            with self.settings(SENTRY_DSYM_SYMBOL_TABLE_PATH=path):
+                assert self.lookup('0x1000010') == 'start'
+
+                # a new symbol invalidates the table on disk
+                DSymSymbol.objects.create(
+                    object=self.object, address=0x10001010, symbol='objc_release')
+                symbol_tables.clear()
+                assert self.lookup('0x1001010') == 'objc_release'
+
+                symbol_tables.clear()
+                table = DSymSymbol.objects._get_symbol_table(self.object.id)
+                assert table.mapping is not None
+                assert len(table) == 3
+        finally:
+            shutil.rmtree(path)
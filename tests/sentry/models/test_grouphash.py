@@ -0,0 +1,41 @@
+from __future__ import absolute_import
+
+from sentry.models import GroupHash
+from sentry.models.grouphash import local_group_ids
+from sentry.testutils import TestCase
+
+
+class GroupHashCacheTest(TestCase):
+    def test_set_and_clear(self):
+        manager = GroupHash.objects
+        manager.set_group_ids(1, ['a', 'b'], 10)
+        manager.set_group_ids(2, ['a'], 20)
+
+        assert manager.get_group_ids(1, ['a', 'b', 'c']) == {'a': 10, 'b': 10}
+        assert manager.get_group_ids(2, ['a', 'b']) == {'a': 20}
+
+        manager.clear_group_ids(1, ['a'])
+        assert manager.get_group_ids(1, ['a', 'b']) == {'b': 10}
+        assert manager.get_group_ids(2, ['a']) == {'a': 20}
+
+    def test_falls_back_to_shared_cache(self):
+        GroupHash.objects.set_group_ids(1, ['a'], 10)
+        local_group_ids.clear()
+
+        assert GroupHash.objects.get_group_ids(1, ['a']) == {'a': 10}
+        assert local_group_ids.get((1, 'a')) == 10
+
+    def test_clear_group_ids_for_group(self):
+        project = self.create_project()
+        group = self.create_group(project=project)
+        other_group = self.create_group(project=project)
+        GroupHash.objects.create(project=project, group=group, hash='a')
+        GroupHash.objects.create(project=project, group=other_group, hash='b')
+        GroupHash.objects.set_group_ids(project.id, ['a'], group.id)
+        GroupHash.objects.set_group_ids(project.id, ['b'], other_group.id)
+
+        GroupHash.objects.clear_group_ids_for_group(group.id)
+
+        assert GroupHash.objects.get_group_ids(project.id, ['a', 'b']) == {
+            'b': other_group.id,
+        }
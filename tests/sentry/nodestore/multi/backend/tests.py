@@ -17,6 +17,9 @@ class InMemoryBackend(NodeStorage):
     def get(self, id):
         return self._data.get(id)
 
+    def delete(self, id):
+        self._data.pop(id, None)
+
 
 class MultiNodeStorageTest(TestCase):
     def setUp(self):
@@ -80,3 +83,8 @@ class MultiNodeStorageTest(TestCase):
             assert backend.get(node_id2) == {
                 'foo': 'bir',
             }
+
+        self.ns.delete_multi([node_id, node_id2])
+        for backend in self.ns.backends:
+            assert backend.get(node_id) is None
+            assert backend.get(node_id2) is None
@@ -0,0 +1,70 @@
+from __future__ import absolute_import
+
+from mock import patch
+
+from sentry.plugins import Plugin, Plugin2
+from sentry.plugins.base.manager import PluginManager
+from sentry.testutils import TestCase
+
+
+class ExamplePlugin(Plugin):
+    slug = 'example'
+    title = 'Example'
+
+
+class OtherExamplePlugin(Plugin):
+    slug = 'other-example'
+    title = 'Other Example'
+    project_default_enabled = True
+
+
+class ExamplePlugin2(Plugin2):
+    slug = 'example2'
+    title = 'Example 2'
+
+
+class PluginManagerTest(TestCase):
+    def setUp(self):
+        self.manager = PluginManager()
+        self.manager.register(ExamplePlugin)
+        self.manager.register(OtherExamplePlugin)
+        self.manager.register(ExamplePlugin2)
+
+    def test_for_project(self):
+        project = self.create_project()
+        assert [p.slug for p in self.manager.for_project(project)] == ['other-example']
+        assert [p.slug for p in self.manager.for_project(project, version=2)] == []
+
+        self.manager.get('example').enable(project)
+        self.manager.get('example2').enable(project)
+        assert [p.slug for p in self.manager.for_project(project)] == ['example', 'other-example']
+        assert [p.slug for p in self.manager.for_project(project, version=2)] == ['example2']
+        assert [p.slug for p in self.manager.for_project(project, version=None)] == [
+            'example', 'example2', 'other-example',
+        ]
+
+        self.manager.get('other-example').disable(project)
+        assert [p.slug for p in self.manager.for_project(project)] == ['example']
+
+    def test_resolves_once(self):
+        project = self.create_project()
+        other_project = self.create_project()
+        other_plugin = self.manager.get('other-example')
+        with patch.object(ExamplePlugin, 'is_enabled', return_value=True) as is_enabled:
+            assert len(self.manager.enabled_for_project(project)) == 2
+            assert len(self.manager.enabled_for_project(project)) == 2
+            assert is_enabled.call_count == 2  # is_enabled() and is_enabled(project)
+
+            assert len(self.manager.enabled_for_project(other_project)) == 2
+            assert is_enabled.call_count == 4
+
+            other_plugin.disable(project)
+            assert len(self.manager.enabled_for_project(project)) == 1
+            assert is_enabled.call_count == 6
+
+    def test_registry_changes(self):
+        project = self.create_project()
+        self.manager.get('example').enable(project)
+        assert len(self.manager.enabled_for_project(project)) == 2
+        self.manager.unregister(ExamplePlugin)
+        assert [p.slug for p in self.manager.enabled_for_project(project)] == ['other-example']
@@ -35,3 +35,53 @@ class GetAuthForUserTest(TestCase):
         p = IssueTrackingPlugin()
         p.auth_provider = 'test'
         self.assertEquals(p.get_auth_for_user(user), auth)
+
+
+class IssueTrackingPluginAnnotationsTest(TestCase):
+    def test_get_annotations_for_groups(self):
+        from sentry.models import GroupMeta
+
+        class ExampleIssuePlugin(IssueTrackingPlugin):
+            slug = 'example-issue'
+            conf_key = 'example-issue'
+
+            def is_configured(self, request, project, **kwargs):
+                return True
+
+            def get_issue_url(self, group, issue_id, **kwargs):
+                return 'http://example.com/%s' % (issue_id,)
+
+        groups = [self.create_group(), self.create_group()]
+        GroupMeta.objects.set_value(groups[0], 'example-issue:tid', '123')
+        GroupMeta.objects.populate_cache(groups)
+
+        p = ExampleIssuePlugin()
+        with self.assertNumQueries(0):
+            results = p.get_annotations_for_groups(groups)
+        assert results == {
+            groups[0]: ['<a href="http://example.com/123">#123</a>'],
+            groups[1]: [],
+        }
+        tag_list = []
+        p.tags(None, groups[0], tag_list)
+        assert tag_list == results[groups[0]]
+
+    def test_get_annotations_for_groups_with_custom_tags(self):
+        class CustomTagsIssuePlugin(IssueTrackingPlugin):
+            slug = 'custom-tags-issue'
+            conf_key = 'custom-tags-issue'
+
+            def is_configured(self, request, project, **kwargs):
+                return True
+
+            def tags(self, request, group, tag_list, **kwargs):
+                tag_list.append('group-%s' % (group.id,))
+                return tag_list
+
+        groups = [self.create_group(), self.create_group()]
+
+        p = CustomTagsIssuePlugin()
+        assert p.get_annotations_for_groups(groups) == {
+            groups[0]: ['group-%s' % (groups[0].id,)],
+            groups[1]: ['group-%s' % (groups[1].id,)],
+        }
@@ -9,6 +9,7 @@ from exam import fixture, patcher
 
 from sentry.quotas.redis import (
     is_rate_limited,
+    lease_quota,
     RedisQuota,
 )
 from sentry.testutils import TestCase
@@ -40,6 +41,23 @@ def test_is_rate_limited_script():
     assert 119 <= client.ttl('bar') <= 120
 
 
+def test_is_rate_limited_script_with_quantity():
+    now = int(time.time())
+
+    cluster = clusters.get('default')
+    client = cluster.get_local_client(cluster.hosts.keys()[0])
+
+    # A batch of three items fits within both quotas.
+    assert map(bool, is_rate_limited(client, ('baz', 'qux'), (5, now + 60, 10, now + 120, 3))) == [False, False]
+
+    # Another batch of three items would exceed the first quota, so the whole
+    # batch is rejected and neither counter is affected.
+    assert map(bool, is_rate_limited(client, ('baz', 'qux'), (5, now + 60, 10, now + 120, 3))) == [True, False]
+
+    assert client.get('baz') == '3'
+    assert client.get('qux') == '3'
+
+
 class RedisQuotaTest(TestCase):
     quota = fixture(RedisQuota)
 
@@ -81,3 +99,104 @@ class RedisQuotaTest(TestCase):
         self.get_organization_quota.return_value = 100
         self.get_project_quota.return_value = 200
         assert self.quota.is_rate_limited(self.project).is_limited
+
+
+def test_lease_script():
+    now = int(time.time())
+
+    cluster = clusters.get('default')
+    client = cluster.get_local_client(cluster.hosts.keys()[0])
+    client.delete('lease-foo', 'lease-bar')
+
+    # The lease is limited by the quota with the fewest available items.
+    assert lease_quota(client, ('lease-foo', 'lease-bar'), (10, now + 60, 4, now + 120, 5)) == 4
+    assert lease_quota(client, ('lease-foo', 'lease-bar'), (10, now + 60, 4, now + 120, 5)) == 0
+
+    assert client.get('lease-foo') == '4'
+    assert client.get('lease-bar') == '4'
+    assert 59 <= client.ttl('lease-foo') <= 60
+
+
+class RedisQuotaLeaseTest(TestCase):
+    @fixture
+    def quota(self):
+        quota = RedisQuota(lease_ratio=0.1)
+        # run refills synchronously
+        quota.spawn = lambda func, *args: func(*args)
+        return quota
+
+    @patcher.object(RedisQuota, 'get_project_quota')
+    def get_project_quota(self):
+        inst = mock.MagicMock()
+        inst.return_value = 50
+        return inst
+
+    @patcher.object(RedisQuota, 'get_organization_quota')
+    def get_organization_quota(self):
+        inst = mock.MagicMock()
+        inst.return_value = 0
+        return inst
+
+    def setUp(self):
+        self.now = (int(time.time()) // 60 + 1) * 60
+        self.key = self.quota.get_redis_key('p:{}'.format(self.project.id), self.now, 60)
+        with self.quota.cluster.all() as client:
+            client.delete(self.key)
+            client.delete(self.quota.get_redis_key('p:{}'.format(self.project.id), self.now + 60, 60))
+
+    def get_count(self, key):
+        return int(self.quota.cluster.get_local_client_for_key(
+            str(self.project.organization.pk)).get(key) or 0)
+
+    def test_consumes_lease_locally(self):
+        with mock.patch('sentry.quotas.redis.time', return_value=self.now), \
+                mock.patch('sentry.quotas.redis.lease_quota', wraps=lease_quota) as lease:
+            assert not self.quota.is_rate_limited(self.project).is_limited
+            assert lease.call_count == 1
+            assert self.get_count(self.key) == 5
+
+            for _ in range(2):
+                assert not self.quota.is_rate_limited(self.project).is_limited
+            assert lease.call_count == 1
+
+            # the lease is refilled once less than a quarter of it remains
+            for _ in range(2):
+                assert not self.quota.is_rate_limited(self.project).is_limited
+            assert lease.call_count == 2
+            assert self.get_count(self.key) == 10
+
+    def test_rejects_locally_when_exhausted(self):
+        with mock.patch('sentry.quotas.redis.time', return_value=self.now), \
+                mock.patch('sentry.quotas.redis.lease_quota', wraps=lease_quota) as lease:
+            for _ in range(50):
+                assert not self.quota.is_rate_limited(self.project).is_limited
+            assert self.get_count(self.key) == 50
+
+            calls = lease.call_count
+            for _ in range(10):
+                result = self.quota.is_rate_limited(self.project)
+                assert result.is_limited
+                assert result.retry_after == 60
+            assert lease.call_count == calls
+
+    def test_batch_larger_than_lease(self):
+        with mock.patch('sentry.quotas.redis.time', return_value=self.now):
+            assert not self.quota.is_rate_limited(self.project, quantity=20).is_limited
+            assert self.get_count(self.key) == 20
+            assert self.quota.is_rate_limited(self.project, quantity=40).is_limited
+            assert not self.quota.is_rate_limited(self.project, quantity=30).is_limited
+            assert self.get_count(self.key) == 50
+
+    def test_leases_again_at_rollover(self):
+        with mock.patch('sentry.quotas.redis.time', return_value=self.now):
+            assert not self.quota.is_rate_limited(self.project).is_limited
+        assert self.get_count(self.key) == 5
+
+        next_key = self.quota.get_redis_key('p:{}'.format(self.project.id), self.now + 60, 60)
+        with mock.patch('sentry.quotas.redis.time', return_value=self.now + 60), \
+                mock.patch.object(self.quota, 'spawn') as spawn:
+            assert not self.quota.is_rate_limited(self.project).is_limited
+            # nothing is returned to the previous window in the background
+            assert not spawn.called
+        assert self.get_count(self.key) == 5
+        assert self.get_count(next_key) == 5
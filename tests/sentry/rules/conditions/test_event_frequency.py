@@ -80,3 +80,19 @@ class EventFrequencyConditionTest(RuleTestCase):
             'value': '0',
         })
         self.assertPasses(rule, event)
+
+    def test_prefetch_rates(self):
+        event = self.get_event()
+        rule = self.get_rule({
+            'interval': Interval.ONE_MINUTE,
+            'value': '10',
+        })
+
+        tsdb.incr(tsdb.models.group, event.group_id, count=11)
+
+        rule.prefetch_rates(event, [Interval.ONE_MINUTE, Interval.ONE_HOUR, 'invalid'])
+        assert event._rate_cache == {
+            Interval.ONE_MINUTE: 11,
+            Interval.ONE_HOUR: 11,
+        }
+        self.assertPasses(rule, event)
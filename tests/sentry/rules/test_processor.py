@@ -2,10 +2,24 @@
 
 from __future__ import absolute_import
 
-from sentry.models import Rule
+from mock import patch
+
+from sentry.app import tsdb
+from sentry.models import GroupRuleStatus, Rule
 from sentry.plugins import plugins
 from sentry.testutils import TestCase
-from sentry.rules.processor import EventCompatibilityProxy, RuleProcessor
+from sentry.utils.cache import cache
+from sentry.rules.conditions.event_frequency import Interval
+from sentry.rules.processor import (
+    EventCompatibilityProxy, RuleProcessor, get_compiled_rules
+)
+
+EVERY_EVENT = {
+    'id': 'sentry.rules.conditions.every_event.EveryEventCondition',
+}
+NOTIFY_EVENT = {
+    'id': 'sentry.rules.actions.notify_event.NotifyEventAction',
+}
 
 
 class RuleProcessorTest(TestCase):
@@ -38,6 +52,117 @@ class RuleProcessorTest(TestCase):
         assert futures[0].rule == rule
         assert futures[0].kwargs == {}
 
+    def test_rule_statuses(self):
+        event = self.create_event()
+
+        Rule.objects.filter(project=event.project).delete()
+        rules = [
+            Rule.objects.create(
+                project=event.project,
+                data={
+                    'conditions': [EVERY_EVENT],
+                    'actions': [NOTIFY_EVENT],
+                },
+            ) for _ in range(3)
+        ]
+
+        rp = RuleProcessor(event, is_new=True, is_regression=False, is_sample=False)
+        results = list(rp.apply())
+        assert len(results[0][1]) == 3
+
+        statuses = GroupRuleStatus.objects.filter(group=event.group)
+        assert sorted(s.rule_id for s in statuses) == sorted(r.id for r in rules)
+        assert all(s.status == GroupRuleStatus.ACTIVE for s in statuses)
+
+        rp = RuleProcessor(event, is_new=False, is_regression=False, is_sample=False)
+        results = list(rp.apply())
+        assert len(results[0][1]) == 3
+        assert GroupRuleStatus.objects.filter(group=event.group).count() == 3
+
+    def test_missing_rule_status(self):
+        event = self.create_event()
+
+        Rule.objects.filter(project=event.project).delete()
+        rules = [
+            Rule.objects.create(
+                project=event.project,
+                data={
+                    'conditions': [EVERY_EVENT],
+                    'actions': [NOTIFY_EVENT],
+                },
+            ) for _ in range(2)
+        ]
+        GroupRuleStatus.objects.create(
+            rule=rules[0],
+            group=event.group,
+            project=event.project,
+            status=GroupRuleStatus.ACTIVE,
+        )
+
+        rp = RuleProcessor(event, is_new=False, is_regression=False, is_sample=False)
+        statuses = rp.get_rule_statuses(rules)
+        assert statuses[rules[0].id].status == GroupRuleStatus.ACTIVE
+        assert statuses[rules[1].id].status == GroupRuleStatus.INACTIVE
+        assert GroupRuleStatus.objects.filter(group=event.group).count() == 2
+
+    def test_compiled_rules(self):
+        event = self.create_event()
+
+        Rule.objects.filter(project=event.project).delete()
+        rule = Rule.objects.create(
+            project=event.project,
+            data={
+                'conditions': [EVERY_EVENT],
+                'actions': [NOTIFY_EVENT],
+            },
+        )
+
+        compiled_rules = get_compiled_rules(event.project)
+        assert [c.rule for c in compiled_rules] == [rule]
+        assert get_compiled_rules(event.project)[0] is compiled_rules[0]
+
+        # reloading the (same) rules doesn't recompile them
+        cache.delete(Rule._get_cache_key(event.project.id))
+        assert get_compiled_rules(event.project)[0] is compiled_rules[0]
+
+        rule.data['action_match'] = 'none'
+        rule.save()
+
+        compiled_rules = get_compiled_rules(event.project)
+        assert compiled_rules[0].match == 'none'
+
+    def test_frequency_conditions_share_query(self):
+        event = self.create_event()
+
+        Rule.objects.filter(project=event.project).delete()
+        for interval, value in ((Interval.ONE_MINUTE, 10),
+                                (Interval.ONE_HOUR, 10),
+                                (Interval.ONE_HOUR, 100)):
+            Rule.objects.create(
+                project=event.project,
+                data={
+                    'conditions': [{
+                        'id': 'sentry.rules.conditions.event_frequency.EventFrequencyCondition',
+                        'interval': interval,
+                        'value': value,
+                    }],
+                    'actions': [NOTIFY_EVENT],
+                },
+            )
+
+        tsdb.incr(tsdb.models.group, event.group_id, count=11)
+
+        rp = RuleProcessor(event, is_new=False, is_regression=False, is_sample=False)
+        with patch.object(tsdb, 'get_range_series_multi',
+                          wraps=tsdb.get_range_series_multi) as get_range_series_multi, \
+                patch.object(tsdb, 'get_sums') as get_sums:
+            results = list(rp.apply())
+
+        assert get_range_series_multi.call_count == 1
+        assert len(get_range_series_multi.call_args[0][0]) == 2
+        assert not get_sums.called
+        assert len(results[0][1]) == 2
+
 
 class EventCompatibilityProxyTest(TestCase):
     def test_simple(self):
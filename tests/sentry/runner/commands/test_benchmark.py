@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+from sentry.models import Event
+from sentry.runner.commands.benchmark import benchmark
+from sentry.testutils import CliTestCase
+
+
+class IngestBenchmarkTest(CliTestCase):
+    command = benchmark
+
+    def test_simple(self):
+        project = self.create_project()
+        rv = self.invoke('ingest', '-n', '1', '--project', str(project.id),
+                         '-p', 'python', '-p', 'many-tags')
+        assert rv.exit_code == 0, rv.output
+        assert 'python' in rv.output
+        assert 'Ingested 2 events' in rv.output
+        assert Event.objects.filter(project_id=project.id).count() == 2
+
+    def test_unknown_payload(self):
+        project = self.create_project()
+        rv = self.invoke('ingest', '--project', str(project.id), '-p', 'unknown')
+        assert rv.exit_code != 0
+        assert 'Unknown payload' in rv.output
+
+    def test_unknown_project(self):
+        rv = self.invoke('ingest', '--project', '12345')
+        assert rv.exit_code != 0
+        assert 'does not exist' in rv.output
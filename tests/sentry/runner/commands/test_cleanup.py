@@ -36,3 +36,16 @@ class SentryCleanupTest(CliTestCase):
 
         for model in ALL_MODELS:
             assert model.objects.count() == 0
+
+    def test_concurrency(self):
+        rv = self.invoke('--days=1', '--concurrency=1', '--partitions=3',
+                         '--max-rows-per-second=100000')
+        assert rv.exit_code == 0, rv.output
+
+        for model in ALL_MODELS:
+            assert model.objects.count() == 0
+
+    def test_replication_lag_requires_replica(self):
+        rv = self.invoke('--days=1', '--max-replication-lag=5')
+        assert rv.exit_code != 0
+        assert '--replica' in rv.output
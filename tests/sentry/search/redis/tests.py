@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import absolute_import
+
+import mock
+
+from datetime import datetime, timedelta
+
+from sentry.models import GroupStatus, GroupTagValue
+from sentry.search.base import ANY
+from sentry.search.django.backend import DjangoSearchBackend
+from sentry.search.redis.backend import RedisSearchBackend, tokenize
+from sentry.testutils import TestCase
+
+
+def test_tokenize():
+    assert tokenize(None) == set()
+    assert tokenize(u'TypeError: foo.bar() is not a Function') == set([
+        'typeerror', 'type', 'error', 'foo', 'bar', 'is', 'not', 'a', 'function',
+    ])
+    assert tokenize(u'parse_HTTPResponse2') == set([
+        'parse_httpresponse2', 'parse', 'http', 'response', '2',
+    ])
+
+
+class RedisSearchBackendTest(TestCase):
+    def setUp(self):
+        self.backend = RedisSearchBackend()
+
+        self.project1 = self.create_project(name='foo')
+        self.project2 = self.create_project(name='bar')
+
+        self.group1 = self.create_group(
+            project=self.project1,
+            checksum='a' * 32,
+            message='TypeError: foo is undefined',
+            culprit='app/components/foo.js',
+            times_seen=5,
+            status=GroupStatus.UNRESOLVED,
+            last_seen=datetime(2013, 8, 13, 3, 8, 24, 880386),
+            first_seen=datetime(2013, 7, 13, 3, 8, 24, 880386),
+        )
+        self.event1 = self.create_event(
+            event_id='a' * 32,
+            group=self.group1,
+            message='TypeError: foo is undefined',
+            datetime=datetime(2013, 7, 13, 3, 8, 24, 880386),
+            tags={
+                'server': 'example.com',
+                'env': 'production',
+            }
+        )
+        self.event3 = self.create_event(
+            event_id='c' * 32,
+            group=self.group1,
+            message='TypeError: foo is undefined',
+            datetime=datetime(2013, 8, 13, 3, 8, 24, 880386),
+            tags={
+                'server': 'example.com',
+                'env': 'production',
+            }
+        )
+
+        self.group2 = self.create_group(
+            project=self.project1,
+            checksum='b' * 32,
+            message='ValueError: bar',
+            culprit='app/views.py in index',
+            times_seen=10,
+            status=GroupStatus.RESOLVED,
+            last_seen=datetime(2013, 7, 14, 3, 8, 24, 880386),
+            first_seen=datetime(2013, 7, 14, 3, 8, 24, 880386),
+        )
+        self.event2 = self.create_event(
+            event_id='b' * 32,
+            group=self.group2,
+            message='ValueError: bar',
+            datetime=datetime(2013, 7, 14, 3, 8, 24, 880386),
+            tags={
+                'server': 'example.com',
+                'env': 'staging',
+                'url': 'http://example.com',
+            }
+        )
+
+        for event in (self.event1, self.event3, self.event2):
+            self.backend.index_event(event.group, event)
+            self.backend.index_tags(
+                event.project_id, event.group_id, event.data['tags'])
+        self.backend.backfill(self.project1.id)
+
+    def test_query(self):
+        results = self.backend.query(self.project1, query='foo')
+        assert list(results) == [self.group1]
+
+        results = self.backend.query(self.project1, query='valueerror')
+        assert list(results) == [self.group2]
+
+        # words which aren't indexed as a whole word are left to the database
+        results = self.backend.query(self.project1, query='undef')
+        assert list(results) == [self.group1]
+
+        # the culprit is indexed as well
+        results = self.backend.query(self.project1, query='views')
+        assert list(results) == [self.group2]
+
+        # the text is matched exactly against candidates
+        results = self.backend.query(self.project1, query='foo is undefined')
+        assert list(results) == [self.group1]
+
+        results = self.backend.query(self.project1, query='undefined is foo')
+        assert list(results) == []
+
+        results = self.backend.query(self.project1, query='baz')
+        assert list(results) == []
+
+        results = self.backend.query(self.project2, query='foo')
+        assert list(results) == []
+
+    def test_query_with_too_many_prefix_matches(self):
+        self.backend.max_prefix_terms = 1
+
+        # "i" expands to too many words, so it is left to the database
+        results = self.backend.query(self.project1, query='i')
+        assert list(results) == [self.group1, self.group2]
+
+        results = self.backend.query(self.project1, query='i bar')
+        assert list(results) == []
+
+        results = self.backend.query(self.project1, query='valueerror')
+        assert list(results) == [self.group2]
+
+    def test_tags(self):
+        results = self.backend.query(self.project1, tags={'env': 'staging'})
+        assert list(results) == [self.group2]
+
+        results = self.backend.query(self.project1, tags={'env': 'example.com'})
+        assert list(results) == []
+
+        results = self.backend.query(self.project1, tags={'env': ANY})
+        assert list(results) == [self.group1, self.group2]
+
+        results = self.backend.query(self.project1, tags={'env': 'staging', 'server': ANY})
+        assert list(results) == [self.group2]
+
+        results = self.backend.query(self.project1, tags={'url': ANY}, query='bar')
+        assert list(results) == [self.group2]
+
+        results = self.backend.query(self.project1, tags={'url': ANY}, query='foo')
+        assert list(results) == []
+
+    def test_status(self):
+        results = self.backend.query(
+            self.project1, query='error', status=GroupStatus.RESOLVED)
+        assert list(results) == [self.group2]
+
+    def test_date_filter(self):
+        results = self.backend.query(
+            self.project1,
+            date_from=self.event2.datetime,
+        )
+        assert list(results) == [self.group1, self.group2]
+
+        results = self.backend.query(
+            self.project1,
+            date_from=self.event2.datetime,
+            date_from_inclusive=False,
+        )
+        assert list(results) == [self.group1]
+
+        results = self.backend.query(
+            self.project1,
+            date_to=self.event1.datetime + timedelta(minutes=1),
+        )
+        assert list(results) == [self.group1]
+
+        results = self.backend.query(
+            self.project1,
+            date_from=self.event1.datetime,
+            date_to=self.event2.datetime + timedelta(minutes=1),
+        )
+        assert list(results) == [self.group1, self.group2]
+
+        # group1 was seen before and after, but not during the range
+        results = self.backend.query(
+            self.project1,
+            date_from=self.event2.datetime - timedelta(minutes=1),
+            date_to=self.event2.datetime + timedelta(minutes=1),
+        )
+        assert list(results) == [self.group2]
+
+    def test_pagination(self):
+        results = self.backend.query(self.project1, query='error', limit=1, sort_by='date')
+        assert list(results) == [self.group1]
+
+        results = self.backend.query(
+            self.project1, query='error', cursor=results.next, limit=1, sort_by='date')
+        assert list(results) == [self.group2]
+
+        results = self.backend.query(
+            self.project1, query='error', cursor=results.next, limit=1, sort_by='date')
+        assert list(results) == []
+
+    def test_max_candidates(self):
+        self.backend.max_candidates = 1
+
+        # only the most recently seen group is considered
+        results = self.backend.query(self.project1, tags={'env': ANY})
+        assert list(results) == [self.group1]
+
+        # other sort orders are left to the database
+        results = self.backend.query(
+            self.project1, date_from=self.event2.datetime, sort_by='freq')
+        assert list(results) == [self.group2, self.group1]
+
+        # as are filters which only the database answers, which the most
+        # recently seen groups may not match
+        results = self.backend.query(
+            self.project1, tags={'env': ANY}, status=GroupStatus.RESOLVED)
+        assert list(results) == [self.group2]
+
+    def test_remove_group(self):
+        self.backend.max_candidates = 1
+        self.backend.remove_group(self.group1)
+
+        # the group no longer counts against the candidates
+        results = self.backend.query(self.project1, tags={'env': ANY})
+        assert list(results) == [self.group2]
+
+    def test_merge_group(self):
+        GroupTagValue.objects.create(
+            project=self.project1, group=self.group1, key='browser', value='chrome')
+        self.backend.merge_group(self.group2, self.group1)
+
+        assert self.backend._get_candidate_group_ids(
+            self.project1, query='valueerror') == [self.group1.id]
+        assert self.backend._get_candidate_group_ids(
+            self.project1, tags={'browser': 'chrome'}) == [self.group1.id]
+
+    @mock.patch('sentry.tasks.search.backfill_search_index.delay')
+    def test_backfill(self, backfill_search_index):
+        group = self.create_group(
+            project=self.project2,
+            message='ValueError: baz',
+            last_seen=datetime(2013, 7, 14, 3, 8, 24, 880386),
+        )
+        GroupTagValue.objects.create(
+            project=self.project2, group=group, key='env', value='staging')
+
+        # the project isn't indexed yet, so its queries are left to the database
+        assert self.backend._get_candidate_group_ids(
+            self.project2, query='baz') is None
+        results = self.backend.query(self.project2, tags={'env': 'staging'})
+        assert list(results) == [group]
+        backfill_search_index.assert_called_once_with(project_id=self.project2.id)
+
+        self.backend.backfill(self.project2.id)
+
+        assert self.backend._get_candidate_group_ids(
+            self.project2, query='baz') == [group.id]
+        assert self.backend._get_candidate_group_ids(
+            self.project2, tags={'env': 'staging'}) == [group.id]
+
+    def test_query_without_prefix_match(self):
+        # "rror" is not the beginning of any indexed word, but the text may
+        # start in the middle of a word
+        results = self.backend.query(self.project1, query='rror')
+        assert list(results) == [self.group1, self.group2]
+
+        results = self.backend.query(self.project1, query='rror: bar')
+        assert list(results) == [self.group2]
+
+    @mock.patch('sentry.search.redis.backend.SQLITE_MAX_CANDIDATES', 1)
+    @mock.patch('sentry.search.redis.backend.is_sqlite', return_value=True)
+    def test_too_many_candidates_for_sqlite(self, is_sqlite):
+        query = DjangoSearchBackend.query
+        with mock.patch.object(DjangoSearchBackend, 'query', autospec=True,
+                               side_effect=query) as django_query:
+            results = self.backend.query(
+                self.project1, date_from=self.event2.datetime)
+            assert list(results) == [self.group1, self.group2]
+            assert django_query.call_count == 1
+
+            results = self.backend.query(self.project1, tags={'env': 'staging'})
+            assert list(results) == [self.group2]
+            assert django_query.call_count == 1
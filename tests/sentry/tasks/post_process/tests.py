@@ -2,12 +2,16 @@
 
 from __future__ import absolute_import
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from mock import Mock, patch
 
 from sentry.models import EventTag, TagKey, TagValue
 from sentry.testutils import TestCase
 from sentry.tasks.merge import merge_group
-from sentry.tasks.post_process import index_event_tags, post_process_group
+from sentry.tasks.post_process import (
+    index_event_tags, index_tags, post_process_group
+)
 
 
 class PostProcessGroupTest(TestCase):
@@ -120,3 +124,58 @@ class IndexEventTagsTest(TestCase):
             event_id=event.id,
         )
         assert queryset.count() == 2
+
+    def test_indexes_many_events(self):
+        group = self.create_group(project=self.project)
+        event = self.create_event(group=group, event_id='a' * 32)
+        event2 = self.create_event(group=group, event_id='b' * 32)
+        TagKey.objects.create(project=self.project, key='foo')
+
+        index_tags([
+            (self.project.id, event.id, group.id, [('foo', 'bar'), ('biz', 'baz')]),
+            (self.project.id, event2.id, group.id, [('foo', 'bar'), ('foo', 'bar')]),
+        ])
+
+        assert TagKey.objects.filter(project=self.project).count() == 2
+        assert TagValue.objects.filter(project=self.project).count() == 2
+        assert EventTag.objects.filter(event_id=event.id).count() == 2
+        assert EventTag.objects.filter(event_id=event2.id).count() == 1
+
+        # the IDs of known keys and values are cached
+        event3 = self.create_event(group=group, event_id='c' * 32)
+        with CaptureQueriesContext(connection) as queries:
+            index_tags([
+                (self.project.id, event3.id, group.id, [('foo', 'bar')]),
+            ])
+        assert not [q for q in queries.captured_queries if 'sentry_filter' in q['sql']]
+        assert EventTag.objects.filter(event_id=event3.id).count() == 1
+
+    def test_purged_values_are_not_cached(self):
+        group = self.create_group(project=self.project)
+        event = self.create_event(group=group, event_id='a' * 32)
+        event2 = self.create_event(group=group, event_id='b' * 32)
+
+        index_tags([(self.project.id, event.id, group.id, [('foo', 'bar')])])
+        # as ``sentry cleanup`` does
+        TagValue.objects.filter(project=self.project).delete()
+        TagValue.objects.clear_id_cache()
+
+        index_tags([(self.project.id, event2.id, group.id, [('foo', 'bar')])])
+
+        tagvalue = TagValue.objects.get(project=self.project, key='foo', value='bar')
+        assert EventTag.objects.get(event_id=event2.id).value_id == tagvalue.id
+
+    @patch('sentry.app.search.index_tags')
+    def test_updates_search_index(self, index_tags):
+        group = self.create_group(project=self.project)
+        event = self.create_event(group=group)
+
+        with self.tasks():
+            index_event_tags.delay(
+                event_id=event.id,
+                group_id=group.id,
+                project_id=self.project.id,
+                tags=[('foo', 'bar')],
+            )
+
+        index_tags.assert_called_once_with(self.project.id, group.id, [('foo', 'bar')])
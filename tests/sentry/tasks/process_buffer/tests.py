@@ -4,7 +4,9 @@ from __future__ import absolute_import
 
 import mock
 
-from sentry.tasks.process_buffer import process_incr
+from sentry.tasks.process_buffer import (
+    process_incr, process_incr_batch, process_pending
+)
 from sentry.testutils import TestCase
 
 
@@ -16,3 +18,22 @@ class ProcessIncrTest(TestCase):
         filters = {'pk': 1}
         process_incr(model=model, columns=columns, filters=filters)
         process.assert_called_once_with(model=model, columns=columns, filters=filters)
+
+
+class ProcessIncrBatchTest(TestCase):
+    @mock.patch('sentry.app.buffer.process_batch', create=True)
+    def test_calls_process_batch(self, process_batch):
+        process_incr_batch(keys=['foo', 'bar'])
+        process_batch.assert_called_once_with(['foo', 'bar'])
+
+
+class ProcessPendingTest(TestCase):
+    @mock.patch('sentry.app.buffer.process_pending')
+    def test_calls_process_pending(self, process_pending_):
+        process_pending()
+        process_pending_.assert_called_once_with()
+
+    @mock.patch('sentry.app.buffer.process_pending')
+    def test_calls_process_pending_with_partition(self, process_pending_):
+        process_pending(partition=2)
+        process_pending_.assert_called_once_with(partition=2)
@@ -83,11 +83,22 @@ class DeleteProjectTest(TestCase):
         GroupMeta.objects.create(group=group, key='foo', value='bar')
         release = Release.objects.create(version='a' * 32, project=project)
         GroupResolution.objects.create(group=group, release=release)
+        event = self.create_event(group=group)
+        EventTag.objects.create(
+            event_id=event.id,
+            project_id=project.id,
+            key_id=1,
+            value_id=1,
+        )
 
         with self.tasks():
             delete_project(object_id=project.id)
 
         assert not Project.objects.filter(id=project.id).exists()
+        assert not Group.objects.filter(id=group.id).exists()
+        assert not Event.objects.filter(id=event.id).exists()
+        assert not EventTag.objects.filter(event_id=event.id).exists()
+        assert not Release.objects.filter(id=release.id).exists()
 
     def test_cancels_without_pending_status(self):
         project = self.create_project(
@@ -1,7 +1,13 @@
 from __future__ import absolute_import
 
-from sentry.tasks.merge import merge_group, rehash_group_events
-from sentry.models import Event, Group, GroupMeta, GroupRedirect, GroupTagKey, GroupTagValue
+from functools import partial
+from mock import patch
+
+from sentry.tasks.merge import merge_group, merge_objects, rehash_group_events
+from sentry.models import (
+    Event, Group, GroupHash, GroupMeta, GroupRedirect, GroupStatus,
+    GroupTagKey, GroupTagValue
+)
 from sentry.testutils import TestCase
 
 
@@ -106,6 +112,55 @@ class MergeGroupTest(TestCase):
             key='key2',
         ).times_seen == 10
 
+    @patch('sentry.tasks.merge.merge_group.delay')
+    def test_merge_continues_in_task(self, delay):
+        group1 = self.create_group()
+        group2 = self.create_group()
+        events = [self.create_event(group=group1) for _ in xrange(3)]
+
+        limited = partial(merge_objects, chunk_size=1, limit=2)
+        with patch('sentry.tasks.merge.merge_objects', limited):
+            merge_group(group1.id, group2.id)
+
+        delay.assert_called_once_with(
+            from_object_id=group1.id,
+            to_object_id=group2.id,
+        )
+        assert Group.objects.filter(id=group1.id).exists()
+
+        merge_group(group1.id, group2.id)
+
+        assert not Group.objects.filter(id=group1.id).exists()
+        assert sorted(Event.objects.filter(
+            group_id=group2.id,
+        ).values_list('id', flat=True)) == [e.id for e in events]
+
+    @patch('sentry.tasks.merge.merge_group.delay')
+    def test_merge_clears_cached_hashes(self, delay):
+        project = self.create_project()
+        group1 = self.create_group(project)
+        group2 = self.create_group(project)
+        GroupHash.objects.create(project=project, group=group1, hash='a' * 32)
+        self.create_event(group=group1)
+        self.create_event(group=group1)
+
+        def merge_objects_and_cache(*args, **kwargs):
+            # an event which was saved while the hashes were moved
+            GroupHash.objects.set_group_ids(project.id, ['a' * 32], group1.id)
+            return merge_objects(*args, **dict(kwargs, chunk_size=1, limit=1))
+
+        with patch('sentry.tasks.merge.merge_objects', merge_objects_and_cache):
+            merge_group(group1.id, group2.id)
+
+        assert Group.objects.get(id=group1.id).status == GroupStatus.PENDING_MERGE
+        assert GroupHash.objects.get_group_ids(project.id, ['a' * 32]) == {}
+
+        GroupHash.objects.set_group_ids(project.id, ['a' * 32], group1.id)
+        merge_group(group1.id, group2.id)
+
+        assert not Group.objects.filter(id=group1.id).exists()
+        assert GroupHash.objects.get_group_ids(project.id, ['a' * 32]) == {}
+
     def test_merge_with_group_meta(self):
         project1 = self.create_project()
         group1 = self.create_group(project1)
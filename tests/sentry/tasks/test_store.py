@@ -2,9 +2,11 @@ from __future__ import absolute_import
 
 import mock
 
+from sentry.cache import default_cache
 from sentry.plugins import Plugin2
-from sentry.tasks.store import preprocess_event
+from sentry.tasks.store import get_event_preprocessors, preprocess_event
 from sentry.testutils import PluginTestCase
+from sentry.utils.codecs import decode_event, encode_event
 
 
 class BasicPreprocessorPlugin(Plugin2):
@@ -19,6 +21,29 @@ class BasicPreprocessorPlugin(Plugin2):
         return True
 
 
+def remove_message(data):
+    del data['message']
+    return data
+
+
+class PlatformPreprocessorPlugin(Plugin2):
+    def get_event_preprocessors(self, data, **kwargs):
+        if data.get('platform') == 'cocoa':
+            return [remove_message]
+        return []
+
+    def is_enabled(self, project=None):
+        return True
+
+
+class GetEventPreprocessorsTest(PluginTestCase):
+    plugin = PlatformPreprocessorPlugin
+
+    def test_passes_data(self):
+        assert get_event_preprocessors({'platform': 'cocoa'}) == [remove_message]
+        assert get_event_preprocessors({'platform': 'python'}) == []
+
+
 class PreprocessEventTest(PluginTestCase):
     plugin = BasicPreprocessorPlugin
 
@@ -35,3 +60,35 @@ class PreprocessEventTest(PluginTestCase):
         preprocess_event(data=data)
 
         assert mock_save_event.delay.call_count == 1
+
+        data = mock_save_event.delay.call_args[1]['data']
+        assert decode_event(data) == {
+            'project': project.id,
+            'message': 'test',
+        }
+
+    @mock.patch('sentry.tasks.store.save_event')
+    def test_encoded_cache(self, mock_save_event):
+        project = self.create_project()
+
+        cache_key = 'e:1:%s' % (project.id,)
+        default_cache.set(cache_key, encode_event({
+            'project': project.id,
+            'message': 'test',
+            'extra': {'foo': 'bar'},
+        }), 3600, raw=True)
+
+        preprocess_event(cache_key=cache_key)
+
+        assert mock_save_event.delay.call_count == 1
+        assert mock_save_event.delay.call_args[1]['data'] is None
+        assert decode_event(default_cache.get(cache_key, raw=True)) == {
+            'project': project.id,
+            'message': 'test',
+        }
+
+    def test_plugin_without_data_argument(self):
+        # plugins written before the event was passed to
+        # ``get_event_preprocessors`` are still called
+        preprocessors = get_event_preprocessors({'platform': 'python'})
+        assert len(preprocessors) == 2
@@ -18,8 +18,8 @@ from sentry.event_manager import (
     generate_culprit,
 )
 from sentry.models import (
-    Activity, Event, Group, GroupRelease, GroupResolution, GroupStatus,
-    EventMapping, Release
+    Activity, Event, Group, GroupHash, GroupRelease, GroupResolution,
+    GroupStatus, EventMapping, Release
 )
 from sentry.testutils import TestCase, TransactionTestCase
 
@@ -74,6 +74,13 @@ class EventManagerTest(TransactionTestCase):
             event_id=event_id,
         ).exists()
 
+    @patch('sentry.event_manager.search.index_event')
+    def test_updates_search_index(self, index_event):
+        manager = EventManager(self.make_event())
+        event = manager.save(1)
+
+        index_event.assert_called_once_with(event.group, event)
+
     def test_tags_as_list(self):
         manager = EventManager(self.make_event(tags=[('foo', 'bar')]))
         data = manager.normalize()
@@ -190,6 +197,83 @@ class EventManagerTest(TransactionTestCase):
             'title': 'foo bar',
         }
 
+    def test_caches_group_of_hashes(self):
+        manager = EventManager(self.make_event(
+            event_id='a' * 32, checksum='a' * 32,
+        ))
+        event = manager.save(1)
+
+        manager = EventManager(self.make_event(
+            event_id='b' * 32, checksum='a' * 32,
+        ))
+        with patch('sentry.models.GroupHash.objects.get_or_create') as get_or_create:
+            event2 = manager.save(1)
+
+        assert not get_or_create.called
+        assert event2.group_id == event.group_id
+
+    def test_ignores_cached_hashes_of_deleted_group(self):
+        manager = EventManager(self.make_event(
+            event_id='a' * 32, checksum='a' * 32,
+        ))
+        event = manager.save(1)
+
+        # deleted without clearing the cached hashes, as if it was deleted by
+        # another process
+        GroupHash.objects.filter(group=event.group_id).delete()
+        Group.objects.filter(id=event.group_id).delete()
+
+        manager = EventManager(self.make_event(
+            event_id='b' * 32, checksum='a' * 32,
+        ))
+        event2 = manager.save(1)
+
+        group = Group.objects.get(id=event2.group_id)
+        assert group.times_seen == 1
+        assert GroupHash.objects.get(hash='a' * 32).group_id == group.id
+
+    def test_ignores_cached_hashes_of_merged_group(self):
+        manager = EventManager(self.make_event(
+            event_id='a' * 32, checksum='a' * 32,
+        ))
+        event = manager.save(1)
+        other_group = self.create_group(project=event.project)
+
+        # the hash was moved while another process still caches it
+        Group.objects.filter(id=event.group_id).update(
+            status=GroupStatus.PENDING_MERGE,
+        )
+        GroupHash.objects.filter(group=event.group_id).update(group=other_group)
+        GroupHash.objects.set_group_ids(event.project_id, ['a' * 32], event.group_id)
+
+        manager = EventManager(self.make_event(
+            event_id='b' * 32, checksum='a' * 32,
+        ))
+        event2 = manager.save(1)
+
+        assert event2.group_id == other_group.id
+        assert GroupHash.objects.get_group_ids(event.project_id, ['a' * 32]) == {
+            'a' * 32: other_group.id,
+        }
+
+    def test_does_not_cache_hashes_of_merged_group(self):
+        manager = EventManager(self.make_event(
+            event_id='a' * 32, checksum='a' * 32,
+        ))
+        event = manager.save(1)
+        Group.objects.filter(id=event.group_id).update(
+            status=GroupStatus.PENDING_MERGE,
+        )
+        GroupHash.objects.clear_group_ids_for_group(event.group_id)
+
+        manager = EventManager(self.make_event(
+            event_id='b' * 32, checksum='a' * 32,
+        ))
+        event2 = manager.save(1)
+
+        assert event2.group_id == event.group_id
+        assert GroupHash.objects.get_group_ids(1, ['a' * 32]) == {}
+
     def test_updates_group_with_fingerprint(self):
         manager = EventManager(self.make_event(
             message='foo', event_id='a' * 32,
@@ -2,6 +2,8 @@ from __future__ import absolute_import
 
 import pytz
 
+import mock
+
 from datetime import datetime, timedelta
 
 from sentry.testutils import TestCase
@@ -45,3 +47,24 @@ class BaseTSDBTest(TestCase):
         timestamp = datetime(2013, 5, 18, 15, 13, 58, 132928, tzinfo=pytz.UTC)
         result = self.tsdb.calculate_expiry(10, 30, timestamp)
         assert result == 1368890330
+
+    def test_get_range_epochs(self):
+        end = datetime(2013, 5, 18, 15, 13, 58, 132928, tzinfo=pytz.UTC)
+        start = end - timedelta(hours=2)
+        assert self.tsdb.get_range_epochs(start, end, 3600) == [
+            1368882000, 1368885600, 1368889200,
+        ]
+
+    def test_get_range_series(self):
+        end = datetime(2013, 5, 18, 15, 13, 58, 132928, tzinfo=pytz.UTC)
+        start = end - timedelta(hours=1)
+        with mock.patch.object(self.tsdb, 'get_range') as get_range:
+            get_range.return_value = {
+                1: [(1368885600, 3), (1368889200, 5)],
+            }
+            result = self.tsdb.get_range_series(None, [1, 2], start, end, 3600)
+
+        assert result.series == [1368885600, 1368889200]
+        assert result.values == [[3, 5], [0, 0]]
+        assert result.get_points(1) == [(1368885600, 3), (1368889200, 5)]
+        assert result.sums() == {1: 8, 2: 0}
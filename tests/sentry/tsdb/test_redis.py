@@ -82,6 +82,37 @@ class RedisTSDBTest(TestCase):
             2: 4,
         }
 
+    def test_get_range_series_multi(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        dts = [now + timedelta(hours=i) for i in xrange(4)]
+
+        def timestamp(d):
+            t = int(to_timestamp(d))
+            return t - (t % 3600)
+
+        self.db.incr(TSDBModel.project, 1, dts[0])
+        self.db.incr(TSDBModel.project, 2, dts[1], count=3)
+        self.db.incr(TSDBModel.group, 1, dts[3], count=2)
+
+        projects, groups = self.db.get_range_series_multi([
+            (TSDBModel.project, [1, 2, 3], dts[0], dts[-1], None),
+            (TSDBModel.group, [1], dts[2], dts[-1], ONE_HOUR),
+        ])
+
+        assert projects.keys == [1, 2, 3]
+        assert projects.series == map(timestamp, dts)
+        assert projects.values == [
+            [1, 0, 0, 0],
+            [0, 3, 0, 0],
+            [0, 0, 0, 0],
+        ]
+
+        assert groups.series == map(timestamp, dts[2:])
+        assert groups.get_points(1) == [
+            (timestamp(dts[2]), 0),
+            (timestamp(dts[3]), 2),
+        ]
+
     def test_count_distinct(self):
         now = datetime.utcnow().replace(tzinfo=pytz.UTC)
         dts = [now + timedelta(hours=i) for i in xrange(4)]
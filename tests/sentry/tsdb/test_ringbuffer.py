@@ -0,0 +1,273 @@
+from __future__ import absolute_import
+
+import pytz
+import shutil
+import struct
+import tempfile
+import threading
+
+from datetime import datetime, timedelta
+
+from sentry.testutils import TestCase
+from sentry.tsdb.base import TSDBModel, ONE_MINUTE, ONE_HOUR, ONE_DAY
+from sentry.tsdb.ringbuffer import COUNTER_CELL, RingBufferFile, RingBufferTSDB
+from sentry.utils.dates import to_timestamp
+
+
+class RingBufferTSDBTest(TestCase):
+    rollups = (
+        # time in seconds, samples to keep
+        (10, 30),  # 5 minutes at 10 seconds
+        (ONE_MINUTE, 120),  # 2 hours at 1 minute
+        (ONE_HOUR, 24),  # 1 days at 1 hour
+        (ONE_DAY, 30),  # 30 days at 1 day
+    )
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.db = RingBufferTSDB(path=self.path, rollups=self.rollups)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_simple(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        dts = [now + timedelta(hours=i) for i in xrange(4)]
+
+        def timestamp(d):
+            t = int(to_timestamp(d))
+            return t - (t % 3600)
+
+        self.db.incr(TSDBModel.project, 1, dts[0])
+        self.db.incr(TSDBModel.project, 1, dts[1], count=3)
+        self.db.incr(TSDBModel.project, 1, dts[2])
+        self.db.incr_multi([
+            (TSDBModel.project, 1),
+            (TSDBModel.project, 2),
+        ], dts[3], count=4)
+
+        results = self.db.get_range(TSDBModel.project, [1], dts[0], dts[-1])
+        assert results == {
+            1: [
+                (timestamp(dts[0]), 1),
+                (timestamp(dts[1]), 3),
+                (timestamp(dts[2]), 1),
+                (timestamp(dts[3]), 4),
+            ],
+        }
+        results = self.db.get_range(TSDBModel.project, [2, 3], dts[0], dts[-1])
+        assert results == {
+            2: [
+                (timestamp(dts[0]), 0),
+                (timestamp(dts[1]), 0),
+                (timestamp(dts[2]), 0),
+                (timestamp(dts[3]), 4),
+            ],
+            3: [
+                (timestamp(dts[0]), 0),
+                (timestamp(dts[1]), 0),
+                (timestamp(dts[2]), 0),
+                (timestamp(dts[3]), 0),
+            ],
+        }
+
+        results = self.db.get_sums(TSDBModel.project, [1, 2], dts[0], dts[-1])
+        assert results == {
+            1: 9,
+            2: 4,
+        }
+
+    def test_ring_overwrites_expired_samples(self):
+        now = datetime(2016, 1, 1, 0, 0, tzinfo=pytz.UTC)
+        later = now + timedelta(seconds=10 * 30)
+
+        self.db.incr(TSDBModel.internal, 'foo', now, count=2)
+        self.db.incr(TSDBModel.internal, 'foo', later, count=5)
+
+        assert self.db.get_range(TSDBModel.internal, ['foo'], now, now, rollup=10) == {
+            'foo': [(int(to_timestamp(now)), 0)],
+        }
+        assert self.db.get_range(TSDBModel.internal, ['foo'], later, later, rollup=10) == {
+            'foo': [(int(to_timestamp(later)), 5)],
+        }
+        # coarser rollups retain both increments
+        assert self.db.get_sums(TSDBModel.internal, ['foo'], now, later, rollup=ONE_HOUR) == {
+            'foo': 7,
+        }
+
+    def test_data_persists(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        self.db.incr(TSDBModel.group, 1, now, count=3)
+        self.db.record(TSDBModel.users_affected_by_group, 1, ('foo', 'bar'), now)
+
+        db = RingBufferTSDB(path=self.path, rollups=self.rollups)
+        assert db.get_sums(TSDBModel.group, [1], now, now) == {1: 3}
+        assert db.get_distinct_counts_totals(
+            TSDBModel.users_affected_by_group, [1], now, now) == {1: 2}
+
+    def test_count_distinct(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        dts = [now + timedelta(hours=i) for i in xrange(4)]
+
+        model = TSDBModel.users_affected_by_group
+
+        def timestamp(d):
+            t = int(to_timestamp(d))
+            return t - (t % 3600)
+
+        self.db.record(model, 1, ('foo', 'bar'), dts[0])
+        self.db.record(model, 1, ('baz',), dts[1])
+        self.db.record_multi((
+            (model, 1, ('foo', 'bar', 'baz')),
+            (model, 2, ('bar',)),
+        ), dts[2])
+        self.db.record(model, 2, ('foo',), dts[3])
+
+        assert self.db.get_distinct_counts_series(model, [1], dts[0], dts[-1], rollup=3600) == {
+            1: [
+                (timestamp(dts[0]), 2),
+                (timestamp(dts[1]), 1),
+                (timestamp(dts[2]), 3),
+                (timestamp(dts[3]), 0),
+            ],
+        }
+
+        results = self.db.get_distinct_counts_totals(model, [1, 2], dts[0], dts[-1], rollup=3600)
+        assert results == {
+            1: 3,
+            2: 2,
+        }
+
+        assert self.db.get_distinct_counts_union(model, [], dts[0], dts[-1], rollup=3600) == 0
+        assert self.db.get_distinct_counts_union(model, [1, 2], dts[0], dts[-1], rollup=3600) == 3
+
+    def test_frequency_tables(self):
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        model = TSDBModel.frequent_projects_by_organization
+
+        rollup = 3600
+
+        self.db.record_frequency_multi((
+            (model, {
+                'organization:1': {
+                    'project:1': 1,
+                    'project:2': 2,
+                    'project:3': 3,
+                },
+            }),
+        ), now)
+
+        self.db.record_frequency_multi((
+            (model, {
+                'organization:1': {
+                    'project:1': 1,
+                    'project:2': 2,
+                    'project:3': 3,
+                    'project:4': 4,
+                },
+                'organization:2': {
+                    'project:5': 1.5,
+                },
+            }),
+        ), now - timedelta(hours=1))
+
+        assert self.db.get_most_frequent(
+            model,
+            ('organization:1', 'organization:2'),
+            now,
+            limit=1,
+            rollup=rollup,
+        ) == {
+            'organization:1': [
+                ('project:3', 3.0),
+            ],
+            'organization:2': [],
+        }
+
+        assert self.db.get_most_frequent(
+            model,
+            ('organization:1', 'organization:2'),
+            now - timedelta(hours=1),
+            now,
+            rollup=rollup,
+        ) == {
+            'organization:1': [
+                ('project:3', 3.0 + 3.0),
+                ('project:4', 4.0),
+                ('project:2', 2.0 + 2.0),
+                ('project:1', 1.0 + 1.0),
+            ],
+            'organization:2': [
+                ('project:5', 1.5),
+            ],
+        }
+
+        assert self.db.get_frequency_totals(
+            model,
+            {
+                'organization:1': ('project:1', 'project:5'),
+            },
+            now - timedelta(hours=1),
+            now,
+            rollup=rollup,
+        ) == {
+            'organization:1': {
+                'project:1': 1.0 + 1.0,
+                'project:5': 0.0,
+            },
+        }
+
+    def test_frequency_table_capacity(self):
+        db = RingBufferTSDB(path=self.path, rollups=self.rollups, frequency_capacity=2)
+        now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+        model = TSDBModel.frequent_issues_by_project
+
+        db.record_frequency_multi(((model, {1: {'a': 5, 'b': 1}}),), now)
+        db.record_frequency_multi(((model, {1: {'c': 2}}),), now)
+
+        # "c" replaces the least frequent member, and inherits its score
+        assert db.get_most_frequent(model, [1], now, rollup=ONE_HOUR) == {
+            1: [('a', 5.0), ('c', 3.0)],
+        }
+
+
+class RingBufferFileTest(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_grow_while_reading(self):
+        f = RingBufferFile(self.path + '/counters', 4, COUNTER_CELL.size)
+        f.grow_rows = 1
+        with f.writer():
+            COUNTER_CELL.pack_into(f.writable(0), f.offset(0, 1), 1, 5)
+
+        errors = []
+        done = threading.Event()
+        row_format = struct.Struct('<8q')
+
+        def read():
+            try:
+                while not done.is_set():
+                    buf = f.buffer(0)
+                    assert row_format.unpack_from(buf, 0)[2:4] == (1, 5)
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for _ in xrange(4)]
+        for reader in readers:
+            reader.start()
+        try:
+            for row in xrange(1, 500):
+                with f.writer():
+                    COUNTER_CELL.pack_into(f.writable(row), f.offset(row, 1), 1, row)
+        finally:
+            done.set()
+            for reader in readers:
+                reader.join()
+
+        assert errors == []
+        buf = f.buffer(499)
+        assert COUNTER_CELL.unpack_from(buf, f.offset(499, 1)) == (1, 499)
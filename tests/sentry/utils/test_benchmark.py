@@ -0,0 +1,65 @@
+from __future__ import absolute_import
+
+from sentry import app
+from sentry.celery import app as celery_app
+from sentry.models import Event
+from sentry.testutils import TestCase
+from sentry.utils.benchmark import (
+    IngestBenchmark, STAGES, get_payloads, local_backends, percentile
+)
+
+
+class PercentileTest(TestCase):
+    def test_simple(self):
+        values = range(1, 101)
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile(values, 100) == 100
+        assert percentile([1], 99) == 1
+        assert percentile([], 50) is None
+
+
+class IngestBenchmarkTest(TestCase):
+    def test_payloads(self):
+        payloads = get_payloads()
+        assert 'python' in payloads
+        assert len(payloads['many-tags']['tags']) == 50
+
+        with self.assertRaises(ValueError):
+            get_payloads(['unknown'])
+
+    def test_run(self):
+        project = self.create_project()
+        runner = IngestBenchmark(project, get_payloads([
+            'python', 'javascript', 'large-stacktrace', 'breadcrumbs', 'many-tags',
+        ]))
+        with local_backends():
+            runner.run(iterations=2)
+
+        assert Event.objects.filter(project_id=project.id).count() == 10
+
+        summary = runner.summarize()
+        assert summary['throughput'] > 0
+        assert summary['payloads'].keys() == [
+            'python', 'javascript', 'large-stacktrace', 'breadcrumbs', 'many-tags',
+        ]
+        for stages in summary['payloads'].itervalues():
+            assert stages.keys() == list(STAGES)
+            for stats in stages.itervalues():
+                assert stats['count'] == 2
+                assert stats['p50'] <= stats['p99'] <= stats['max']
+
+
+class LocalBackendsTest(TestCase):
+    def test_restores_backends(self):
+        from sentry import event_manager
+
+        tsdb = app.tsdb
+        always_eager = celery_app.conf.CELERY_ALWAYS_EAGER
+        with local_backends():
+            assert app.tsdb is not tsdb
+            assert event_manager.tsdb is app.tsdb
+            assert celery_app.conf.CELERY_ALWAYS_EAGER
+        assert app.tsdb is tsdb
+        assert event_manager.tsdb is tsdb
+        assert celery_app.conf.CELERY_ALWAYS_EAGER == always_eager
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import pytest
+import zlib
+
+from sentry.testutils import TestCase
+from sentry.utils import json
+from sentry.utils.codecs import (
+    EventCodec, EventDecodeError, INTERNED_STRINGS, MAGIC, decode_event,
+    encode_event
+)
+from sentry.utils.compat import StringIO
+from sentry.utils.samples import load_data
+
+
+class EventCodecTest(TestCase):
+    codec = EventCodec()
+
+    def test_roundtrip(self):
+        value = {
+            'message': u'f\xfc\xfc',
+            'values': [None, True, False, 0, -1, 2 ** 70, 1.5],
+            'nested': {'message': {'message': [u'f\xfc\xfc']}},
+        }
+        assert self.codec.decode(self.codec.encode(value)) == value
+
+    def test_samples(self):
+        for platform in ('python', 'javascript', 'java', 'cocoa', 'php'):
+            data = load_data(platform)
+            encoded = self.codec.encode(data)
+            assert self.codec.decode(encoded) == data
+            assert len(encoded) < len(json.dumps(data)) / 2
+
+    def test_decode_stream(self):
+        data = load_data('python')
+        encoded = self.codec.encode(data)
+        assert self.codec.decode_stream(StringIO(encoded), chunk_size=3) == data
+
+    def test_interned_strings(self):
+        interned = INTERNED_STRINGS[self.codec.version]
+        assert len(set(interned)) == len(interned)
+
+    def test_version(self):
+        encoded = self.codec.encode(load_data('python'))
+        assert encoded.startswith(MAGIC + '\x01')
+
+        with pytest.raises(EventDecodeError):
+            self.codec.decode(MAGIC + '\xff' + encoded[len(MAGIC) + 1:])
+        with pytest.raises(EventDecodeError):
+            decode_event(MAGIC + '\xff' + encoded[len(MAGIC) + 1:])
+        with pytest.raises(EventDecodeError):
+            self.codec.decode('foo')
+        with pytest.raises(EventDecodeError):
+            self.codec.decode(encoded[:len(encoded) // 2])
+        with pytest.raises(EventDecodeError):
+            self.codec.decode(encoded[:-1])
+
+    def test_compression(self):
+        # the interned strings make small payloads smaller than they would
+        # be if they were only compressed
+        data = load_data('php')
+        assert len(self.codec.encode(data)) < len(zlib.compress(json.dumps(data), 1))
+
+
+class DecodeEventTest(TestCase):
+    def test_encoded(self):
+        assert decode_event(encode_event({'foo': 'bar'})) == {'foo': 'bar'}
+
+    def test_legacy(self):
+        assert decode_event(None) is None
+        assert decode_event({'foo': 'bar'}) == {'foo': 'bar'}
+        assert decode_event(json.dumps({'foo': 'bar'})) == {'foo': 'bar'}
@@ -217,3 +217,43 @@ class SensitiveDataFilterTest(TestCase):
         proc = SensitiveDataFilter()
         proc.apply(data)
         self.assertEquals(data['extra'], {'foo': 1})
+
+    def test_scrubs_nested_values_in_place(self):
+        nested = {'password': 'hello', 'list': ['foo', 'api_key=1']}
+        data = {
+            'extra': {
+                'nested': nested,
+                'pairs': (('secret', 'hello'), ('foo', 'bar')),
+                'values': ('foo', 'bar'),
+            },
+        }
+        nested['self'] = nested
+
+        proc = SensitiveDataFilter()
+        proc.apply(data)
+
+        extra = data['extra']
+        assert extra['nested'] is nested
+        assert nested['password'] == FILTER_MASK
+        assert nested['list'] == ['foo', FILTER_MASK]
+        assert nested['self'] == '<...>'
+        assert extra['pairs'] == [['secret', FILTER_MASK], ['foo', 'bar']]
+        assert extra['values'] == ['foo', 'bar']
+
+    def test_fields_are_matched_case_insensitively(self):
+        proc = SensitiveDataFilter(['custom_field'], include_defaults=False)
+        assert proc.sanitize('Custom_Field', 'foo') == FILTER_MASK
+        assert proc.sanitize('foo', 'my CUSTOM_FIELD') == FILTER_MASK
+        assert proc.sanitize('foo', 'password') == 'password'
+
+        proc = SensitiveDataFilter(['Custom_Field'], include_defaults=False)
+        assert proc.sanitize('custom_field', 'foo') == 'foo'
+
+        proc = SensitiveDataFilter(include_defaults=False)
+        assert proc.fields_re is None
+        assert proc.sanitize('password', 'foo') == 'foo'
+
+    def test_reuses_compiled_fields(self):
+        first = SensitiveDataFilter(['foo', 'bar'])
+        second = SensitiveDataFilter(['bar', 'foo'])
+        assert first.fields_re is second.fields_re
@@ -0,0 +1,39 @@
+from __future__ import absolute_import
+
+import mock
+
+from sentry.testutils import TestCase
+from sentry.utils.ingest import count_frames, get_payload_tags, stage
+
+
+class GetPayloadTagsTest(TestCase):
+    def test_count_frames(self):
+        frames = {'frames': [{}, {}]}
+        assert count_frames({}) == 0
+        assert count_frames({
+            'sentry.interfaces.Stacktrace': frames,
+            'sentry.interfaces.Exception': {
+                'values': [{'stacktrace': frames}, {}],
+            },
+            'threads': {'values': [{'stacktrace': frames}]},
+        }) == 6
+
+    def test_tags(self):
+        assert get_payload_tags(size=2000) == {'size': '10240'}
+        assert get_payload_tags(size=10 ** 7) == {'size': 'more'}
+        assert get_payload_tags({
+            'tags': [['foo', 'bar']] * 11,
+        }) == {'frames': '0', 'tags': '50'}
+
+
+class StageTest(TestCase):
+    @mock.patch('sentry.utils.metrics.timing')
+    def test_simple(self, timing):
+        with stage('hashing', {'size': '1024'}):
+            pass
+
+        assert timing.call_count == 1
+        args = timing.call_args[0]
+        assert args[0] == 'events.stages.hashing'
+        assert args[3] == {'size': '1024', 'result': 'success'}
+
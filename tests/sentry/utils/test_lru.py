@@ -0,0 +1,37 @@
+from __future__ import absolute_import
+
+from mock import patch
+
+from sentry.testutils import TestCase
+from sentry.utils.lru import LRUCache
+
+
+class LRUCacheTest(TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1
+        cache.set('c', 3)
+
+        assert len(cache) == 2
+        assert cache.get('b') is None
+        assert cache.get_many(['a', 'b', 'c']) == {'a': 1, 'c': 3}
+
+        cache.delete('a')
+        assert 'a' not in cache
+        cache.clear()
+        assert len(cache) == 0
+
+    @patch('sentry.utils.lru.time')
+    def test_ttl(self, time):
+        cache = LRUCache(2, ttl=10)
+        time.return_value = 100
+        cache.set('a', 1)
+
+        time.return_value = 109
+        assert cache.get('a') == 1
+
+        time.return_value = 110
+        assert cache.get('a') is None
+        assert len(cache) == 0
@@ -0,0 +1,31 @@
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+from sentry.testutils import TestCase
+from sentry.utils.profile import sampled_profile
+
+
+class SampledProfileTest(TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_not_sampled(self):
+        with self.settings(SENTRY_PROFILE_SAMPLE_RATE=0, SENTRY_PROFILE_DIR=self.path):
+            with sampled_profile('test'):
+                pass
+        assert os.listdir(self.path) == []
+
+    def test_sampled(self):
+        with self.settings(SENTRY_PROFILE_SAMPLE_RATE=1, SENTRY_PROFILE_DIR=self.path):
+            with sampled_profile('test'):
+                pass
+        filenames = os.listdir(self.path)
+        assert len(filenames) == 1
+        assert filenames[0].startswith('sentry-test-')
+        assert filenames[0].endswith('.prof')
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import absolute_import
+
+import os
+import shutil
+import tempfile
+
+from sentry.testutils import TestCase
+from sentry.utils.symboltable import SymbolTable
+
+
+class SymbolTableTest(TestCase):
+    symbols = [
+        (0x1000, 'main'),
+        (0x1010, u'f\xfc\xfc'),
+        (0x1040, '-[NSObject description]'),
+    ]
+
+    def assert_finds_symbols(self, table):
+        assert len(table) == 3
+        assert table.find(0, 0xfff) is None
+        assert table.find(0, 0x1000) == (0x1000, 'main')
+        assert table.find(0, 0x100f) == (0x1000, 'main')
+        assert table.find(0, 0x1010) == (0x1010, u'f\xfc\xfc')
+        assert table.find(0, 0x2000) == (0x1040, '-[NSObject description]')
+        assert table.find(0x1041, 0x2000) is None
+
+    def test_find(self):
+        self.assert_finds_symbols(SymbolTable.from_symbols(self.symbols))
+
+    def test_empty(self):
+        table = SymbolTable.from_symbols([])
+        assert len(table) == 0
+        assert table.find(0, 0x1000) is None
+
+    def test_dump_and_load(self):
+        path = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(path, 'table')
+            SymbolTable.from_symbols(self.symbols).dump(filename)
+            table = SymbolTable.load(filename)
+            assert table.mapping is not None
+            self.assert_finds_symbols(table)
+
+            with open(filename, 'r+b') as f:
+                f.truncate(20)
+            assert SymbolTable.load(filename) is None
+        finally:
+            shutil.rmtree(path)
@@ -8,7 +8,9 @@ from django.core.urlresolvers import reverse
 from exam import fixture
 
 from sentry.models import ProjectKey
+from sentry.quotas.base import RateLimited
 from sentry.testutils import TestCase
+from sentry.testutils.helpers import get_auth_header
 from sentry.utils import json
 
 
@@ -297,6 +299,64 @@ class StoreViewTest(TestCase):
         }
 
 
+class BatchStoreViewTest(TestCase):
+    @fixture
+    def path(self):
+        return reverse('sentry-api-store-batch', kwargs={'project_id': self.project.id})
+
+    def _postBatch(self, events):
+        return self.client.post(
+            self.path, json.dumps(events),
+            content_type='application/json',
+            HTTP_X_SENTRY_AUTH=get_auth_header(
+                '_postBatch/0.0.0',
+                self.projectkey.public_key,
+                self.projectkey.secret_key,
+            ),
+        )
+
+    @mock.patch('sentry.coreapi.ClientApiHelper.insert_data_to_database_many')
+    def test_stores_all_events(self, mock_insert_data_to_database_many):
+        resp = self._postBatch([
+            {'message': 'foo', 'event_id': 'a' * 32},
+            {'message': 'bar', 'event_id': 'b' * 32},
+        ])
+        assert resp.status_code == 200, resp.content
+        result = json.loads(resp.content)
+        assert result['ids'] == ['a' * 32, 'b' * 32]
+        assert result['errors'] == {}
+
+        call_data = mock_insert_data_to_database_many.call_args[0][0]
+        assert [d['event_id'] for d in call_data] == ['a' * 32, 'b' * 32]
+
+    @mock.patch('sentry.coreapi.ClientApiHelper.insert_data_to_database_many')
+    def test_rejects_duplicate_event_ids(self, mock_insert_data_to_database_many):
+        resp = self._postBatch([
+            {'message': 'foo', 'event_id': 'a' * 32},
+            {'message': 'bar', 'event_id': 'a' * 32},
+            'not an event',
+        ])
+        assert resp.status_code == 200, resp.content
+        result = json.loads(resp.content)
+        assert result['ids'] == ['a' * 32, None, None]
+        assert sorted(result['errors'].keys()) == ['1', '2']
+
+        call_data = mock_insert_data_to_database_many.call_args[0][0]
+        assert len(call_data) == 1
+
+    @mock.patch('sentry.app.quotas.is_rate_limited')
+    def test_checks_quota_once_for_batch(self, is_rate_limited):
+        is_rate_limited.return_value = RateLimited(retry_after=30)
+        resp = self._postBatch([{'message': 'foo'}, {'message': 'bar'}])
+        assert resp.status_code == 429, resp.content
+        assert is_rate_limited.call_count == 1
+        assert is_rate_limited.call_args[1]['quantity'] == 2
+
+    def test_requires_list(self):
+        resp = self._postBatch({'message': 'foo'})
+        assert resp.status_code == 400, resp.content
+
+
 class CrossDomainXmlTest(TestCase):
     @fixture
     def path(self):